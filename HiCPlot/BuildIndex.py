@@ -0,0 +1,27 @@
+import argparse
+import sys
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='Build the indexes HiCPlot uses for fast region lookups: '
+                                                 'bgzip + tabix for BED, bedGraph and loop files, and the gene model index for GTF files.')
+    parser.add_argument('--bed_files', type=str, nargs='*', default=[], help='BED files to sort, bgzip and tabix-index.')
+    parser.add_argument('--bedgraph_files', type=str, nargs='*', default=[], help='bedGraph files to sort, bgzip and tabix-index.')
+    parser.add_argument('--loop_files', type=str, nargs='*', default=[], help='Loop (BEDPE) files with a header line to sort, bgzip and tabix-index on their first anchor.')
+    parser.add_argument('--gtf_files', type=str, nargs='*', default=[], help='GTF files to convert into the per-chromosome gene model index.')
+    args = parser.parse_args(argv)
+    from HiCPlot.io import build_tabix_index, build_gtf_index
+
+    for kind, files in (('bed', args.bed_files), ('bedgraph', args.bedgraph_files), ('loops', args.loop_files)):
+        for file_path in files:
+            indexed = build_tabix_index(file_path, kind)
+            print(f"Indexed {file_path} -> {indexed}")
+    for gtf_file in args.gtf_files:
+        index_file = build_gtf_index(gtf_file)
+        if index_file is not None:
+            print(f"Indexed {gtf_file} -> {index_file}")
+
+if __name__ == '__main__':
+    main()
@@ -20,34 +20,35 @@ sub‑tool sees *only* its own flags.
 from __future__ import annotations
 
 import argparse
+import importlib
 import sys
 from typing import Callable, Dict, List, Optional
 
 # ----------------------------------------------------------------------
-# Import plotting entry points (adjust the import paths to match your
-# installation if necessary).
+# Sub‑command registry: tool name → module providing ``main(argv)``.
+# Modules are imported only when their sub‑command runs, so ``HiCPlot
+# --help`` or ``HiCPlot NGStrack`` never pay for cooler, scipy or the
+# other tools' dependencies.
 # ----------------------------------------------------------------------
-from HiCPlot.SquHeatmap import main as _run_squ
-from HiCPlot.SquHeatmapTrans import main as _run_squTrans
-from HiCPlot.TriHeatmap import main as _run_tri
-from HiCPlot.DiffSquHeatmap import main as _run_diff
-from HiCPlot.DiffSquHeatmapTrans import main as _run_diffTrans
-from HiCPlot.upper_lower_triangle_heatmap import main as _run_ul
-from HiCPlot.NGStrack import main as _run_track
-
-# ----------------------------------------------------------------------
-# Sub‑command registry
-# ----------------------------------------------------------------------
-_SUBCOMMANDS: Dict[str, Callable[[Optional[List[str]] | None], None]] = {
-    "SquHeatmap": _run_squ,
-    "SquHeatmapTrans": _run_squTrans,
-    "TriHeatmap": _run_tri,
-    "DiffSquHeatmap": _run_diff,
-    "DiffSquHeatmapTrans": _run_diffTrans,
-    "upper_lower_triangle_heatmap": _run_ul,
-    "NGStrack": _run_track,
+_SUBCOMMANDS: Dict[str, str] = {
+    "SquHeatmap": "HiCPlot.SquHeatmap",
+    "SquHeatmapTrans": "HiCPlot.SquHeatmapTrans",
+    "TriHeatmap": "HiCPlot.TriHeatmap",
+    "DiffSquHeatmap": "HiCPlot.DiffSquHeatmap",
+    "DiffSquHeatmapTrans": "HiCPlot.DiffSquHeatmapTrans",
+    "upper_lower_triangle_heatmap": "HiCPlot.upper_lower_triangle_heatmap",
+    "NGStrack": "HiCPlot.NGStrack",
+    "BuildIndex": "HiCPlot.BuildIndex",
+    "render": "HiCPlot.render",
+    "serve": "HiCPlot.serve",
+    "client": "HiCPlot.client",
 }
 
+
+def _load_entry(name: str) -> Callable[[Optional[List[str]] | None], None]:
+    """Import the module of sub‑command *name* and return its ``main``."""
+    return importlib.import_module(_SUBCOMMANDS[name]).main
+
 _SUBCOMMAND_DESCR: Dict[str, str] = {
     "SquHeatmap": "Square intra‑chromosomal heatmap",
     "SquHeatmapTrans": "Square inter‑chromosomal heatmap",
@@ -56,6 +57,10 @@ _SUBCOMMAND_DESCR: Dict[str, str] = {
     "DiffSquHeatmapTrans": "Differential square inter‑heatmap",
     "upper_lower_triangle_heatmap": "Split‑triangle heatmap (upper vs lower)",
     "NGStrack": "Plot multiple NGS tracks",
+    "BuildIndex": "Index BED/bedGraph/loop (tabix) and GTF files for fast region lookups",
+    "render": "Multi-panel figures from a YAML/JSON spec, loading shared files once",
+    "serve": "Keep a render process with warm caches listening for requests",
+    "client": "Run a sub-command on a running 'HiCPlot serve' process",
 }
 
 # ----------------------------------------------------------------------
@@ -84,7 +89,7 @@ def _build_parser() -> argparse.ArgumentParser:
             description=help_line,
             add_help=False,  # let the tool define -h/--help if it wishes
         )
-        sp.set_defaults(_entry=_SUBCOMMANDS[name])
+        sp.set_defaults(_entry=name)
 
     return parser
 
@@ -125,7 +130,7 @@ def main(argv: Optional[List[str]] | None = None) -> None:
         parser.print_help(sys.stderr)
         sys.exit(1)
 
-    entry: Callable[[Optional[List[str]] | None], None] = getattr(ns, "_entry")
+    entry: Callable[[Optional[List[str]] | None], None] = _load_entry(getattr(ns, "_entry"))
 
     # Special‑case: ``HiCPlot <tool> -h`` should show the tool's own help.
     if rest and rest[0] in ("-h", "--help"):
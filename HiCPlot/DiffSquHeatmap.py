@@ -1,20 +1,12 @@
 #!/usr/bin/env python
 import argparse
 import os
-import pandas as pd
-from matplotlib.colors import Normalize
-import pyBigWig
-import pyranges as pr
 import numpy as np
-import matplotlib.pyplot as plt
-import cooler
-from matplotlib.ticker import EngFormatter
-import matplotlib.gridspec as gridspec
-from matplotlib.patches import Arc
 from collections import defaultdict
 import sys
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.normalize import MATRIX_DTYPES
+from HiCPlot.io import CONCURRENCY_MODES, parse_resolution
+from HiCPlot.batch import plot_regions, workers_conflict
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -34,12 +26,11 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     - color: Color for gene lines and exons.
     - track_height: Height of each gene track.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_gtf
     spacing_factor = 1.5
     chrom, start, end = region
-    # Load the GTF file using pyranges
-    gtf = pr.read_gtf(gtf_file)
-    # Filter relevant region
-    region_genes = gtf[(gtf.Chromosome == chrom) & (gtf.Start < end) & (gtf.End > start)]
+    region_genes = read_gtf(gtf_file, region)
 
     if region_genes.empty:
         print("No genes found in the specified region.")
@@ -47,7 +38,7 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
         return
 
     # Select the longest isoform for each gene
-    longest_isoforms = region_genes.df.loc[region_genes.df.groupby('gene_id')['End'].idxmax()]
+    longest_isoforms = region_genes.loc[region_genes.groupby('gene_id')['End'].idxmax()]
 
     y_offset = 0
     y_step = track_height * spacing_factor  # Adjusted vertical step for tighter spacing
@@ -64,8 +55,8 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
         ax.plot([gene['Start'], gene['End']], [y_offset, y_offset], color=color, lw=1)
 
         # Plot exons as larger rectangles for increased height
-        exons = region_genes.df[
-            (region_genes.df['gene_id'] == gene['gene_id']) & (region_genes.df['Feature'] == 'exon')
+        exons = region_genes[
+            (region_genes['gene_id'] == gene['gene_id']) & (region_genes['Feature'] == 'exon')
         ]
         for _, exon in exons.iterrows():
             ax.add_patch(
@@ -101,50 +92,9 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     # Format x-axis to display positions in megabases (Mb)
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def read_bigwig(file_path, region):
-    """
-    Read BigWig or bedGraph file and return positions and values.
-    """
-    chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        # Open the BigWig file
-        bw = pyBigWig.open(file_path)
-        # Fetch values from the region
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()  # Close the BigWig file
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        # Read the bedGraph file using pandas
-        # Assuming bedGraph files have columns: chrom, start, end, value
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#',
-                                  names=['chrom', 'start', 'end', 'value'])
-        # Filter the data for the specified region
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            return None, None
-        # Prepare the positions and values
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values,
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
-    return positions, values
-
 def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                       bigwig_files_sample2, bigwig_labels_sample2,
-                      region):
+                      region, store=None):
     """
     Compute the minimum and maximum values for BigWig tracks per type to ensure consistent y-axis scaling.
 
@@ -154,10 +104,14 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
     - bigwig_files_sample2: List of BigWig files for sample 2.
     - bigwig_labels_sample2: List of labels corresponding to BigWig files for sample 2.
     - region: Tuple containing (chromosome, start, end).
+    - store: Optional TrackStore shared with plot_seq so each file is decoded once.
 
     Returns:
     - type_min_max: Dictionary with BigWig types as keys and (min, max) tuples as values.
     """
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
     type_min_max = defaultdict(lambda: {'min': np.inf, 'max': -np.inf})
 
     # Function to extract type from label (assumes type is the first part before a space)
@@ -171,7 +125,7 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     for file, label in zip(combined_files, combined_labels):
         bw_type = extract_type(label)
-        positions, values = read_bigwig(file, region)
+        positions, values = store.read(file, region)
         if values is not None and len(values) > 0:
             current_min = np.nanmin(values)
             current_max = np.nanmax(values)
@@ -188,11 +142,15 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
     return type_min_max
 
 
-def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
+def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None, store=None):
     """
     Plot RNA-seq/ChIP-seq expression from BigWig or bedGraph file on given axis.
     """
-    positions, values = read_bigwig(file_path, region)
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
+    positions, values = store.read(file_path, region)
     if positions is None or values is None:
         print(f"No data found in the specified region ({region[0]}:{region[1]}-{region[2]}) in {file_path}")
         ax.axis('off')
@@ -213,16 +171,10 @@ def plot_bed(ax, bed_file, region, color='green', linewidth=1, label=None):
     """
     Plot BED file annotations on the given axis.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_bed
     chrom, start, end = region
-    # Read the BED file
-    bed_df = pd.read_csv(bed_file, sep='\t', header=None, comment='#',
-                         names=['chrom', 'start', 'end'] + [f'col{i}' for i in range(4, 10)])
-    # Filter for the region and chromosome
-    region_bed = bed_df[
-        (bed_df['chrom'] == chrom) &
-        (bed_df['end'] > start) &
-        (bed_df['start'] < end)
-    ]
+    region_bed = read_bed(bed_file, region)
     if region_bed.empty:
         print(f"No BED entries found in the specified region ({chrom}:{start}-{end}) in {bed_file}.")
         ax.axis('off')
@@ -260,18 +212,11 @@ def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, la
     - linewidth: Width of the arc lines.
     - label: Label for the loop track (sample name).
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Arc
+    from HiCPlot.io import read_loops
     chrom, start, end = region
-    # Read the loop file
-    loop_df = pd.read_csv(loop_file, sep='\t', header=0, usecols=[0,1,2,3,4,5],
-                          names=['chrom1', 'start1', 'end1', 'chrom2', 'start2', 'end2'])
-
-    # Filter loops where both anchors are within the region and on the same chromosome
-    loop_df = loop_df[
-        (loop_df['chrom1'] == chrom) &
-        (loop_df['chrom2'] == chrom) &
-        (loop_df['start1'] >= start) & (loop_df['end1'] <= end) &
-        (loop_df['start2'] >= start) & (loop_df['end2'] <= end)
-    ]
+    loop_df = read_loops(loop_file, region)
 
     if loop_df.empty:
         print(f"No loops detected in the specified region ({chrom}:{start}-{end}) in {loop_file}.")
@@ -336,6 +281,66 @@ def pcolormesh_square(ax, matrix, start, end, cmap='bwr', vmin=None, vmax=None,
                    extent=[start, end, end, start], cmap=cmap, vmin=vmin, vmax=vmax, *args, **kwargs)
     return im
 
+def difference_matrix(data1, data2, operation='subtract', division_method='raw', max_bins=None):
+    """
+    Return the case/control comparison of two matrices ('subtract' or 'divide'
+    with *division_method* 'raw', 'add1', 'log2' or 'log2_add1').  Computed in
+    place: *data1* and *data2* are overwritten.
+
+    With *max_bins* (matrices fetched with ``max_bins``), cells further than
+    that from the diagonal were never read and stay NaN in the result.
+    """
+    # Every step writes into data1/data2 (out=...) so no full-size temporary is allocated.
+    if operation == 'subtract':
+        data1[np.isnan(data1)] = 0
+        data2[np.isnan(data2)] = 0
+        data_diff = np.subtract(data1, data2, out=data1)
+    elif operation == 'divide':
+        if division_method == 'raw':
+            # Raw division
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.maximum(data1, 0, out=data1)
+                np.maximum(data2, 0, out=data2)
+                data_diff = np.divide(data1, data2, out=data1)
+                data_diff[~np.isfinite(data_diff)] = 0  # Replace inf and NaN with 0
+        elif division_method == 'add1':
+            # (case +1) / (control +1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.maximum(data1, 0, out=data1)
+                np.maximum(data2, 0, out=data2)
+                np.add(data1, 1, out=data1)
+                np.add(data2, 1, out=data2)
+                data_diff = np.divide(data1, data2, out=data1)
+                data_diff[~np.isfinite(data_diff)] = 0  # Replace inf and NaN with 0
+        elif division_method == 'log2':
+            # Log2(case / control)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.maximum(data1, 0, out=data1)
+                np.maximum(data2, 0, out=data2)
+                ratio = np.divide(data1, data2, out=data1)
+                bad = (ratio <= 0) | (~np.isfinite(ratio))
+                ratio[bad] = np.nan  # Avoid log2 of non-positive numbers
+                data_diff = np.log2(ratio, out=ratio)
+        elif division_method == 'log2_add1':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.maximum(data1, 0, out=data1)
+                np.maximum(data2, 0, out=data2)
+                np.add(data1, 1, out=data1)
+                np.add(data2, 1, out=data2)
+                ratio = np.divide(data1, data2, out=data1)
+                ratio[~np.isfinite(ratio)] = np.nan
+                data_diff = np.log2(ratio, out=ratio)
+        else:
+            raise ValueError("Invalid division_method. Choose among 'raw', 'log2', 'add1', 'log2_add1'.")
+    else:
+        raise ValueError("Invalid operation. Choose 'subtract' or 'divide'.")
+    if max_bins is not None:
+        # The steps above turn missing cells into 0 ("no difference"); restore the out-of-band ones.
+        for i in range(len(data_diff)):
+            data_diff[i, :max(0, i - max_bins)] = np.nan
+            data_diff[i, i + max_bins + 1:] = np.nan
+    return data_diff
+
 def plot_heatmaps(
     cooler_file1,cooler_file2,format="balance",
     bigwig_files_sample1=[], bigwig_labels_sample1=[],colors_sample1="red",
@@ -351,7 +356,8 @@ def plot_heatmaps(
     track_size=5, track_spacing=0.5,
     operation='subtract', division_method='raw',
     diff_cmap='bwr', diff_title=None,
-    genes_to_annotate=None
+    genes_to_annotate=None, track_summary=None, max_distance=None, dtype='float64',
+    max_bins=None, max_matrix_mb=None, concurrent='none'
 ):
     """
     Plot the difference heatmap along with BigWig, BED tracks, gene annotations, and chromatin loops.
@@ -359,71 +365,35 @@ def plot_heatmaps(
     Parameters:
     - All parameters are as defined in the function signature.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from HiCPlot.io import cooler_call, load_with_tracks, auto_resolution, chrom_bounds, fetch_matrix, TrackStore, pixel_bins
+    plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 8
     # Adjust track spacing if needed
     single_sample = len(bigwig_files_sample2) == 0
 
+    if cooler_file1 and (start is None or end is None):
+        # A chromosome without --start/--end is drawn whole.
+        start, end = chrom_bounds(cooler_file1, chrid, start, end)
     region = (chrid, start, end)
-
-    # Load cooler data for case
-    clr1 = cooler.Cooler(f'{cooler_file1}::resolutions/{resolution}')
-    if format == "balance":
-        data1 = clr1.matrix(balance=True).fetch(region).astype(float)
-    elif format == "ICE":
-        data1 = clr1.matrix(balance=False).fetch(region).astype(float)
-    else:
-        print("input format is wrong")
-    # Load cooler data for control
-    clr2 = cooler.Cooler(f'{cooler_file2}::resolutions/{resolution}')
-    if format == "balance":
-        data2 = clr2.matrix(balance=True).fetch(region).astype(float)
-    elif format == "ICE":
-        data2 = clr2.matrix(balance=False).fetch(region).astype(float)
-    else:
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(track_size))
+    if resolution == 'auto' and cooler_file1:
+        resolution = auto_resolution([f for f in (cooler_file1, cooler_file2) if f], end - start,
+                                     max_bins or pixel_bins(track_size), max_mb=max_matrix_mb, dtype=dtype)
+        print(f"Using resolution {resolution} bp")
+    band_bins = None if max_distance is None else int(np.ceil(max_distance / resolution))
+
+    if format not in ("balance", "ICE"):
         print("input format is wrong")
+        return
+    # Load cooler data for case and control, and the bigWig tracks, concurrently with --concurrent
+    data1, data2 = load_with_tracks(
+        [cooler_call(f, resolution, fetch_matrix, region, balance=format == "balance", max_bins=band_bins, dtype=dtype)
+         for f in (cooler_file1, cooler_file2)],
+        track_store, list(bigwig_files_sample1) + list(bigwig_files_sample2), region, mode=concurrent)
 
-    # Compute difference matrix
-    data_diff = None  # Initialize
-
-    if operation == 'subtract':
-        data1[np.isnan(data1)] = 0
-        data2[np.isnan(data2)] = 0
-        data_diff = data1 - data2
-    elif operation == 'divide':
-        if division_method == 'raw':
-            # Raw division
-            with np.errstate(divide='ignore', invalid='ignore'):
-                data1 = np.maximum(data1, 0)
-                data2 = np.maximum(data2, 0)
-                data_diff = np.divide(data1, data2)
-                data_diff[~np.isfinite(data_diff)] = 0  # Replace inf and NaN with 0
-        elif division_method == 'add1':
-            # (case +1) / (control +1)
-            with np.errstate(divide='ignore', invalid='ignore'):
-                data1 = np.maximum(data1, 0)
-                data2 = np.maximum(data2, 0)
-                data_diff = np.divide(data1 + 1, data2 + 1)
-                data_diff[~np.isfinite(data_diff)] = 0  # Replace inf and NaN with 0
-        elif division_method == 'log2':
-            # Log2(case / control)
-            with np.errstate(divide='ignore', invalid='ignore'):
-                data1 = np.maximum(data1, 0)
-                data2 = np.maximum(data2, 0)
-                ratio = np.divide(data1, data2)
-                bad = (ratio <= 0) | (~np.isfinite(ratio))
-                ratio[bad] = np.nan  # Avoid log2 of non-positive numbers
-                data_diff = np.log2(ratio)
-        elif division_method == 'log2_add1':
-            with np.errstate(divide='ignore', invalid='ignore'):
-                data1 = np.maximum(data1, 0)
-                data2 = np.maximum(data2, 0)
-                ratio = np.divide(data1 + 1, data2 + 1)
-                ratio[~np.isfinite(ratio)] = np.nan
-                data_diff = np.log2(ratio)
-        else:
-            raise ValueError("Invalid division_method. Choose among 'raw', 'log2', 'add1', 'log2_add1'.")
-    else:
-        raise ValueError("Invalid operation. Choose 'subtract' or 'divide'.")
+    data_diff = difference_matrix(data1, data2, operation, division_method, max_bins=band_bins)
 
     # Determine color limits for difference heatmap
     # Colour limits
@@ -506,7 +476,7 @@ def plot_heatmaps(
     else:
         type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
 
     # Plot BigWig tracks for Sample1 and Sample2
     # Sample1 BigWig
@@ -517,7 +487,7 @@ def plot_heatmaps(
             bw_type = bigwig_labels_sample1[i].split("_")[1]
             y_min, y_max = type_min_max[bw_type]
             plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, 
-                y_min=y_min, y_max=y_max)
+                y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8)
             ax_bw.set_xlim(start, end)
             if y_min is not None and y_max is not None:
@@ -531,7 +501,7 @@ def plot_heatmaps(
             bw_type = bigwig_labels_sample2[j].split("_")[1]
             y_min, y_max = type_min_max[bw_type]
             plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, 
-                y_min=y_min, y_max=y_max)
+                y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8)
             ax_bw.set_xlim(start, end)
             if y_min is not None and y_max is not None:
@@ -578,12 +548,28 @@ def main(argv: list[str] | None = None):
     parser.add_argument('--cooler_file1', type=str, required=True, help='Path to the case .mcool file.')
     parser.add_argument('--cooler_file2', type=str, required=True, help='Path to the control .mcool file.')
     parser.add_argument('--format', type=str, default='balance', choices=['balance', 'ICE'], help='Format of .mcool file.')
-    parser.add_argument('--resolution', type=int, required=True, help='Resolution for the cooler data.')
-    parser.add_argument('--start', type=int, required=True, help='Start position for the region of interest.')
-    parser.add_argument('--end', type=int, required=True, help='End position for the region of interest.')
-    parser.add_argument('--chrid', type=str, required=True, help='Chromosome ID.')
+    parser.add_argument('--resolution', type=parse_resolution, required=True, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='With --resolution auto: most bins allowed across the window. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
+    parser.add_argument('--max_distance', type=int, default=None,
+                        help='Only fetch contacts up to this genomic distance (in bp) from the diagonal, read as sparse pixels; cells further out are treated as missing. Default: the whole window.')
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices and bigWig tracks in parallel with a 'thread' or 'process' pool. Default: one after the other.")
+    parser.add_argument('--start', type=int, help='Start position for the region of interest.')
+    parser.add_argument('--end', type=int, help='End position for the region of interest.')
+    parser.add_argument('--chrid', type=str, help='Chromosome ID.')
+    parser.add_argument('--regions', type=str, default=None,
+                        help="BED file of regions to plot in one run instead of --chrid/--start/--end. An --output_file ending in .pdf gets one page per region; otherwise one file per region is written, named after the BED name column (or chrom_start_end), or via {name}/{chrom}/{start}/{end} placeholders.")
 
     # Optional arguments
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With --regions: number of processes drawing regions in parallel.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With --regions: read the data of this many upcoming regions in the background while the current one is drawn.')
     parser.add_argument('--vmin', type=float, default=None, help='Minimum value for normalization of the combined heatmap.')
     parser.add_argument('--vmax', type=float, default=None, help='Maximum value for normalization of the combined heatmap.')
     parser.add_argument('--output_file', type=str, default='comparison_heatmap.pdf', help='Filename for the saved comparison heatmap PDF.')
@@ -617,6 +603,8 @@ def main(argv: list[str] | None = None):
     # Track dimensions and spacing
     parser.add_argument('--track_size', type=float, default=5, help='Height of each track (in inches).')
     parser.add_argument('--track_spacing', type=float, default=0.5, help='Spacing between tracks (in inches).')
+    parser.add_argument('--track_summary', type=str, default='none', choices=['none', 'mean', 'max', 'min'],
+                        help="Read BigWig tracks as per-pixel 'mean', 'max' or 'min' summaries sized to the track width instead of per-base values ('none').")
     parser.add_argument('--track_min', type=float, default=None, help='Global minimum value for all BigWig tracks.')
     parser.add_argument('--track_max', type=float, default=None, help='Global maximum value for all BigWig tracks.')
     # Gene annotation arguments
@@ -625,9 +613,13 @@ def main(argv: list[str] | None = None):
     parser.add_argument("-V", "--version", action="version",version="DiffSquHeatmap {}".format(__version__)\
                       ,help="Print version and exit")
     args = parser.parse_args(argv)
+    if args.regions is None and (args.start is None or args.end is None or args.chrid is None):
+        parser.error("--start, --end and --chrid are required unless --regions is given.")
+    if args.regions is not None and (message := workers_conflict(args.output_file, args.workers)):
+        parser.error(message)
 
     # Call the plot_heatmaps function with the parsed arguments
-    plot_heatmaps(
+    options = dict(
     cooler_file1=args.cooler_file1,
     cooler_file2=args.cooler_file2,
     format=args.format,
@@ -654,6 +646,12 @@ def main(argv: list[str] | None = None):
     bed_files_sample2=args.bed_files_sample2,
     bed_labels_sample2=args.bed_labels_sample2,
     track_size=args.track_size,
+    track_summary=None if args.track_summary == 'none' else args.track_summary,
+    max_distance=args.max_distance,
+    max_bins=args.max_bins,
+    max_matrix_mb=args.max_matrix_mb,
+    concurrent=args.concurrent,
+    dtype=args.dtype,
     track_spacing=args.track_spacing,
     operation=args.operation,
     division_method=args.division_method,
@@ -661,6 +659,10 @@ def main(argv: list[str] | None = None):
     diff_title=args.diff_title,
     genes_to_annotate=args.genes_to_annotate
     )
+    if args.regions:
+        plot_regions(plot_heatmaps, options, args.regions, workers=args.workers, prefetch_depth=args.prefetch)
+    else:
+        plot_heatmaps(**options)
 
 
 if __name__ == '__main__':
@@ -2,12 +2,11 @@
 import argparse
 import os
 import sys
-import cooler
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.colors import LogNorm
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-import pandas as pd
+from HiCPlot.normalize import MATRIX_DTYPES
+from HiCPlot.io import POOL_METHODS, CONCURRENCY_MODES, parse_resolution
+
+DIFF_TILE_BINS = 2048  # bins per side of a --stream diff tile
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -33,7 +32,22 @@ def _prepare_region(chrom, start, end, chromsizes):
         raise ValueError(f"Invalid range for {chrom}: {s}-{e} (size {size})")
     return chrom, s, e
 
+def _window_span(chromsizes, x_chrs, y_chrs, xs, xe, ys, ye, merge):
+    """Genomic length (bp) of the longest heatmap axis."""
+    if merge:
+        return max(sum(chromsizes[c] for c in chrs if c in chromsizes) for chrs in (x_chrs, y_chrs))
+    span = 0
+    for chrs, starts, ends in ((x_chrs, xs, xe), (y_chrs, ys, ye)):
+        for c, s, e in zip(chrs, starts, ends):
+            try:
+                _, s, e = _prepare_region(c, s, e, chromsizes)
+            except ValueError:
+                continue
+            span = max(span, e - s)
+    return span
+
 def _format_ticks_mb(ax):
+    import matplotlib.pyplot as plt
     fmt = plt.FuncFormatter(lambda v, _p: f"{v/1e6:.2f}")
     ax.xaxis.set_major_formatter(fmt)
     ax.yaxis.set_major_formatter(fmt)
@@ -54,67 +68,164 @@ def _get_balance_val(clr, spec):
 ###############################################################################
 
 def _compute_diff(mat1, mat2, operation, division_method):
+    """Return the diff of two matrices, computed in place (*mat1* and *mat2* are overwritten)."""
     if operation == "subtract":
-        m1 = np.nan_to_num(mat1, nan=0.0)
-        m2 = np.nan_to_num(mat2, nan=0.0)
-        return m1 - m2
+        m1 = np.nan_to_num(mat1, copy=False, nan=0.0)
+        m2 = np.nan_to_num(mat2, copy=False, nan=0.0)
+        return np.subtract(m1, m2, out=m1)
 
     # divide family
-    m1 = np.nan_to_num(np.maximum(mat1, 0.0), nan=0.0)
-    m2 = np.nan_to_num(np.maximum(mat2, 0.0), nan=0.0)
+    m1 = np.nan_to_num(np.maximum(mat1, 0.0, out=mat1), copy=False, nan=0.0)
+    m2 = np.nan_to_num(np.maximum(mat2, 0.0, out=mat2), copy=False, nan=0.0)
 
     if division_method == "raw":
         with np.errstate(divide="ignore", invalid="ignore"):
-            out = np.divide(m1, m2)
+            out = np.divide(m1, m2, out=m1)
         out[~np.isfinite(out)] = np.nan
         return out
 
     if division_method == "add1":
-        out = (m1 + 1) / (m2 + 1)
+        out = np.divide(np.add(m1, 1, out=m1), np.add(m2, 1, out=m2), out=m1)
         out[~np.isfinite(out)] = np.nan
         return out
 
     if division_method == "log2":
         with np.errstate(divide="ignore", invalid="ignore"):
-            ratio = np.divide(m1, m2)
+            ratio = np.divide(m1, m2, out=m1)
         ratio[(ratio <= 0) | (~np.isfinite(ratio))] = np.nan
-        return np.log2(ratio)
+        return np.log2(ratio, out=ratio)
 
     if division_method == "log2_add1":
-        ratio = (m1 + 1) / (m2 + 1)
+        ratio = np.divide(np.add(m1, 1, out=m1), np.add(m2, 1, out=m2), out=m1)
         ratio[~np.isfinite(ratio)] = np.nan
-        return np.log2(ratio)
+        return np.log2(ratio, out=ratio)
 
     raise ValueError(f"Unsupported division_method: {division_method}")
 
+def _stored_band(clr, band):
+    """
+    Pixels stored with bin1 in *band* = (chrom, b0, b1), as global
+    (bin1, bin2, count) arrays sorted by bin2, read in one request.
+    """
+    from HiCPlot.io import cooler_meta
+    meta = cooler_meta(clr)
+    chrom, b0, b1 = band
+    offset = meta.chrom_offset[chrom]
+    nbins = -(-meta.chromsizes[chrom] // meta.binsize)
+    g0, g1 = offset + min(b0, nbins), offset + min(b1, nbins)
+    with clr.open('r') as h5:
+        pixels = h5['pixels']
+        p0, p1 = int(meta.bin1_offset[g0]), int(meta.bin1_offset[g1])
+        bin1, bin2, counts = (pixels[name][p0:p1] for name in ('bin1_id', 'bin2_id', 'count'))
+    order = np.argsort(bin2, kind='stable')
+    return bin1[order], bin2[order], counts[order]
+
+def _tile_owner(meta, rows, cols):
+    """
+    Band whose stored pixels hold the tile *rows* × *cols*: the row band, or
+    for tiles below the diagonal of a symmetric-upper cooler the column band,
+    whose pixels then land transposed.
+    """
+    if meta.storage_mode == 'square':
+        return rows, False
+    (ry, i0, _), (cx, j0, _) = rows, cols
+    if meta.chrom_offset[ry] + i0 <= meta.chrom_offset[cx] + j0:
+        return rows, False
+    return cols, True
+
+def _band_tile(source, rows, cols, dtype):
+    """
+    Dense tile for bin ranges *rows*, *cols* = (chrom, b0, b1) of one cooler,
+    scattered from its stored band; bins past a chromosome end are NaN.
+
+    *source* holds the cooler, its ``CoolerMeta``, balancing weights and the
+    last band read, so consecutive tiles of one band share a single read.
+    """
+    meta = source['meta']
+    owner, transposed = _tile_owner(meta, rows, cols)
+    if source['band'][0] != owner:
+        source['band'] = (owner, _stored_band(source['clr'], owner))
+    bin1, bin2, counts = source['band'][1]
+
+    (ry, i0, i1), (cx, j0, j1) = rows, cols
+    nbins = lambda chrom: -(-meta.chromsizes[chrom] // meta.binsize)
+    ni, nj = max(0, min(i1, nbins(ry)) - i0), max(0, min(j1, nbins(cx)) - j0)
+    gi, gj = meta.chrom_offset[ry] + i0, meta.chrom_offset[cx] + j0
+    tile = np.full((i1 - i0, j1 - j0), np.nan)
+    tile[:ni, :nj] = 0
+    # The diagonal tile of a symmetric-upper cooler also holds the mirror of its own band.
+    placements = [transposed] if transposed or meta.storage_mode == 'square' or rows != cols else [False, True]
+    for mirrored in placements:
+        lo, hi = np.searchsorted(bin2, [gi, gi + ni] if mirrored else [gj, gj + nj])
+        if mirrored:
+            tile[bin2[lo:hi] - gi, bin1[lo:hi] - gj] = counts[lo:hi]
+        else:
+            tile[bin1[lo:hi] - gi, bin2[lo:hi] - gj] = counts[lo:hi]
+    if source['weights'] is not None:
+        weights = source['weights']
+        tile[:ni, :nj] *= np.outer(weights[gi:gi + ni], weights[gj:gj + nj])
+    return tile.astype(dtype, copy=False)
+
+def _stream_diff_canvas(clr1, clr2, row_order, col_order, bal1, bal2,
+                        operation, division_method, dtype="float64", max_bins=None, pool="mean"):
+    """
+    Build the merged diff canvas tile by tile (``--stream``).
+
+    Matching tiles of at most DIFF_TILE_BINS bins per side are built for
+    both coolers, pooled like ``fetch_canvas``, diffed and written into one
+    preallocated output: peak memory is one canvas plus a band of pixels
+    and a tile per cooler.  Tiles are visited band by band, so each stored
+    band of a cooler's pixel table is read once and scattered into every
+    tile that needs it.
+    """
+    from HiCPlot.io import cooler_meta, canvas_factor, pool_matrix
+    factor = canvas_factor(clr1, row_order, col_order, max_bins)
+    step = max(factor, DIFF_TILE_BINS // factor * factor)  # tiles never split a pooled cell
+    fetch_dtype = dtype if factor == 1 else float  # pool in float64, as fetch_canvas does
+    sizes = [dict(zip(clr.chromnames, clr.chromsizes)) for clr in (clr1, clr2)]
+    n_bins = lambda chrom: max(int(np.ceil(s[chrom] / clr1.binsize)) for s in sizes)
+    row_bins = [n_bins(c) for c in row_order]
+    col_bins = [n_bins(c) for c in col_order]
+    row_edges = np.cumsum([0] + [-(-n // factor) for n in row_bins])
+    col_edges = np.cumsum([0] + [-(-n // factor) for n in col_bins])
+
+    sources = []
+    for clr, balance in ((clr1, bal1), (clr2, bal2)):
+        meta = cooler_meta(clr)
+        weights = None
+        if balance is not False:
+            with clr.open('r') as h5:
+                weights = meta.weights(h5, 'weight' if balance is True else balance)
+        sources.append({'clr': clr, 'meta': meta, 'weights': weights, 'band': (None, None)})
+
+    # Visit tiles grouped by the band that holds them (in the first cooler's bin order).
+    tiles = []
+    for ry, ny, r_off in zip(row_order, row_bins, row_edges):
+        for cx, nx, c_off in zip(col_order, col_bins, col_edges):
+            for i0 in range(0, ny, step):
+                for j0 in range(0, nx, step):
+                    rows, cols = (ry, i0, min(ny, i0 + step)), (cx, j0, min(nx, j0 + step))
+                    (chrom, b0, _), _ = _tile_owner(sources[0]['meta'], rows, cols)
+                    tiles.append((sources[0]['meta'].chrom_offset[chrom] + b0, rows, cols,
+                                  r_off + i0 // factor, c_off + j0 // factor))
+    tiles.sort(key=lambda tile: tile[0])
+
+    diff = np.empty((row_edges[-1], col_edges[-1]), dtype=dtype)
+    for _, rows, cols, r0, c0 in tiles:
+        tile1, tile2 = (pool_matrix(_band_tile(source, rows, cols, fetch_dtype), factor, pool).astype(dtype, copy=False)
+                        for source in sources)
+        out = _compute_diff(tile1, tile2, operation, division_method)
+        diff[r0:r0 + out.shape[0], c0:c0 + out.shape[1]] = out
+    return diff, row_edges, col_edges
+
 ###############################################################################
 # Plot helpers                                                                #
 ###############################################################################
 
-def _build_canvas(clr, row_order, col_order, resolution, balance):
-    sizes = dict(zip(clr.chromnames, clr.chromsizes))
-    row_bins = [int(np.ceil(sizes[c] / resolution)) for c in row_order]
-    col_bins = [int(np.ceil(sizes[c] / resolution)) for c in col_order]
-    row_edges = np.cumsum([0] + row_bins)
-    col_edges = np.cumsum([0] + col_bins)
-
-    canvas = np.full((row_edges[-1], col_edges[-1]), np.nan)
-    fetch = clr.matrix(balance=balance, as_pixels=False)
-
-    for iy, ry in enumerate(row_order):
-        for ix, cx in enumerate(col_order):
-            block = fetch.fetch(ry, cx).astype(float)
-            pad_r = row_bins[iy] - block.shape[0]
-            pad_c = col_bins[ix] - block.shape[1]
-            if pad_r or pad_c:
-                block = np.pad(block, ((0, pad_r), (0, pad_c)), constant_values=np.nan)
-            r0, r1 = row_edges[iy], row_edges[iy+1]
-            c0, c1 = col_edges[ix], col_edges[ix+1]
-            canvas[r0:r1, c0:c1] = block
-    return canvas, row_edges, col_edges
-
 def _plot_merge(diff, row_edges, col_edges, rows, cols,
                 cmap, norm_obj, vmin, vmax, op, title, out_file, size):
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
     fig, ax = plt.subplots(figsize=(min(size, 40), size))
     im = ax.imshow(np.ma.masked_invalid(diff), origin="upper", aspect="equal",
                    cmap=cmap, norm=norm_obj, vmin=vmin, vmax=vmax)
@@ -139,6 +250,8 @@ def _plot_merge(diff, row_edges, col_edges, rows, cols,
     plt.close(fig)
 
 def _plot_panel(fig, gs, idx, diff, meta, cmap, norm_obj, vmin, vmax, op):
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
     ax = fig.add_subplot(gs[idx, 0])
     extent = (meta["x_start"], meta["x_end"], meta["y_end"], meta["y_start"])
     im = ax.imshow(np.ma.masked_invalid(diff), origin="upper", aspect="equal",
@@ -160,7 +273,11 @@ def plot_heatmaps(cooler_file1, cooler_file2, resolution,
                   operation, division_method, fmt,
                   cmap_name, vmin, vmax, diff_title,
                   track_size, track_spacing, output_file,
-                  merge_axes):
+                  merge_axes, dtype="float64", max_bins=None, max_matrix_mb=None, pool="mean",
+                  stream=False, concurrent="none"):
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    from HiCPlot.io import open_cooler, fetch_matrix, fetch_canvas, gather, cooler_call, pixel_bins, auto_resolution, cooler_chromsizes
 
     # coordinate parsing ------------------------------------------------------
     x_chrs = _parse_csv_list(chrid1)
@@ -174,10 +291,20 @@ def plot_heatmaps(cooler_file1, cooler_file2, resolution,
     ys = _pad(_parse_csv_list(start2, int), n_pairs)
     ye = _pad(_parse_csv_list(end2,   int), n_pairs)
 
+    if resolution == "auto":
+        try:
+            span = _window_span(cooler_chromsizes(cooler_file1), x_chrs, y_chrs,
+                                xs, xe, ys, ye, merge_axes == "merge")
+            resolution = auto_resolution([cooler_file1, cooler_file2], span,
+                                         max_bins or pixel_bins(track_size), max_mb=max_matrix_mb, dtype=dtype)
+        except Exception as exc:
+            sys.exit(f"Error choosing a resolution: {exc}")
+        print(f"Using resolution {resolution} bp")
+
     # load coolers ------------------------------------------------------------
     try:
-        clr1 = cooler.Cooler(f"{cooler_file1}::resolutions/{resolution}")
-        clr2 = cooler.Cooler(f"{cooler_file2}::resolutions/{resolution}")
+        clr1 = open_cooler(cooler_file1, resolution)
+        clr2 = open_cooler(cooler_file2, resolution)
     except Exception as exc:
         sys.exit(f"Error loading coolers: {exc}")
 
@@ -186,24 +313,33 @@ def plot_heatmaps(cooler_file1, cooler_file2, resolution,
 
     # ------------------------------------------------------------------ MERGE
     if merge_axes == "merge":
-        mat1, row_edges, col_edges = _build_canvas(clr1, y_chrs, x_chrs, resolution, bal1)
-        mat2, _, _ = _build_canvas(clr2, y_chrs, x_chrs, resolution, bal2)
+        # Canvases are pooled during the scan so they never exceed the output pixel grid.
+        canvas_bins = max_bins or pixel_bins(track_size)
+        if stream:
+            diff, row_edges, col_edges = _stream_diff_canvas(clr1, clr2, y_chrs, x_chrs, bal1, bal2,
+                                                             operation, division_method, dtype,
+                                                             max_bins=canvas_bins, pool=pool)
+        else:
+            (mat1, row_edges, col_edges), (mat2, _, _) = gather(
+                [cooler_call(f, resolution, fetch_canvas, y_chrs, x_chrs, balance=bal, dtype=dtype,
+                             max_bins=canvas_bins, pool=pool)
+                 for f, bal in ((cooler_file1, bal1), (cooler_file2, bal2))], mode=concurrent)
 
-        # auto-pad smaller matrix so shapes match
-        tgt_shape = (max(mat1.shape[0], mat2.shape[0]),
-                     max(mat1.shape[1], mat2.shape[1]))
+            # auto-pad smaller matrix so shapes match
+            tgt_shape = (max(mat1.shape[0], mat2.shape[0]),
+                         max(mat1.shape[1], mat2.shape[1]))
 
-        def _pad_to(arr, tgt):
-            if arr.shape == tgt:
-                return arr
-            pad_r = tgt[0] - arr.shape[0]
-            pad_c = tgt[1] - arr.shape[1]
-            return np.pad(arr, ((0, pad_r), (0, pad_c)), constant_values=np.nan)
+            def _pad_to(arr, tgt):
+                if arr.shape == tgt:
+                    return arr
+                pad_r = tgt[0] - arr.shape[0]
+                pad_c = tgt[1] - arr.shape[1]
+                return np.pad(arr, ((0, pad_r), (0, pad_c)), constant_values=np.nan)
 
-        mat1 = _pad_to(mat1, tgt_shape)
-        mat2 = _pad_to(mat2, tgt_shape)
+            mat1 = _pad_to(mat1, tgt_shape)
+            mat2 = _pad_to(mat2, tgt_shape)
 
-        diff = _compute_diff(mat1, mat2, operation, division_method)
+            diff = _compute_diff(mat1, mat2, operation, division_method)
 
         finite = diff[np.isfinite(diff)]
         auto_min = np.nanmin(finite) if finite.size else -1
@@ -233,6 +369,7 @@ def plot_heatmaps(cooler_file1, cooler_file2, resolution,
     diff_mats, metas = [], []
     chromsizes = dict(zip(clr1.chromnames, clr1.chromsizes))
 
+    pairs = []
     for i in range(n_pairs):
         try:
             x_chr, sx, ex = _prepare_region(x_chrs[i], xs[i], xe[i], chromsizes)
@@ -240,9 +377,14 @@ def plot_heatmaps(cooler_file1, cooler_file2, resolution,
         except ValueError as e:
             sys.stderr.write(f"[skip] {e}\n")
             continue
-
-        m1 = clr1.matrix(balance=bal1).fetch((y_chr, sy, ey), (x_chr, sx, ex)).astype(float)
-        m2 = clr2.matrix(balance=bal2).fetch((y_chr, sy, ey), (x_chr, sx, ex)).astype(float)
+        pairs.append((x_chr, sx, ex, y_chr, sy, ey))
+
+    # One gather for every pair, so a process pool opens each cooler once.
+    mats = iter(gather([cooler_call(f, resolution, fetch_matrix, (y_chr, sy, ey), (x_chr, sx, ex), balance=bal, dtype=dtype)
+                        for x_chr, sx, ex, y_chr, sy, ey in pairs
+                        for f, bal in ((cooler_file1, bal1), (cooler_file2, bal2))], mode=concurrent))
+    for x_chr, sx, ex, y_chr, sy, ey in pairs:
+        m1, m2 = next(mats), next(mats)
         if m1.shape != m2.shape:
             sys.stderr.write("[skip] shape mismatch\n")
             continue
@@ -299,7 +441,19 @@ def main(argv=None):
     parser.add_argument('--cooler_file1', type=str, required=True, help='Path to the case .mcool file.')
     parser.add_argument('--cooler_file2', type=str, required=True, help='Path to the control .mcool file.')
     parser.add_argument('--format', type=str, default='balance', choices=['balance', 'ICE'], help='Format of .mcool file.')
-    parser.add_argument('--resolution', type=int, required=True, help='Resolution for the cooler data.')
+    parser.add_argument('--resolution', type=parse_resolution, required=True, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='Most bins allowed along the longest heatmap axis: picks the resolution with --resolution auto, and pools merged genome-wide canvases down to this size. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
+    parser.add_argument('--pool', type=str, default='mean', choices=POOL_METHODS,
+                        help='How bins are pooled when a merged canvas exceeds --max_bins: nan-aware mean or sum.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices in parallel with a 'thread' or 'process' pool. Default: one after the other.")
+    parser.add_argument('--stream', action='store_true',
+                        help='Merge layout: compute the diff tile by tile from both coolers into one canvas (lower peak memory, more cooler queries).')
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
 
     # coordinates
     parser.add_argument('--chrid1', required=True, help='Chromosome ID(s) for X-axis (comma-sep)')
@@ -347,7 +501,13 @@ def main(argv=None):
         track_size=args.track_size,
         track_spacing=args.track_spacing,
         output_file=args.output_file,
-        merge_axes=args.merge_axes)
+        merge_axes=args.merge_axes,
+        dtype=args.dtype,
+        max_bins=args.max_bins,
+        max_matrix_mb=args.max_matrix_mb,
+        pool=args.pool,
+        stream=args.stream,
+        concurrent=args.concurrent)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,9 @@
 import argparse
 import os
-import pandas as pd
-from matplotlib.colors import LogNorm
-import pyBigWig
-import pyranges as pr
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
 from collections import defaultdict
 import sys
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.batch import plot_regions, workers_conflict
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -19,7 +12,7 @@ with open(version_py) as _vf:
 
 def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                       bigwig_files_sample2, bigwig_labels_sample2,
-                      region):
+                      region, store=None):
     """
     Compute the minimum and maximum values for BigWig tracks per type to ensure consistent y-axis scaling.
 
@@ -30,10 +23,14 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
     - bigwig_labels_sample2: List of labels corresponding to BigWig files for sample 2.
     - layoutid: Layout type ('horizontal' or 'vertical').
     - region: Tuple containing (chromosome, start, end).
+    - store: Optional TrackStore shared with plot_seq so each file is decoded once.
 
     Returns:
     - type_min_max: Dictionary with BigWig types as keys and (min, max) tuples as values.
     """
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
     type_min_max = defaultdict(lambda: {'min': np.inf, 'max': -np.inf})
 
     # Function to extract type from label (assumes type is the first part before a space)
@@ -47,7 +44,7 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     for file, label in zip(combined_files, combined_labels):
         bw_type = extract_type(label)
-        positions, values = read_bigwig(file, region)
+        positions, values = store.read(file, region)
         if values is not None and len(values) > 0:
             current_min = np.nanmin(values)
             current_max = np.nanmax(values)
@@ -76,12 +73,11 @@ def plot_genes(ax, gtf_file, region, genes=None, color='blue', track_height=1):
     - color: Color for gene lines and exons.
     - track_height: Height of each gene track.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_gtf
     spacing_factor = 1.5
     chrom, start, end = region
-    # Load the GTF file using pyranges
-    gtf = pr.read_gtf(gtf_file)
-    # Filter relevant region
-    region_genes = gtf[(gtf.Chromosome == chrom) & (gtf.Start < end) & (gtf.End > start)]
+    region_genes = read_gtf(gtf_file, region)
     
     if region_genes.empty:
         print("No genes found in the specified region.")
@@ -89,7 +85,7 @@ def plot_genes(ax, gtf_file, region, genes=None, color='blue', track_height=1):
         return
     
     # Select the longest isoform for each gene
-    longest_isoforms = region_genes.df.loc[region_genes.df.groupby('gene_id')['End'].idxmax()]
+    longest_isoforms = region_genes.loc[region_genes.groupby('gene_id')['End'].idxmax()]
     
     y_offset = 0
     y_step = track_height * spacing_factor  # Adjusted vertical step for tighter spacing
@@ -106,8 +102,8 @@ def plot_genes(ax, gtf_file, region, genes=None, color='blue', track_height=1):
         ax.plot([gene['Start'], gene['End']], [y_offset, y_offset], color=color, lw=1)
         
         # Plot exons as larger rectangles for increased height
-        exons = region_genes.df[
-            (region_genes.df['gene_id'] == gene['gene_id']) & (region_genes.df['Feature'] == 'exon')
+        exons = region_genes[
+            (region_genes['gene_id'] == gene['gene_id']) & (region_genes['Feature'] == 'exon')
         ]
         for _, exon in exons.iterrows():
             ax.add_patch(
@@ -144,57 +140,12 @@ def plot_genes(ax, gtf_file, region, genes=None, color='blue', track_height=1):
     # Format x-axis to display positions in megabases (Mb)
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def read_bigwig(file_path, region):
-    """Read BigWig or bedGraph file and return positions and values."""
-    chrid, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        # Open the BigWig file
-        bw = pyBigWig.open(file_path)
-        # Fetch values from the region
-        values = bw.values(chrid, start, end, numpy=True)
-        bw.close()  # Close the BigWig file
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        # Read the bedGraph file using pandas
-        # Assuming bedGraph files have columns: chrid, start, end, value
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        # Filter the data for the specified region
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrid) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            return None, None
-        # Prepare the positions and values
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
-    return positions, values
-
 def plot_bed(ax, bed_file, region, color='green', label=None):
     """Plot BED file annotations on the given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_bed
     chrom, start, end = region
-    # Read the BED file
-    bed_df = pd.read_csv(bed_file, sep='\t', header=None, comment='#', 
-                         names=['chrom', 'start', 'end'] + [f'col{i}' for i in range(4, 10)])
-    # Filter for the region and chromosome
-    region_bed = bed_df[
-        (bed_df['chrom'] == chrom) &
-        (bed_df['end'] > start) &
-        (bed_df['start'] < end)
-    ]
+    region_bed = read_bed(bed_file, region)
     if region_bed.empty:
         print(f"No BED entries found in the specified region ({chrom}:{start}-{end}) in {bed_file}.")
         ax.axis('off')
@@ -219,45 +170,18 @@ def plot_bed(ax, bed_file, region, color='green', label=None):
     if label:
         ax.set_title(label, fontsize=8)
 
-def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
+def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None, store=None):
     """Plot RNA-seq/ChIP-seq expression from BigWig or bedGraph file on given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import TrackStore
     chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        # Open the BigWig file
-        bw = pyBigWig.open(file_path)
-        # Fetch values from the region
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()  # Close the BigWig file
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        # Read the bedGraph file using pandas
-        # Assuming bedGraph files have columns: chrom, start, end, value
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        # Filter the data for the specified region
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
-            ax.axis('off')  # Hide the axis if no data
-            return
-        # Prepare the positions and values
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
+    if store is None:
+        store = TrackStore()
+    positions, values = store.read(file_path, region)
+    if positions is None or values is None:
+        print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
+        ax.axis('off')
+        return
     
     # Plot the RNA-seq/ChIP-seq expression as a filled line plot
     ax.plot(positions, values, color=color, alpha=0.7)
@@ -282,7 +206,8 @@ def plot_tracks(
     track_min=None, track_max=None,
     output_file='comparison_tracks.pdf',
     layout='vertical',
-    track_width=10, track_height=1, track_spacing=0.5
+    track_width=10, track_height=1, track_spacing=0.5,
+    track_summary=None
 ):
     """
     Plot BigWig, BED, and GTF tracks with customizable layout.
@@ -310,11 +235,18 @@ def plot_tracks(
     - track_width: Width of each track in inches.
     - track_height: Height of each track in inches.
     - track_spacing: Spacing between tracks in inches.
+    - track_summary: 'mean', 'max' or 'min' to read BigWig tracks as one summary per pixel; None for per-base values.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from HiCPlot.io import TrackStore, load_with_tracks, pixel_bins
+    plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 8
     track_spacing = track_spacing * 1.2
     single_sample = len(bigwig_files_sample2) == 0
     region = (chrid, start, end)
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(track_width))
+    load_with_tracks([], track_store, list(bigwig_files_sample1) + list(bigwig_files_sample2), region)
     if layout == 'horizontal':
         num_genes = 1 if gtf_file else 0
         ncols = 1 if single_sample else 2
@@ -340,7 +272,7 @@ def plot_tracks(
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
 
         # Sample1 BigWig
         track_start_row = 0
@@ -350,7 +282,7 @@ def plot_tracks(
                 bw_type = bigwig_labels_sample1[i].split("_")[1]
                 y_min, y_max = type_min_max[bw_type]
                 plot_seq(ax_bw1, bigwig_files_sample1[i], (chrid, start, end), color=colors_sample1,
-                     y_min=y_min, y_max=y_max)
+                     y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw1.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8)
                 ax_bw1.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -364,7 +296,7 @@ def plot_tracks(
                 bw_type = bigwig_labels_sample2[j].split("_")[1]
                 y_min, y_max = type_min_max[bw_type]
                 plot_seq(ax_bw2, bigwig_files_sample2[j], (chrid, start, end), color=colors_sample2,
-                     y_min=y_min, y_max=y_max)
+                     y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw2.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8)
                 ax_bw2.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -422,7 +354,7 @@ def plot_tracks(
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
         # Plot BigWig and BED tracks
         # Sample1 BigWig
         track_start_row = 0
@@ -432,7 +364,7 @@ def plot_tracks(
                 bw_type = bigwig_labels_sample1[i].split("_")[1]
                 y_min, y_max = type_min_max[bw_type]
                 plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, 
-                    y_min=y_min, y_max=y_max)
+                    y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -446,7 +378,7 @@ def plot_tracks(
                 bw_type = bigwig_labels_sample2[j].split("_")[1]
                 y_min, y_max = type_min_max[bw_type]
                 plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, 
-                    y_min=y_min, y_max=y_max)
+                    y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -512,11 +444,17 @@ def main(argv=None):
     parser.add_argument('--genes_to_annotate', type=str, nargs='*', help='Gene names to display.', default=None)
 
     # Genomic region
-    parser.add_argument('--start', type=int, required=True, help='Start position for the region of interest.')
-    parser.add_argument('--end', type=int, required=True, help='End position for the region of interest.')
-    parser.add_argument('--chrid', type=str, required=True, help='Chromosome ID.')
+    parser.add_argument('--start', type=int, help='Start position for the region of interest.')
+    parser.add_argument('--end', type=int, help='End position for the region of interest.')
+    parser.add_argument('--chrid', type=str, help='Chromosome ID.')
+    parser.add_argument('--regions', type=str, default=None,
+                        help="BED file of regions to plot in one run instead of --chrid/--start/--end. An --output_file ending in .pdf gets one page per region; otherwise one file per region is written, named after the BED name column (or chrom_start_end), or via {name}/{chrom}/{start}/{end} placeholders.")
 
     # Visualization parameters
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With --regions: number of processes drawing regions in parallel.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With --regions: read the data of this many upcoming regions in the background while the current one is drawn.')
     parser.add_argument('--track_min', type=float, default=None, help='Global minimum value for all BigWig tracks.')
     parser.add_argument('--track_max', type=float, default=None, help='Global maximum value for all BigWig tracks.')
     parser.add_argument('--output_file', type=str, default='comparison_tracks.pdf', help='Filename for the saved comparison tracks PDF.')
@@ -525,6 +463,8 @@ def main(argv=None):
     parser.add_argument('--track_width', type=float, default=10, help='Width of each track (in inches).')
     parser.add_argument('--track_height', type=float, default=1, help='Height of each BigWig/BED track (in inches).')
     parser.add_argument('--track_spacing', type=float, default=0.5, help='Spacing between tracks (in inches).')
+    parser.add_argument('--track_summary', type=str, default='none', choices=['none', 'mean', 'max', 'min'],
+                        help="Read BigWig tracks as per-pixel 'mean', 'max' or 'min' summaries sized to the track width instead of per-base values ('none').")
 
     # Colors for BigWig and BED tracks
     parser.add_argument('--colors_sample1', type=str, default="red", help='Colors for sample 1 BigWig tracks.')
@@ -536,9 +476,13 @@ def main(argv=None):
     parser.add_argument("-V", "--version", action="version",version="NGStrack {}".format(__version__)\
                       ,help="Print version and exit")
     args = parser.parse_args(argv)
+    if args.regions is None and (args.start is None or args.end is None or args.chrid is None):
+        parser.error("--start, --end and --chrid are required unless --regions is given.")
+    if args.regions is not None and (message := workers_conflict(args.output_file, args.workers)):
+        parser.error(message)
 
     # Call plot_tracks with the parsed arguments
-    plot_tracks(
+    options = dict(
         bigwig_files_sample1=args.bigwig_files_sample1,
         bigwig_labels_sample1=args.bigwig_labels_sample1,
         colors_sample1=args.colors_sample1,
@@ -559,9 +503,14 @@ def main(argv=None):
         output_file=args.output_file,
         layout=args.layout,
         track_width=args.track_width,
+        track_summary=None if args.track_summary == 'none' else args.track_summary,
         track_height=args.track_height,
         track_spacing=args.track_spacing
     )
+    if args.regions:
+        plot_regions(plot_tracks, options, args.regions, workers=args.workers, prefetch_depth=args.prefetch)
+    else:
+        plot_tracks(**options)
 
 if __name__ == '__main__':
     main()
@@ -1,23 +1,11 @@
 import argparse
 import os
-import pandas as pd
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-import pyBigWig
-import pyranges as pr
 import numpy as np
-import matplotlib.pyplot as plt
-import cooler
-from matplotlib.ticker import EngFormatter
-from matplotlib.colors import LogNorm
-import itertools
 import sys
-import scipy.sparse
-import matplotlib.gridspec as gridspec
-import matplotlib.colors as mcolors
-from matplotlib.patches import Arc
 from collections import defaultdict
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.normalize import normalize_matrix, MATRIX_DTYPES
+from HiCPlot.io import CONCURRENCY_MODES, parse_resolution
+from HiCPlot.batch import plot_regions, workers_conflict
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -31,12 +19,11 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     """
     Plot gene annotations on the given axis.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_gtf
     spacing_factor = 1.5
     chrom, start, end = region
-    # Load the GTF file using pyranges
-    gtf = pr.read_gtf(gtf_file)
-    # Filter relevant region
-    region_genes = gtf[(gtf.Chromosome == chrom) & (gtf.Start < end) & (gtf.End > start)]
+    region_genes = read_gtf(gtf_file, region)
 
     if region_genes.empty:
         print("No genes found in the specified region.")
@@ -44,7 +31,7 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
         return
 
     # Select the longest isoform for each gene
-    longest_isoforms = region_genes.df.loc[region_genes.df.groupby('gene_id')['End'].idxmax()]
+    longest_isoforms = region_genes.loc[region_genes.groupby('gene_id')['End'].idxmax()]
 
     y_offset = 0
     y_step = track_height * spacing_factor
@@ -57,8 +44,8 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
 
         ax.plot([gene['Start'], gene['End']], [y_offset, y_offset], color=color, lw=1)
 
-        exons = region_genes.df[
-            (region_genes.df['gene_id'] == gene['gene_id']) & (region_genes.df['Feature'] == 'exon')
+        exons = region_genes[
+            (region_genes['gene_id'] == gene['gene_id']) & (region_genes['Feature'] == 'exon')
         ]
         for _, exon in exons.iterrows():
             ax.add_patch(
@@ -89,43 +76,13 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     ax.set_xlabel("Position (Mb)")
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def read_bigwig(file_path, region):
-    """Read BigWig or bedGraph file and return positions and values."""
-    chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        bw = pyBigWig.open(file_path)
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            return None, None
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
-    return positions, values
-
 def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                       bigwig_files_sample2, bigwig_labels_sample2,
-                      region):
+                      region, store=None):
     """Compute the minimum and maximum values for BigWig tracks per type."""
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
     type_min_max = defaultdict(lambda: {'min': np.inf, 'max': -np.inf})
 
     def extract_type(label):
@@ -136,7 +93,7 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     for file, label in zip(combined_files, combined_labels):
         bw_type = extract_type(label)
-        positions, values = read_bigwig(file, region)
+        positions, values = store.read(file, region)
         if values is not None and len(values) > 0:
             current_min = np.nanmin(values)
             current_max = np.nanmax(values)
@@ -151,39 +108,18 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     return type_min_max
 
-def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
+def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None, store=None):
     """Plot RNA-seq/ChIP-seq expression from BigWig or bedGraph file on given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import TrackStore, source_name
     chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        bw = pyBigWig.open(file_path)
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
-            ax.axis('off')
-            return
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
+    if store is None:
+        store = TrackStore()
+    positions, values = store.read(file_path, region)
+    if positions is None or values is None:
+        print(f"No data found in the specified region ({chrom}:{start}-{end}) in {source_name(file_path)}")
+        ax.axis('off')
+        return
     
     ax.plot(positions, values, color=color, alpha=0.7)
     ax.set_xlim(start, end)
@@ -195,18 +131,14 @@ def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
         ax.set_ylim(y_min, 1)
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def plot_bed(ax, bed_file, region, color='green', linewidth=1):
+def plot_bed(ax, bed_file, region, color='green', linewidth=1, label=None):
     """Plot BED file annotations on the given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_bed, source_name
     chrom, start, end = region
-    bed_df = pd.read_csv(bed_file, sep='\t', header=None, comment='#', 
-                         names=['chrom', 'start', 'end'] + [f'col{i}' for i in range(4, 10)])
-    region_bed = bed_df[
-        (bed_df['chrom'] == chrom) &
-        (bed_df['end'] > start) &
-        (bed_df['start'] < end)
-    ]
+    region_bed = read_bed(bed_file, region)
     if region_bed.empty:
-        print(f"No BED entries found in the specified region ({chrom}:{start}-{end}) in {bed_file}")
+        print(f"No BED entries found in the specified region ({chrom}:{start}-{end}) in {source_name(bed_file)}")
         ax.axis('off')
         return
     
@@ -226,9 +158,12 @@ def plot_bed(ax, bed_file, region, color='green', linewidth=1):
     ax.set_xlim(start, end)
     ax.set_ylim(0, 1)
     ax.axis('off')
+    if label:
+        ax.set_title(label, fontsize=8)
 
 def pcolormesh_square(ax, matrix, start, end, NORM=True,cmap='autumn_r', vmin=None, vmax=None, *args, **kwargs):
     """Plot the difference matrix as a heatmap on the given axis."""
+    from matplotlib.colors import LogNorm
     if matrix is None:
         return None
     
@@ -244,23 +179,18 @@ def pcolormesh_square(ax, matrix, start, end, NORM=True,cmap='autumn_r', vmin=No
 
 def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, label=None):
     """Plot chromatin loops as arcs on the given axis."""
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Arc
+    from HiCPlot.io import read_loops, source_name
     chrom, start, end = region
-    loop_df = pd.read_csv(loop_file, sep='\t', header=0, usecols=[0,1,2,3,4,5],
-                          names=['chrom1', 'start1', 'end1', 'chrom2', 'start2', 'end2'])
-
-    loop_df = loop_df[
-        (loop_df['chrom1'] == chrom) &
-        (loop_df['chrom2'] == chrom) &
-        (loop_df['start1'] >= start) & (loop_df['end1'] <= end) &
-        (loop_df['start2'] >= start) & (loop_df['end2'] <= end)
-    ]
+    loop_df = read_loops(loop_file, region)
 
     if loop_df.empty:
-        print(f"No loops detected in the specified region ({chrom}:{start}-{end}) in {loop_file}.")
+        print(f"No loops detected in the specified region ({chrom}:{start}-{end}) in {source_name(loop_file)}.")
         ax.axis('off')
         return
     else:
-        print(f"Loops detected in the specified region ({chrom}:{start}-{end}) in {loop_file}.")
+        print(f"Loops detected in the specified region ({chrom}:{start}-{end}) in {source_name(loop_file)}.")
 
     max_height = 0 
 
@@ -313,65 +243,51 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                  bigwig_files_sample2=[], bigwig_labels_sample2=[], colors_sample2="blue",
                  bed_files_sample2=[], bed_labels_sample2=[], 
                  track_size=5, track_spacing=0.5, normalization_method='raw',
-                 genes_to_annotate=None):
+                 genes_to_annotate=None, track_summary=None, max_distance=None, dtype='float64',
+                 max_bins=None, max_matrix_mb=None, concurrent='none'):
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import EngFormatter
+    import matplotlib.gridspec as gridspec
+    from HiCPlot.io import cooler_call, load_with_tracks, auto_resolution, chrom_bounds, fetch_matrix, TrackStore, pixel_bins
+    plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 8
     
+    if cooler_file1 and (start is None or end is None):
+        # A chromosome without --start/--end is drawn whole.
+        start, end = chrom_bounds(cooler_file1, chrid, start, end)
     region = (chrid, start, end)
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(track_size))
+    if resolution == 'auto' and cooler_file1:
+        resolution = auto_resolution([f for f in (cooler_file1, cooler_file2) if f], end - start,
+                                     max_bins or pixel_bins(track_size), max_mb=max_matrix_mb, dtype=dtype)
+        print(f"Using resolution {resolution} bp")
+    band_bins = None if max_distance is None else int(np.ceil(max_distance / resolution))
     has_hic = cooler_file1 is not None
     single_sample = True
     
     normalized_data1 = None
     normalized_data2 = None
 
-    if has_hic:
-        # Load cooler data
-        clr1 = cooler.Cooler(f'{cooler_file1}::resolutions/{resolution}')
-        if format == "balance":
-            data1 = clr1.matrix(balance=True).fetch(region).astype(float)
-        elif format == "ICE":
-            data1 = clr1.matrix(balance=False).fetch(region).astype(float)
-        else:
-            print("input format is wrong")
-            return
+    if has_hic and format not in ("balance", "ICE"):
+        print("input format is wrong")
+        return
+    # Load both samples' cooler data and bigWig tracks, concurrently with --concurrent
+    cooler_files = [f for f in (cooler_file1, cooler_file2) if f] if has_hic else []
+    matrices = load_with_tracks(
+        [cooler_call(f, resolution, fetch_matrix, region, balance=format == "balance", max_bins=band_bins, dtype=dtype)
+         for f in cooler_files],
+        track_store, list(bigwig_files_sample1) + list(bigwig_files_sample2), region, mode=concurrent)
 
-        # Load sample2 data if provided
+    if has_hic:
+        data1 = matrices[0]
+        # Sample2 data if provided
         single_sample = cooler_file2 is None
         if not single_sample:
-            clr2 = cooler.Cooler(f'{cooler_file2}::resolutions/{resolution}')
-            if format == "balance":
-                data2 = clr2.matrix(balance=True).fetch(region).astype(float)
-            elif format == "ICE":
-                data2 = clr2.matrix(balance=False).fetch(region).astype(float)
-            else:
-                print("input format is wrong")
-                return
+            data2 = matrices[1]
 
         # Apply normalization to Hi-C matrices
-        if normalization_method == 'raw':
-            normalized_data1 = data1
-            normalized_data2 = data2 if not single_sample else None
-        elif normalization_method == 'logNorm':
-            normalized_data1 = np.maximum(data1, 0)
-            if not single_sample:
-                normalized_data2 = np.maximum(data2, 0)
-        elif normalization_method == 'log2':
-            normalized_data1 = np.log2(data1)
-            if not single_sample:
-                normalized_data2 = np.log2(data2)
-        elif normalization_method == 'log2_add1':
-            normalized_data1 = np.log2(data1 + 1)
-            if not single_sample:
-                normalized_data2 = np.log2(data2 + 1)
-        elif normalization_method == 'log':
-            normalized_data1 = np.log(data1)
-            if not single_sample:
-                normalized_data2 = np.log(data2)
-        elif normalization_method == 'log_add1':
-            normalized_data1 = np.log(data1 + 1)
-            if not single_sample:
-                normalized_data2 = np.log(data2 + 1)
-        else:
-            raise ValueError(f"Unsupported normalization method: {normalization_method}")
+        normalized_data1 = normalize_matrix(data1, normalization_method)
+        normalized_data2 = normalize_matrix(data2, normalization_method) if not single_sample else None
         
         # Determine vmin and vmax if not provided
         if vmin is None and vmax is None:
@@ -532,14 +448,14 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
         
         # BigWig Sample 1
         for i in range(len(bigwig_files_sample1)):
             ax_bw = f.add_subplot(gs[track_start_row + i, 0])
             bw_type = bigwig_labels_sample1[i].split("_")[1] if "_" in bigwig_labels_sample1[i] else "Unknown"
             y_min, y_max = type_min_max[bw_type]
-            plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max)
+            plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8)
         
         # BigWig Sample 2
@@ -548,7 +464,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                 ax_bw = f.add_subplot(gs[track_start_row + j, 1])
                 bw_type = bigwig_labels_sample2[j].split("_")[1] if "_" in bigwig_labels_sample2[j] else "Unknown"
                 y_min, y_max = type_min_max[bw_type]
-                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max)
+                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8)
         
         bed_start_row = track_start_row + max_num_bigwig_files
@@ -671,14 +587,14 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
         
         # BigWig 1
         for i in range(len(bigwig_files_sample1)):
             ax_bw = f.add_subplot(gs[current_row, 0])
             bw_type = bigwig_labels_sample1[i].split("_")[1] if "_" in bigwig_labels_sample1[i] else "Unknown"
             y_min, y_max = type_min_max[bw_type]
-            plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max)
+            plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8)
             current_row += 1
 
@@ -687,7 +603,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
             ax_bw = f.add_subplot(gs[current_row, 0])
             bw_type = bigwig_labels_sample2[j].split("_")[1] if "_" in bigwig_labels_sample2[j] else "Unknown"
             y_min, y_max = type_min_max[bw_type]
-            plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max)
+            plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8)
             current_row += 1
 
@@ -727,10 +643,26 @@ def main(argv=None):
     parser.add_argument('--cooler_file2', type=str, required=False, help='Path to the second .cool or .mcool file.', default=None)
     parser.add_argument('--format', type=str, default='balance', choices=['balance', 'ICE'], help='Format of .mcool file.')
 
-    parser.add_argument('--resolution', type=int, help='Resolution for the cooler data.')
+    parser.add_argument('--resolution', type=parse_resolution, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='With --resolution auto: most bins allowed across the window. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
+    parser.add_argument('--max_distance', type=int, default=None,
+                        help='Only fetch contacts up to this genomic distance (in bp) from the diagonal, read as sparse pixels; cells further out are treated as missing. Default: the whole window.')
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices and bigWig tracks in parallel with a 'thread' or 'process' pool. Default: one after the other.")
     parser.add_argument('--start', type=int, help='Start position for the region of interest.')
     parser.add_argument('--end', type=int, help='End position for the region of interest.')
     parser.add_argument('--chrid', type=str, help='Chromosome ID.')
+    parser.add_argument('--regions', type=str, default=None,
+                        help="BED file of regions to plot in one run instead of --chrid/--start/--end. An --output_file ending in .pdf gets one page per region; otherwise one file per region is written, named after the BED name column (or chrom_start_end), or via {name}/{chrom}/{start}/{end} placeholders.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With --regions: number of processes drawing regions in parallel.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With --regions: read the data of this many upcoming regions in the background while the current one is drawn.')
     parser.add_argument('--cmap', type=str, default='autumn_r', help='Colormap to be used for plotting.')
     parser.add_argument('--vmin', type=float, default=None, help='Minimum value for Hi-C matrix.')
     parser.add_argument('--vmax', type=float, default=None, help='Maximum value for Hi-C matrix.')
@@ -759,6 +691,8 @@ def main(argv=None):
     
     parser.add_argument('--track_size', type=float, default=5, help='Width of each track (in inches).')
     parser.add_argument('--track_spacing', type=float, default=0.5, help='Spacing between tracks (in inches).')
+    parser.add_argument('--track_summary', type=str, default='none', choices=['none', 'mean', 'max', 'min'],
+                        help="Read BigWig tracks as per-pixel 'mean', 'max' or 'min' summaries sized to the track width instead of per-base values ('none').")
 
     # Loop file arguments
     parser.add_argument('--loop_file_sample1', type=str, help='Path to the chromatin loop file for sample 1.', default=None)
@@ -774,10 +708,12 @@ def main(argv=None):
     args = parser.parse_args(argv)
 
     # Added validation check
-    if args.cooler_file1 is None and (args.start is None or args.end is None or args.chrid is None):
+    if args.regions is None and args.cooler_file1 is None and (args.start is None or args.end is None or args.chrid is None):
         parser.error("If --cooler_file1 is not provided, --start, --end, and --chrid must be specified to define the region.")
+    if args.regions is not None and (message := workers_conflict(args.output_file, args.workers)):
+        parser.error(message)
 
-    plot_heatmaps(
+    options = dict(
         cooler_file1=args.cooler_file1,
         sampleid1=args.sampleid1,
         bigwig_files_sample1=args.bigwig_files_sample1,
@@ -807,10 +743,20 @@ def main(argv=None):
         bed_files_sample2=args.bed_files_sample2,
         bed_labels_sample2=args.bed_labels_sample2,
         track_size=args.track_size,
+        track_summary=None if args.track_summary == 'none' else args.track_summary,
+        max_distance=args.max_distance,
+        max_bins=args.max_bins,
+        max_matrix_mb=args.max_matrix_mb,
+        concurrent=args.concurrent,
+        dtype=args.dtype,
         track_spacing=args.track_spacing,
         normalization_method=args.normalization_method,
         genes_to_annotate=args.genes_to_annotate,
         format=args.format
     )
+    if args.regions:
+        plot_regions(plot_heatmaps, options, args.regions, workers=args.workers, prefetch_depth=args.prefetch)
+    else:
+        plot_heatmaps(**options)
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -2,14 +2,9 @@
 import argparse
 import os
 import sys
-import cooler
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.colors import LogNorm
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-from matplotlib.ticker import FuncFormatter, MaxNLocator
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.normalize import MATRIX_DTYPES
+from HiCPlot.io import POOL_METHODS, CONCURRENCY_MODES, parse_resolution
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -43,8 +38,28 @@ def _prepare_region(chrom, start, end, chromsizes):
     return chrom, start, end
 
 
+def _window_span(chromsizes, chrid1, chrid2, start1, end1, start2, end2, merge_axes):
+    """Genomic length (bp) of the longest heatmap axis requested on the command line."""
+    chroms1 = _parse_csv_list(chrid1)
+    if merge_axes:
+        return sum(chromsizes[c] for c in chroms1 if c in chromsizes)
+    chroms2 = _parse_csv_list(chrid2) or chroms1
+    span = 0
+    for chroms, starts, ends in ((chroms1, start1, end1), (chroms2, start2, end2)):
+        starts = _pad(_parse_csv_list(starts, cast=int), len(chroms))
+        ends = _pad(_parse_csv_list(ends, cast=int), len(chroms))
+        for chrom, start, end in zip(chroms, starts, ends):
+            try:
+                _, start, end = _prepare_region(chrom, start, end, chromsizes)
+            except ValueError:
+                continue  # reported when the panels are drawn
+            span = max(span, end - start)
+    return span
+
+
 def _format_ticks(ax):
     """Format axes in Mb with two decimals."""
+    import matplotlib.pyplot as plt
     million = 1e6
     fmt = plt.FuncFormatter(lambda x, _: f"{x / million:.2f}")
     ax.xaxis.set_major_formatter(fmt)
@@ -53,42 +68,65 @@ def _format_ticks(ax):
 
 
 def _normalise(mat, method):
+    """Normalise *mat* in place (NaN/inf become 0) and return it."""
     if mat is None:
         return None
-    mat = mat.astype(float)
-    mat = np.nan_to_num(mat, nan=0.0, posinf=0.0, neginf=0.0)
+    if not np.issubdtype(mat.dtype, np.floating):
+        mat = mat.astype(float)
+    mat = np.nan_to_num(mat, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
     if method == "raw":
         return mat
     if method == "logNorm":
-        return np.where(mat > 0, mat, 1e-9)
+        mat[mat <= 0] = 1e-9
+        return mat
     with np.errstate(divide="ignore", invalid="ignore"):
         if method == "log2":
-            return np.log2(np.where(mat > 0, mat, 1e-9))
+            mat[mat <= 0] = 1e-9
+            return np.log2(mat, out=mat)
         if method == "log2_add1":
-            return np.log2(mat + 1)
+            return np.log2(np.add(mat, 1, out=mat), out=mat)
         if method == "log":
-            return np.log(np.where(mat > 0, mat, 1e-9))
+            mat[mat <= 0] = 1e-9
+            return np.log(mat, out=mat)
         if method == "log_add1":
-            return np.log(mat + 1)
+            return np.log(np.add(mat, 1, out=mat), out=mat)
     raise ValueError(f"Unsupported normalisation: {method}")
 
 def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
     start2,end2,output_file,format,cmap_name,vmin,vmax,layout,
     cooler_file2,sampleid1,sampleid2,track_size,track_spacing,
-    normalization_method,merge_axes):
+    normalization_method,merge_axes,dtype="float64",max_bins=None,max_matrix_mb=None,pool="mean",
+    concurrent="none"):
     """Render heatmaps as requested by command line."""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+    from HiCPlot.io import open_cooler, cooler_meta, fetch_matrix, fetch_canvas, gather, cooler_call, pixel_bins, auto_resolution, cooler_chromsizes
+    plt.rcParams['font.family'] = 'DejaVu Sans'
+
+    if resolution == "auto":
+        try:
+            span = _window_span(cooler_chromsizes(cooler_file1), chrid1, chrid2,
+                                start1, end1, start2, end2, merge_axes)
+            resolution = auto_resolution([f for f in (cooler_file1, cooler_file2) if f], span,
+                                         max_bins or pixel_bins(track_size), max_mb=max_matrix_mb, dtype=dtype)
+        except Exception as e:
+            sys.exit(f"Error choosing a resolution: {e}")
+        print(f"Using resolution {resolution} bp")
 
     try:
-        clr1 = cooler.Cooler(f"{cooler_file1}::resolutions/{resolution}")
+        clr1 = open_cooler(cooler_file1, resolution)
     except Exception as e:
         sys.exit(f"Error loading {cooler_file1}: {e}")
 
-    chromsizes1 = dict(zip(clr1.chromnames, clr1.chromsizes))
+    meta1 = cooler_meta(clr1)  # bin offsets and chromsizes, read once
+    chromsizes1 = meta1.chromsizes
 
     clr2 = chromsizes2 = None
     if cooler_file2:
         try:
-            clr2 = cooler.Cooler(f"{cooler_file2}::resolutions/{resolution}")
+            clr2 = open_cooler(cooler_file2, resolution)
             chromsizes2 = dict(zip(clr2.chromnames, clr2.chromsizes))
         except Exception as e:
             sys.exit(f"Error loading {cooler_file2}: {e}")
@@ -108,27 +146,13 @@ def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
         if any([start1, end1, start2, end2]):
             print("[warn] start/end ignored with --merge_axes; using whole chromosomes")
 
-        def build_canvas(clr, chromsizes, balance_arg):
-            if clr is None:
-                return None, None
-            bins = [int(np.ceil(chromsizes[c] / resolution)) for c in chrom_order]
-            edges = np.cumsum([0] + bins)
-            canvas = np.full((edges[-1], edges[-1]), 1e-9)
-            fetch = clr.matrix(balance=balance_arg, as_pixels=False)
-            for yi, cy in enumerate(chrom_order):
-                for xi, cx in enumerate(chrom_order):
-                    block = fetch.fetch(cy, cx).astype(float)
-                    # pad if last bin shorter than resolution
-                    pad = (bins[yi] - block.shape[0], bins[xi] - block.shape[1])
-                    if pad[0] or pad[1]:
-                        block = np.pad(block, ((0, pad[0]), (0, pad[1])), constant_values=1e-9)
-                    y0, y1 = edges[yi], edges[yi + 1]
-                    x0, x1 = edges[xi], edges[xi + 1]
-                    canvas[y0:y1, x0:x1] = block
-            return canvas, edges
-
-        mat1, edges = build_canvas(clr1, chromsizes1, balance_arg)
-        mat2, _ = build_canvas(clr2, chromsizes2, balance_arg) if clr2 else (None, None)
+        # Canvases are pooled during the scan so they never exceed the output pixel grid.
+        canvas_bins = max_bins or pixel_bins(track_size)
+        canvases = gather([cooler_call(f, resolution, fetch_canvas, chrom_order, balance=balance_arg, dtype=dtype,
+                                       max_bins=canvas_bins, pool=pool)
+                           for f in (cooler_file1, cooler_file2) if f], mode=concurrent)
+        mat1, edges, _ = canvases[0]
+        mat2 = canvases[1][0] if clr2 else None
         mats = [m for m in (mat1, mat2) if m is not None]
         mats_norm = [_normalise(m, normalization_method) for m in mats]
         finite = np.concatenate([m[np.isfinite(m) & (m > 0)] for m in mats_norm]) if mats_norm else np.array([])
@@ -212,7 +236,7 @@ def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
     end2 = _pad(end2, n_pairs)
 
     single_sample = cooler_file2 is None
-    mats1_raw, mats2_raw, regions, titles = [], [], [], []
+    mats1_raw, mats2_raw, regions, titles, pair_calls = [], [], [], [], []
 
     for i in range(n_pairs):
         c1, c2 = chrid1[i], chrid2[i]
@@ -230,15 +254,22 @@ def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
         titles.append(title)
 
         use_balance = (format in ("balance", "ICE"))
-        fetch1 = clr1.matrix(balance=use_balance, as_pixels=False)
-        mats1_raw.append(fetch1.fetch((r2_c, r2_s, r2_e), (r1_c, r1_s, r1_e)).astype(float))
+        calls = [cooler_call(cooler_file1, resolution, fetch_matrix, (r2_c, r2_s, r2_e), (r1_c, r1_s, r1_e),
+                             balance=use_balance, dtype=dtype)]
         if not single_sample and clr2:
-            fetch2 = clr2.matrix(balance=use_balance, as_pixels=False)
-            mats2_raw.append(fetch2.fetch((r1_c, r1_s, r1_e), (r2_c, r2_s, r2_e)).astype(float))
+            calls.append(cooler_call(cooler_file2, resolution, fetch_matrix, (r1_c, r1_s, r1_e), (r2_c, r2_s, r2_e),
+                                     balance=use_balance, dtype=dtype))
+        pair_calls.append(calls)
 
     if not regions:
         sys.exit("No valid regions to plot.")
 
+    # One gather for every pair, so a process pool opens each cooler once.
+    mats = iter(gather([call for calls in pair_calls for call in calls], mode=concurrent))
+    for calls in pair_calls:
+        mats1_raw.append(next(mats))
+        mats2_raw.extend(next(mats) for _ in calls[1:])
+
     mats1 = [_normalise(m, normalization_method) for m in mats1_raw]
     mats2 = [_normalise(m, normalization_method) for m in mats2_raw] if mats2_raw else []
     finite = np.concatenate([m[np.isfinite(m) & (m > 0)] for m in mats1 + mats2])
@@ -269,10 +300,8 @@ def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
                 ax.axis('off')
                 continue
             r1_c, r1_s, r1_e, r2_c, r2_s, r2_e = regions[ridx]
-            bx = clr1.bins().fetch((r1_c, r1_s, r1_e))  # X bins
-            by = clr1.bins().fetch((r2_c, r2_s, r2_e))  # Y bins
-            x0 = int(bx["start"].iloc[0])
-            y0 = int(by["start"].iloc[0])
+            x0 = meta1.bin_start(r1_c, r1_s)  # first X bin
+            y0 = meta1.bin_start(r2_c, r2_s)  # first Y bin
 
             im = ax.imshow(
                 np.ma.masked_invalid(mat),
@@ -287,8 +316,8 @@ def plot_heatmaps(cooler_file1,resolution,chrid1,chrid2,start1,end1,
             # ticks: bin index -> genomic Mb
             ax.xaxis.set_major_locator(MaxNLocator(8))
             ax.yaxis.set_major_locator(MaxNLocator(8))
-            ax.xaxis.set_major_formatter(FuncFormatter(lambda i, _: f"{(x0 + i*resolution)/1e6:.2f}"))
-            ax.yaxis.set_major_formatter(FuncFormatter(lambda i, _: f"{(y0 + i*resolution)/1e6:.2f}"))
+            ax.xaxis.set_major_formatter(FuncFormatter(lambda i, _, x0=x0: f"{(x0 + i*resolution)/1e6:.2f}"))
+            ax.yaxis.set_major_formatter(FuncFormatter(lambda i, _, y0=y0: f"{(y0 + i*resolution)/1e6:.2f}"))
             ax.tick_params(axis="both", labelsize=8)
 
             ax.set_xlabel(r1_c, fontsize=8, labelpad=4)
@@ -312,7 +341,17 @@ def main(argv=None):
     parser.add_argument('--cooler_file1', type=str, required=True, help='Path to the case .mcool file.')
     parser.add_argument('--cooler_file2', type=str, help='Path to secondary .mcool (optional)')
     parser.add_argument('--format', type=str, default='balance', choices=['balance', 'ICE'], help='Format of .mcool file.')
-    parser.add_argument('--resolution', type=int, required=True, help='Resolution for the cooler data.')
+    parser.add_argument('--resolution', type=parse_resolution, required=True, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='Most bins allowed along the longest heatmap axis: picks the resolution with --resolution auto, and pools merged genome-wide canvases down to this size. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
+    parser.add_argument('--pool', type=str, default='mean', choices=POOL_METHODS,
+                        help='How bins are pooled when a merged canvas exceeds --max_bins: nan-aware mean or sum.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices in parallel with a 'thread' or 'process' pool. Default: one after the other.")
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
 
     parser.add_argument('--chrid1', required=True, help='Chromosome ID(s) for X-axis (comma-sep)')
     parser.add_argument('--start1', type=int, help='Start position for the region of interest 1.')
@@ -360,6 +399,11 @@ def main(argv=None):
         track_spacing=args.track_spacing,
         normalization_method=args.normalization_method,
         merge_axes=args.merge_axes,
+        dtype=args.dtype,
+        max_bins=args.max_bins,
+        max_matrix_mb=args.max_matrix_mb,
+        pool=args.pool,
+        concurrent=args.concurrent,
     )
 
 if __name__ == '__main__':
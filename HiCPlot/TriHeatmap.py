@@ -2,21 +2,11 @@
 import argparse
 import os
 import sys
-import pandas as pd
-from matplotlib.colors import LogNorm
-import pyBigWig
-import pyranges as pr
 import numpy as np
-import matplotlib.pyplot as plt
-import cooler
-from matplotlib.ticker import EngFormatter
-import itertools
-import matplotlib.gridspec as gridspec
-import matplotlib.colors as mcolors
-from matplotlib.patches import Arc
 from collections import defaultdict
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.normalize import normalize_matrix, MATRIX_DTYPES
+from HiCPlot.io import CONCURRENCY_MODES, parse_resolution
+from HiCPlot.batch import plot_regions, workers_conflict
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -30,17 +20,18 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     """
     Plot gene annotations on the given axis.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_gtf
     spacing_factor = 1.5
     chrom, start, end = region
-    gtf = pr.read_gtf(gtf_file)
-    region_genes = gtf[(gtf.Chromosome == chrom) & (gtf.Start < end) & (gtf.End > start)]
+    region_genes = read_gtf(gtf_file, region)
 
     if region_genes.empty:
         print("No genes found in the specified region.")
         ax.axis('off')
         return
 
-    longest_isoforms = region_genes.df.loc[region_genes.df.groupby('gene_id')['End'].idxmax()]
+    longest_isoforms = region_genes.loc[region_genes.groupby('gene_id')['End'].idxmax()]
 
     y_offset = 0
     y_step = track_height * spacing_factor
@@ -53,8 +44,8 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
 
         ax.plot([gene['Start'], gene['End']], [y_offset, y_offset], color=color, lw=1)
 
-        exons = region_genes.df[
-            (region_genes.df['gene_id'] == gene['gene_id']) & (region_genes.df['Feature'] == 'exon')
+        exons = region_genes[
+            (region_genes['gene_id'] == gene['gene_id']) & (region_genes['Feature'] == 'exon')
         ]
         for _, exon in exons.iterrows():
             ax.add_patch(
@@ -85,43 +76,13 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     ax.set_xlabel("Position (Mb)")
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def read_bigwig(file_path, region):
-    """Read BigWig or bedGraph file and return positions and values."""
-    chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        bw = pyBigWig.open(file_path)
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            return None, None
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
-    return positions, values
-
 def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                       bigwig_files_sample2, bigwig_labels_sample2,
-                      region):
+                      region, store=None):
     """Compute the minimum and maximum values for BigWig tracks per type."""
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
     type_min_max = defaultdict(lambda: {'min': np.inf, 'max': -np.inf})
 
     def extract_type(label):
@@ -132,7 +93,7 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     for file, label in zip(combined_files, combined_labels):
         bw_type = extract_type(label)
-        positions, values = read_bigwig(file, region)
+        positions, values = store.read(file, region)
         if values is not None and len(values) > 0:
             current_min = np.nanmin(values)
             current_max = np.nanmax(values)
@@ -147,39 +108,18 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     return type_min_max
 
-def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
+def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None, store=None):
     """Plot RNA-seq/ChIP-seq expression from BigWig or bedGraph file on the given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import TrackStore
     chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        bw = pyBigWig.open(file_path)
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
-            ax.axis('off')
-            return
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
+    if store is None:
+        store = TrackStore()
+    positions, values = store.read(file_path, region)
+    if positions is None or values is None:
+        print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
+        ax.axis('off')
+        return
     
     ax.plot(positions, values, color=color, alpha=0.7)
     ax.set_xlim(start, end)
@@ -193,14 +133,10 @@ def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
 
 def plot_bed(ax, bed_file, region, color='green', label=None):
     """Plot BED regions as rectangles on the given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_bed
     chrom, start, end = region
-    bed_df = pd.read_csv(bed_file, sep='\t', header=None, comment='#', 
-                         names=['chrom', 'start', 'end'] + [f'col{i}' for i in range(3, 15)])
-    region_bed = bed_df[
-        (bed_df['chrom'] == chrom) &
-        (bed_df['end'] > start) &
-        (bed_df['start'] < end)
-    ]
+    region_bed = read_bed(bed_file, region)
     if region_bed.empty:
         print(f"No BED regions found in the specified region ({chrom}:{start}-{end}) in {bed_file}.")
         ax.axis('off')
@@ -226,16 +162,11 @@ def plot_bed(ax, bed_file, region, color='green', label=None):
 
 def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, label=None):
     """Plot chromatin loops as arcs on the given axis."""
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Arc
+    from HiCPlot.io import read_loops
     chrom, start, end = region
-    loop_df = pd.read_csv(loop_file, sep='\t', header=0, usecols=[0,1,2,3,4,5],
-                          names=['chrom1', 'start1', 'end1', 'chrom2', 'start2', 'end2'])
-
-    loop_df = loop_df[
-        (loop_df['chrom1'] == chrom) &
-        (loop_df['chrom2'] == chrom) &
-        (loop_df['start1'] >= start) & (loop_df['end1'] <= end) &
-        (loop_df['start2'] >= start) & (loop_df['end2'] <= end)
-    ]
+    loop_df = read_loops(loop_file, region)
 
     if loop_df.empty:
         print(f"No loops detected in the specified region ({chrom}:{start}-{end}) in {loop_file}.")
@@ -281,24 +212,91 @@ def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, la
     if label:
         ax.set_title(label, fontsize=8)
 
-def pcolormesh_triangle(ax, matrix, start=0, resolution=1, NORM=True,vmin=None, vmax=None, cmap='autumn_r', *args, **kwargs):
-    """Plot the Hi-C matrix as a triangular heatmap on the given axis."""
-    n = matrix.shape[0]
-    start_pos_vector = [start + resolution * i for i in range(len(matrix) + 1)]
-    t = np.array([[1, 0.5], [-1, 0.5]])
-    matrix_a = np.dot(
-            np.array([(i[1], i[0]) for i in itertools.product(start_pos_vector[::-1], start_pos_vector)]),
-            t)
-    x, y = matrix_a[:, 1].reshape(n + 1, n + 1), matrix_a[:, 0].reshape(n + 1, n + 1)
+TRIANGLE_BLOCK = 256  # matrix rows per QuadMesh when drawing a triangle
+
+
+def _triangle_mesh(start, resolution, i0, i1, j0, j1):
+    """
+    Vertex grid of the 45°‑rotated cells for matrix rows i0:i1 and columns j0:j1.
+
+    Cell (i, j) becomes a diamond centred at x = (pos_i + pos_j) / 2 with its
+    height y = pos_j - pos_i; rows are listed bottom‑up to match np.flipud.
+    """
+    col_edges = start + resolution * np.arange(j0, j1 + 1, dtype=float)
+    row_edges = start + resolution * np.arange(i1, i0 - 1, -1, dtype=float)
+    x = (col_edges[None, :] + row_edges[:, None]) / 2
+    y = col_edges[None, :] - row_edges[:, None]
+    return x, y
+
+def _band_block(band, i0, i1, j0, j1):
+    """Dense rows i0:i1 × columns j0:j1 of a banded matrix; cells outside the band are NaN."""
+    i = np.arange(i0, i1)[:, None]
+    d = np.arange(j0, j1)[None, :] - i
+    inside = (d >= 0) & (d < band.shape[0])
+    block = np.full(d.shape, np.nan, dtype=band.dtype)
+    block[inside] = band[d[inside], np.broadcast_to(i, d.shape)[inside]]
+    return block
+
+def pcolormesh_triangle(ax, matrix, start=0, resolution=1, NORM=True,vmin=None, vmax=None, cmap='autumn_r', *args, banded=False, **kwargs):
+    """
+    Plot the Hi-C matrix as a triangular heatmap on the given axis.
+
+    Only cells on or above the diagonal are emitted.  They are drawn as one
+    QuadMesh per block of TRIANGLE_BLOCK rows, starting each block at its own
+    diagonal, last block first so that cells overlap at block seams exactly
+    as in a single bottom‑up mesh.  All blocks share one norm.  The mesh of
+    the first block is returned; changing its cmap, clim or norm (e.g. via a
+    colorbar) changes every block.
+
+    With banded=True, *matrix* is a diagonal band as returned by
+    ``fetch_band`` (``matrix[d, i]`` is the contact between bins i and i + d)
+    and each block only spans the columns the band reaches.
+    """
+    from matplotlib.colors import LogNorm
+    import matplotlib.colors as mcolors
+    if banded:
+        depth, n = matrix.shape
+        block_rows = min(TRIANGLE_BLOCK, max(depth, 32))
+    else:
+        n = depth = matrix.shape[0]
+        block_rows = TRIANGLE_BLOCK
     if NORM:
         log_vmin = vmin if vmin is not None and vmin > 0 else None
         norm = LogNorm(vmin=log_vmin, vmax=vmax, clip=False)
-        im = ax.pcolormesh(x, y, np.flipud(matrix), norm=norm, cmap=cmap, *args, **kwargs)
     else:
-        im = ax.pcolormesh(x, y, np.flipud(matrix), vmin=vmin, vmax=vmax, cmap=cmap, *args, **kwargs)
+        norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
+    norm.autoscale_None(np.ma.masked_invalid(matrix))
+    meshes = []
+    for i0 in reversed(range(0, n, block_rows)):
+        i1 = min(n, i0 + block_rows)
+        j1 = min(n, i1 - 1 + depth)
+        if banded:
+            block = np.ma.masked_invalid(_band_block(matrix, i0, i1, i0, j1))
+        else:
+            block = np.ma.masked_invalid(matrix[i0:i1, i0:j1])
+            block[np.tri(i1 - i0, j1 - i0, k=-1, dtype=bool)] = np.ma.masked
+        x, y = _triangle_mesh(start, resolution, i0, i1, i0, j1)
+        im = ax.pcolormesh(x, y, np.flipud(block), norm=norm, cmap=cmap, *args, **kwargs)
+        im.set_rasterized(True)
+        meshes.append(im)
     ax.yaxis.set_visible(False)
-    im.set_rasterized(True)
-    return im
+    return _linked_mesh(meshes[::-1])
+
+def _linked_mesh(meshes):
+    """Return meshes[0], with changes to its cmap or norm applied to the other meshes too."""
+    def follow(first):
+        for mesh in meshes[1:]:
+            mesh.set_cmap(first.get_cmap())
+            mesh.set_norm(first.norm)
+    meshes[0].callbacks.connect('changed', follow)
+    return meshes[0]
+
+def _fetch_hic(clr, region, balance, band_bins=None, dtype='float64'):
+    """Fetch the full matrix, or only its diagonal band when *band_bins* is set."""
+    from HiCPlot.io import fetch_matrix, fetch_band
+    if band_bins is None:
+        return fetch_matrix(clr, region, balance=balance, dtype=dtype)
+    return fetch_band(clr, region, band_bins, balance=balance, dtype=dtype)
 
 def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                  bigwig_files_sample1=[], bigwig_labels_sample1=[], colors_sample1="red",
@@ -312,12 +310,29 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                  track_min=None,track_max=None,
                  output_file='comparison_heatmap.pdf', layout='horizontal',
                  track_width=10, track_height=1, track_spacing=0.5,
-                 normalization_method='raw', genes_to_annotate=None):
+                 normalization_method='raw', genes_to_annotate=None,
+                 track_summary=None, max_distance=None, dtype='float64',
+                 max_bins=None, max_matrix_mb=None, concurrent='none'):
     
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import EngFormatter
+    import matplotlib.gridspec as gridspec
+    from HiCPlot.io import cooler_call, load_with_tracks, auto_resolution, chrom_bounds, TrackStore, pixel_bins
+    plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 8
     track_spacing = track_spacing * 1.2
     small_colorbar_height = 0.1
+    if cooler_file1 and (start is None or end is None):
+        # A chromosome without --start/--end is drawn whole.
+        start, end = chrom_bounds(cooler_file1, chrid, start, end)
     region = (chrid, start, end)
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(track_width))
+    if resolution == 'auto' and cooler_file1:
+        resolution = auto_resolution([f for f in (cooler_file1, cooler_file2) if f], end - start,
+                                     max_bins or pixel_bins(track_width), max_mb=max_matrix_mb, dtype=dtype)
+        print(f"Using resolution {resolution} bp")
+    # With max_distance, only the band of diagonals up to that distance is fetched and drawn.
+    band_bins = None if max_distance is None else int(np.ceil(max_distance / resolution))
     
     # Initialize flags and data containers
     has_hic = cooler_file1 is not None
@@ -325,55 +340,26 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
     normalized_data1 = None
     normalized_data2 = None
 
-    if has_hic:
-        # Load cooler data
-        clr1 = cooler.Cooler(f'{cooler_file1}::resolutions/{resolution}')
-        if format == "balance":
-            data1 = clr1.matrix(balance=True).fetch(region).astype(float)
-        elif format == "ICE":
-            data1 = clr1.matrix(balance=False).fetch(region).astype(float)
-        else:
-            print("input format is wrong")
-            return
+    if has_hic and format not in ("balance", "ICE"):
+        print("input format is wrong")
+        return
+    # Load both samples' cooler data and bigWig tracks, concurrently with --concurrent
+    cooler_files = [f for f in (cooler_file1, cooler_file2) if f] if has_hic else []
+    matrices = load_with_tracks(
+        [cooler_call(f, resolution, _fetch_hic, region, format == "balance", band_bins, dtype)
+         for f in cooler_files],
+        track_store, list(bigwig_files_sample1) + list(bigwig_files_sample2), region, mode=concurrent)
 
-        # Load sample2 data if provided
+    if has_hic:
+        data1 = matrices[0]
+        # Sample2 data if provided
         single_sample = cooler_file2 is None
         if not single_sample:
-            clr2 = cooler.Cooler(f'{cooler_file2}::resolutions/{resolution}')
-            if format == "balance":
-                data2 = clr2.matrix(balance=True).fetch(region).astype(float)
-            elif format == "ICE":
-                data2 = clr2.matrix(balance=False).fetch(region).astype(float)
-            else:
-                print("input format is wrong")
-                return
+            data2 = matrices[1]
 
         # Apply normalization to Hi-C matrices
-        if normalization_method == 'raw':
-            normalized_data1 = data1
-            normalized_data2 = data2 if not single_sample else None
-        elif normalization_method == 'logNorm':
-            normalized_data1 = np.maximum(data1, 0)
-            if not single_sample:
-                normalized_data2 = np.maximum(data2, 0)
-        elif normalization_method == 'log2':
-            normalized_data1 = np.log2(data1)
-            if not single_sample:
-                normalized_data2 = np.log2(data2)
-        elif normalization_method == 'log2_add1':
-            normalized_data1 = np.log2(data1 + 1)
-            if not single_sample:
-                normalized_data2 = np.log2(data2 + 1)
-        elif normalization_method == 'log':
-            normalized_data1 = np.log(data1)
-            if not single_sample:
-                normalized_data2 = np.log(data2)
-        elif normalization_method == 'log_add1':
-            normalized_data1 = np.log(data1 + 1)
-            if not single_sample:
-                normalized_data2 = np.log(data2 + 1)
-        else:
-            raise ValueError(f"Unsupported normalization method: {normalization_method}")
+        normalized_data1 = normalize_matrix(data1, normalization_method)
+        normalized_data2 = normalize_matrix(data2, normalization_method) if not single_sample else None
         
         # Determine vmin and vmax
         if vmin is None and vmax is None:
@@ -469,7 +455,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         if has_hic:
             ax_heatmap1 = f.add_subplot(gs[current_row, 0])
             norm_bool = (normalization_method == "logNorm")
-            im1 = pcolormesh_triangle(ax_heatmap1, normalized_data1, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap)
+            im1 = pcolormesh_triangle(ax_heatmap1, normalized_data1, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap, banded=band_bins is not None)
             ax_heatmap1.set_aspect('auto')
             ax_heatmap1.set_ylim(0, normalized_data1.shape[0] * resolution)
             ax_heatmap1.set_xlim(start, end)
@@ -478,7 +464,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
             
             if ncols > 1 and cooler_file2:
                 ax_heatmap2 = f.add_subplot(gs[current_row, 1])
-                im2 = pcolormesh_triangle(ax_heatmap2, normalized_data2, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap)
+                im2 = pcolormesh_triangle(ax_heatmap2, normalized_data2, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap, banded=band_bins is not None)
                 ax_heatmap2.set_aspect('auto')
                 ax_heatmap2.set_ylim(0, normalized_data2.shape[0] * resolution)
                 ax_heatmap2.set_xlim(start, end)
@@ -526,7 +512,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
         
         track_start_row = current_row
         
@@ -536,7 +522,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                 bw_type = bigwig_labels_sample1[i].split("_")[1] if "_" in bigwig_labels_sample1[i] else "Unknown"
                 y_min, y_max = type_min_max[bw_type]
                 ax_bw = f.add_subplot(gs[track_start_row + i, 0])
-                plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max)
+                plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample1[i]} ({sampleid1})", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -548,7 +534,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                 bw_type = bigwig_labels_sample2[j].split("_")[1] if "_" in bigwig_labels_sample2[j] else "Unknown"
                 y_min, y_max = type_min_max[bw_type]
                 ax_bw = f.add_subplot(gs[track_start_row + j, 1])
-                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max)
+                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample2[j]} ({sampleid2})", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -634,7 +620,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         if has_hic:
             ax_heatmap1 = f.add_subplot(gs[current_row, 0])
             norm_bool = (normalization_method == "logNorm")
-            im1 = pcolormesh_triangle(ax_heatmap1, normalized_data1, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap)
+            im1 = pcolormesh_triangle(ax_heatmap1, normalized_data1, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap, banded=band_bins is not None)
             ax_heatmap1.set_aspect('auto')
             ax_heatmap1.set_ylim(0, normalized_data1.shape[0] * resolution)
             ax_heatmap1.set_xlim(start, end)
@@ -644,7 +630,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
             
             if not single_sample:
                 ax_heatmap2 = f.add_subplot(gs[current_row, 0])
-                im2 = pcolormesh_triangle(ax_heatmap2, normalized_data2, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap)
+                im2 = pcolormesh_triangle(ax_heatmap2, normalized_data2, start=region[1], resolution=resolution, NORM=norm_bool, vmin=vmin, vmax=vmax, cmap=cmap, banded=band_bins is not None)
                 ax_heatmap2.set_aspect('auto')
                 ax_heatmap2.set_ylim(0, normalized_data2.shape[0] * resolution)
                 ax_heatmap2.set_xlim(start, end)
@@ -675,7 +661,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
         else:
             type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
         
         # BigWig 1
         if bigwig_files_sample1:
@@ -683,7 +669,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                 bw_type = bigwig_labels_sample1[i].split("_")[1] if "_" in bigwig_labels_sample1[i] else "Unknown"
                 y_min, y_max = type_min_max[bw_type]
                 ax_bw = f.add_subplot(gs[current_row, 0])
-                plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max)
+                plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample1[i]} ({sampleid1})", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -696,7 +682,7 @@ def plot_heatmaps(cooler_file1=None, sampleid1=None,format="balance",
                 bw_type = bigwig_labels_sample2[j].split("_")[1] if "_" in bigwig_labels_sample2[j] else "Unknown"
                 y_min, y_max = type_min_max[bw_type]
                 ax_bw = f.add_subplot(gs[current_row, 0])
-                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max)
+                plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, y_min=y_min, y_max=y_max, store=track_store)
                 ax_bw.set_title(f"{bigwig_labels_sample2[j]} ({sampleid2})", fontsize=8)
                 ax_bw.set_xlim(start, end)
                 if y_min is not None and y_max is not None:
@@ -740,15 +726,31 @@ def main(argv: list[str] | None = None):
     parser.add_argument('--cooler_file2', type=str, required=False, help='Path to the second .mcool file.', default=None)
     parser.add_argument('--format', type=str, default='balance', choices=['balance', 'ICE'], help='Format of .mcool file.')
 
-    parser.add_argument('--resolution', type=int, default=10000, help='Resolution for the cooler data.')
+    parser.add_argument('--resolution', type=parse_resolution, default=10000, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='With --resolution auto: most bins allowed across the window. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
     parser.add_argument('--start', type=int, default=10500000, help='Start position for the region of interest.')
     parser.add_argument('--end', type=int, default=13200000, help='End position for the region of interest.')
     parser.add_argument('--chrid', type=str, default='chr2', help='Chromosome ID.')
+    parser.add_argument('--regions', type=str, default=None,
+                        help="BED file of regions to plot in one run instead of --chrid/--start/--end. An --output_file ending in .pdf gets one page per region; otherwise one file per region is written, named after the BED name column (or chrom_start_end), or via {name}/{chrom}/{start}/{end} placeholders.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With --regions: number of processes drawing regions in parallel.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With --regions: read the data of this many upcoming regions in the background while the current one is drawn.')
     parser.add_argument('--cmap', type=str, default='autumn_r', help='Colormap to be used for plotting.')
     parser.add_argument('--vmin', type=float, default=None, help='Minimum value for Hi-C matrix.')
     parser.add_argument('--vmax', type=float, default=None, help='Maximum value for Hi-C matrix.')
     parser.add_argument('--output_file', type=str, default='comparison_heatmap.pdf', help='Filename for the saved comparison heatmap PDF.')
     parser.add_argument('--layout', type=str, default='horizontal', choices=['horizontal', 'vertical'], help="Layout of the heatmaps: 'horizontal' or 'vertical'.")
+    parser.add_argument('--max_distance', type=int, default=None,
+                        help='Only fetch and draw contacts up to this genomic distance (in bp) from the diagonal. Default: the whole triangle.')
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices and bigWig tracks in parallel with a 'thread' or 'process' pool. Default: one after the other.")
     parser.add_argument('--sampleid1', type=str, default='Sample1', help='Sample ID for the first dataset.')
     parser.add_argument('--sampleid2', type=str, default='Sample2', help='Sample ID for the second dataset.')
     parser.add_argument('--gtf_file', type=str, required=False, help='Path to the GTF file for gene annotations.', default=None)
@@ -768,6 +770,8 @@ def main(argv: list[str] | None = None):
     parser.add_argument('--track_width', type=float, default=10, help='Width of each track (in inches).')
     parser.add_argument('--track_height', type=float, default=1, help='Height of each track (in inches).')
     parser.add_argument('--track_spacing', type=float, default=0.5, help='Spacing between tracks (in inches).')
+    parser.add_argument('--track_summary', type=str, default='none', choices=['none', 'mean', 'max', 'min'],
+                        help="Read BigWig tracks as per-pixel 'mean', 'max' or 'min' summaries sized to the track width instead of per-base values ('none').")
     
     parser.add_argument('--normalization_method', type=str, default='raw', choices=['raw', 'logNorm','log2', 'log2_add1','log','log_add1'],
                         help="Method for normalization: 'raw', 'logNorm','log2', 'log2_add1', 'log', or 'log_add1'.")
@@ -781,13 +785,15 @@ def main(argv: list[str] | None = None):
     args = parser.parse_args(argv)
 
     # Added validation check
-    if args.cooler_file1 is None and (args.start is None or args.end is None or args.chrid is None):
+    if args.regions is None and args.cooler_file1 is None and (args.start is None or args.end is None or args.chrid is None):
         # We need explicit start/end/chrid if not inferring from cooler (though typically start/end are arguments anyway)
         # In TriHeatmap, start/end are defaults, but it's good practice to ensure the user knows they rely on these.
         # Actually, TriHeatmap has defaults for start/end in argparse, but if the user wants a specific region without cooler...
         pass 
+    if args.regions is not None and (message := workers_conflict(args.output_file, args.workers)):
+        parser.error(message)
 
-    plot_heatmaps(
+    options = dict(
         cooler_file1=args.cooler_file1,
         sampleid1=args.sampleid1,
         bigwig_files_sample1=args.bigwig_files_sample1,
@@ -817,12 +823,22 @@ def main(argv: list[str] | None = None):
         output_file=args.output_file,
         layout=args.layout,
         track_width=args.track_width,
+        track_summary=None if args.track_summary == 'none' else args.track_summary,
         track_height=args.track_height,
         track_spacing=args.track_spacing,
         normalization_method=args.normalization_method,
         genes_to_annotate=args.genes_to_annotate,
-        format=args.format
+        format=args.format,
+        max_distance=args.max_distance,
+        max_bins=args.max_bins,
+        max_matrix_mb=args.max_matrix_mb,
+        concurrent=args.concurrent,
+        dtype=args.dtype
     )
+    if args.regions:
+        plot_regions(plot_heatmaps, options, args.regions, workers=args.workers, prefetch_depth=args.prefetch)
+    else:
+        plot_heatmaps(**options)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,20 +1,4 @@
-from .TriHeatmap import main
-main()
+from HiCPlot.Cli import main
 
-from .SquHeatmapTrans import main
-main()
-
-from .SquHeatmap import main
-main()
-
-from .upper_lower_triangle_heatmap import main
-main()
-
-from .DiffSquHeatmap import main
-main()
-
-from .NGStrack import main
-main()
-
-from .DiffSquHeatmapTrans main
-main()
+if __name__ == "__main__":
+    main()
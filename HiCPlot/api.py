@@ -0,0 +1,76 @@
+"""
+HiCPlot/api.py
+---------------------------------------------------------------------
+Python API: figures drawn from files, open coolers or in‑memory data and
+returned as matplotlib Figures instead of being written to a file.
+
+    >>> from HiCPlot.api import figure, heatmap
+    >>> fig = heatmap(matrix, 'chr1:1,000,000-3,000,000', kind='triangle')
+    >>> fig = figure([
+    ...     {'type': 'triangle', 'cooler': clr, 'max_distance': 500_000},
+    ...     {'type': 'bigwig', 'file': coverage, 'label': 'ATAC'},
+    ...     {'type': 'bed', 'file': peaks_df},
+    ... ], region=('chr1', 1_000_000, 3_000_000))
+    >>> fig.savefig('figure.pdf', bbox_inches='tight')
+
+Panels are those of ``HiCPlot render`` specs (see HiCPlot.render) and take
+the same keys, but every data source may also be held in memory:
+
+* ``cooler`` / ``cooler2``: an open ``cooler.Cooler`` (read at its own bin
+  size), or a NumPy contact matrix covering the region.  A non‑square array
+  in a triangle panel is a diagonal band as returned by ``fetch_band``.
+  Without a ``resolution`` the bin size is the region span over the number
+  of bins.
+* ``file`` of a bigwig panel: an array of values spread evenly over the
+  region, or a ``(positions, values)`` pair.
+* ``file`` of bed and loops panels: a DataFrame whose first three (BED) or
+  six (BEDPE) columns hold the intervals.
+* ``gtf`` of a genes panel: a DataFrame with the ``GTF_COLUMNS`` of
+  HiCPlot.io.genes, e.g. the ``df`` of a PyRanges.
+
+In‑memory data is never written to disk and never modified, so a session
+can draw the same arrays many times without any file I/O.  Matrices read
+from open coolers can be kept across calls with
+``HiCPlot.io.keep_recent_matrices``.
+"""
+from HiCPlot.render import FIGURE_OPTIONS, build_figure, check_panels, spec_regions
+
+
+def _region(region):
+    """(chrom, start, end) from a tuple or a ``chrom:start-end`` string."""
+    if isinstance(region, str):
+        region = spec_regions([region])[0]
+    chrom, start, end = region[:3]
+    return chrom, int(start), int(end)
+
+
+def figure(panels, region, **options):
+    """
+    Return the Figure of *panels* stacked top to bottom over *region*.
+
+    *region* is ``(chrom, start, end)`` or ``'chrom:start-end'``; *options*
+    are the figure options of a render spec (``resolution``, ``width``,
+    ``balance``, ``dtype``, ``concurrent``, ``track_summary``, ``max_bins``,
+    ``max_matrix_mb``, ``title``).
+    """
+    unknown = sorted(set(options) - set(FIGURE_OPTIONS))
+    if unknown:
+        raise ValueError(f"Unknown figure options {unknown}; choose among {list(FIGURE_OPTIONS)}.")
+    panels = list(panels)
+    check_panels(panels)
+    chrom, start, end = _region(region)
+    return build_figure(panels, chrom, start, end, **options)
+
+
+def heatmap(matrix, region, kind='square', matrix2=None, **options):
+    """
+    Return a Figure with one heatmap panel of *kind* ('square', 'triangle',
+    'diff' or 'split') drawn from *matrix* (and *matrix2* for diff and split).
+
+    *matrix* may be a NumPy array, an open ``cooler.Cooler`` or a cooler file.
+    *options* are panel keys (``normalization``, ``cmap``, ``vmin``, ...) or
+    figure options (see ``figure``).
+    """
+    figure_options = {key: options.pop(key) for key in FIGURE_OPTIONS if key in options}
+    panel = dict(options, type=kind, cooler=matrix, cooler2=matrix2)
+    return figure([panel], region, **figure_options)
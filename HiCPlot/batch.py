@@ -0,0 +1,169 @@
+"""
+HiCPlot/batch.py
+---------------------------------------------------------------------
+Batch rendering of many regions in one process (``--regions regions.bed``).
+
+Every region of the BED file is drawn by the same interpreter, so imports,
+opened coolers, GTF indexes and parsed annotation tables are reused from one
+region to the next.  An output file ending in ``.pdf`` collects all regions
+as pages of one PDF; any other name (or one containing a ``{name}``,
+``{chrom}``, ``{start}`` or ``{end}`` placeholder) is expanded into one file
+per region.
+
+Overlapping or abutting regions (e.g. 2 Mb windows tiled every 1 Mb) are
+merged into super‑windows by ``plan_windows``; each super‑window is read
+from the coolers once, as a diagonal band as wide as its widest region, and
+every region is cut out of it (see ``HiCPlot.io.super_windows``).
+
+With ``--workers N`` the regions are spread over a pool of N processes, one
+group of regions sharing a super‑window at a time.  Each worker keeps its own
+opened coolers and bigWig files for all regions it draws; the regions then
+have to be written to one file each.
+
+With ``--prefetch K`` the coolers and tracks of the next K regions are read
+in the background while the current one is drawn (see
+``HiCPlot.io.prefetch``).
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from HiCPlot.io.concurrent import prefetch
+from HiCPlot.io.tabix import open_text
+
+# Without a fixed resolution, super-windows span at most this many region widths.
+SUPER_WINDOW_REGIONS = 4
+
+
+def read_regions(bed_file):
+    """
+    Return ``(chrom, start, end, name)`` for every line of *bed_file*.
+
+    *name* is the fourth BED column, or ``chrom_start_end`` when absent.
+    """
+    regions = []
+    with open_text(bed_file) as fh:
+        for line in fh:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+            name = fields[3] if len(fields) > 3 and fields[3] else f"{chrom}_{start}_{end}"
+            regions.append((chrom, start, end, name.replace(os.sep, '_')))
+    if not regions:
+        raise ValueError(f"No regions found in {bed_file}.")
+    return regions
+
+
+def multipage_output(output_file):
+    """True when every region should become a page of *output_file*."""
+    return output_file.lower().endswith('.pdf') and '{' not in output_file
+
+
+def workers_conflict(output_file, workers):
+    """Error message when *output_file* cannot be written by *workers* processes, else None."""
+    if workers > 1 and multipage_output(output_file):
+        return ("A multi-page PDF is written by a single process; with --workers, "
+                "give --output_file a per-region name such as 'heatmap.{name}.pdf'.")
+    return None
+
+
+def region_output(output_file, chrom, start, end, name):
+    """File name for one region: placeholders are filled, otherwise *name* goes before the extension."""
+    if '{' in output_file:
+        return output_file.format(name=name, chrom=chrom, start=start, end=end)
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}.{name}{ext}"
+
+
+def plan_windows(regions, max_span=None, max_regions=None):
+    """
+    Merge overlapping or abutting *regions* into super‑windows.
+
+    Returns ``(chrom, start, end, members)`` tuples, *members* being indexes
+    into *regions*.  A super‑window grows while it spans at most *max_span* bp
+    and holds at most *max_regions* regions (None: unlimited).
+    """
+    windows = []
+    for i in sorted(range(len(regions)), key=lambda i: regions[i][:3]):
+        chrom, start, end = regions[i][:3]
+        if windows:
+            w_chrom, w_start, w_end, members = windows[-1]
+            if (w_chrom == chrom and start <= w_end
+                    and (max_span is None or max(end, w_end) - w_start <= max_span)
+                    and (max_regions is None or len(members) < max_regions)):
+                windows[-1] = (w_chrom, w_start, max(end, w_end), members + [i])
+                continue
+        windows.append((chrom, start, end, [i]))
+    return windows
+
+
+def _plot_regions(plot, windows, region_options, prefetch_depth=0, prefetch_mode='thread'):
+    with ExitStack() as stack:
+        if windows:
+            from HiCPlot.io.matrix import super_windows  # imports cooler; only heatmap batches need it
+            stack.enter_context(super_windows(windows))
+        if prefetch_depth > 0:
+            regions = [(opts['chrid'], opts['start'], opts['end']) for opts in region_options]
+            stack.enter_context(prefetch(regions, prefetch_depth, prefetch_mode))
+        for options in region_options:
+            plot(**options)
+
+
+def plot_regions(plot, options, regions, workers=1, prefetch_depth=0):
+    """
+    Call ``plot(**options)`` once per region of *regions*, a BED file or a
+    list of ``(chrom, start, end, name)`` tuples.
+
+    ``chrid``, ``start``, ``end`` and ``output_file`` of *options* are
+    replaced for every region (see module docstring for output naming).
+    With *workers* > 1 the regions are drawn by a process pool, so *plot*
+    must be a module‑level (picklable) function.  With *prefetch_depth* > 0,
+    the loads of that many upcoming regions run in a background thread (a
+    process with ``concurrent='process'``) while a region is drawn.
+    """
+    import matplotlib.pyplot as plt
+    source = regions if isinstance(regions, str) else None
+    if source is not None:
+        regions = read_regions(source)
+    output_file = options['output_file']
+    multipage = multipage_output(output_file)
+    if (message := workers_conflict(output_file, workers)):
+        raise ValueError(message)
+    resolution = options.get('resolution')
+    if isinstance(resolution, int):
+        from HiCPlot.io.matrix import SUPER_WINDOW_BINS
+        max_span = SUPER_WINDOW_BINS * resolution
+    else:
+        max_span = SUPER_WINDOW_REGIONS * max(end - start for _, start, end, _ in regions)
+    max_regions = math.ceil(len(regions) / workers) if workers > 1 else None
+    pipeline = (prefetch_depth, 'process' if options.get('concurrent') == 'process' else 'thread')
+    # Only tools reading coolers (those taking a resolution) share super-windows.
+    windows = [w for w in plan_windows(regions, max_span, max_regions)
+               if len(w[3]) > 1 and 'resolution' in options]
+    # Each window is read as a band as wide as its widest region.
+    shared = [(chrom, start, end, max(regions[i][2] - regions[i][1] for i in members))
+              for chrom, start, end, members in windows]
+    region_options = [{**options, 'chrid': chrom, 'start': start, 'end': end,
+                       'output_file': None if multipage else region_output(output_file, chrom, start, end, name)}
+                      for chrom, start, end, name in regions]
+
+    if multipage:
+        from matplotlib.backends.backend_pdf import PdfPages
+        # savefig() on a PdfPages object appends a page; the format must be given explicitly.
+        with PdfPages(output_file) as pdf, plt.rc_context({'savefig.format': 'pdf'}):
+            _plot_regions(plot, shared, [{**opts, 'output_file': pdf} for opts in region_options], *pipeline)
+    elif workers > 1 and len(regions) > 1:
+        # One task per super-window (and one per remaining region), so each window is read by one worker.
+        grouped = set(i for *_, members in windows for i in members)
+        tasks = [([window], [region_options[i] for i in members])
+                 for window, (*_, members) in zip(shared, windows)]
+        tasks += [([], [opts]) for i, opts in enumerate(region_options) if i not in grouped]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(_plot_regions, plot, *task, *pipeline) for task in tasks]
+            for future in futures:
+                future.result()
+    else:
+        _plot_regions(plot, shared, region_options, *pipeline)
+    print(f"Plotted {len(regions)} regions" + (f" from {source}" if source else ""))
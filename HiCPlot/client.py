@@ -0,0 +1,65 @@
+"""
+HiCPlot/client.py
+---------------------------------------------------------------------
+``HiCPlot client <tool> [options]``: run a sub‑command on a ``HiCPlot serve``
+process instead of starting a cold one.
+
+The tool's arguments are forwarded unchanged together with the current
+directory and the server's secret (read from its token file); the tool's
+output and exit status are relayed back.  Only the
+standard library is imported, so a call costs little more than the render
+itself.
+"""
+import argparse
+import json
+import os
+import sys
+
+from HiCPlot.serve import UnixHTTPConnection, default_socket, read_token, token_file
+
+
+def request_render(argv, socket_path=None, port=None, timeout=None):
+    """Send ``HiCPlot *argv*`` to the server; return its ``(status, stdout, stderr)``."""
+    import http.client
+
+    if port is not None:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    else:
+        connection = UnixHTTPConnection(socket_path or default_socket(), timeout=timeout)
+    token = read_token(token_file(socket_path, port))
+    try:
+        body = json.dumps({'argv': list(argv), 'cwd': os.getcwd()})
+        connection.request('POST', '/render', body=body,
+                           headers={'Content-Type': 'application/json', 'X-HiCPlot-Token': token})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise ConnectionError(f"HiCPlot server answered {response.status} {response.reason}")
+        reply = json.loads(response.read())
+    finally:
+        connection.close()
+    return reply['status'], reply['stdout'], reply['stderr']
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='Run a HiCPlot sub-command on a running "HiCPlot serve" process.')
+    parser.add_argument('--socket', type=str, default=None,
+                        help=f'Unix socket of the server. Default: {default_socket()}')
+    parser.add_argument('--port', type=int, default=None, help='TCP port of a server started with --port.')
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds to wait for the render.')
+    parser.add_argument('tool', help='Sub-command to run, e.g. SquHeatmap.')
+    parser.add_argument('tool_args', nargs=argparse.REMAINDER, help='Arguments of the sub-command.')
+    args = parser.parse_args(argv)
+    try:
+        status, out, err = request_render([args.tool, *args.tool_args], args.socket, args.port, args.timeout)
+    except (OSError, ConnectionError) as exc:
+        print(f"Could not reach the HiCPlot server ({exc}); start it with 'HiCPlot serve'.", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
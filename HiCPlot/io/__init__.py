@@ -0,0 +1,66 @@
+"""
+HiCPlot/io
+---------------------------------------------------------------------
+Shared, region‑aware readers for every file type HiCPlot draws from.
+
+The plotting tools never open files themselves; they call the helpers
+re‑exported here so that caching or indexing added to one reader benefits
+every sub‑command.
+"""
+import importlib
+
+# Public name → submodule defining it.  Submodules are imported on first
+# attribute access (PEP 562), so a tool only pays for the readers it uses:
+# NGStrack never imports cooler, and nothing imports pyranges until a GTF
+# index has to be built.
+_EXPORTS = {
+    "open_cooler": "HiCPlot.io.matrix",
+    "cooler_meta": "HiCPlot.io.matrix",
+    "CoolerMeta": "HiCPlot.io.matrix",
+    "fetch_matrix": "HiCPlot.io.matrix",
+    "fetch_band": "HiCPlot.io.matrix",
+    "fetch_canvas": "HiCPlot.io.matrix",
+    "canvas_factor": "HiCPlot.io.matrix",
+    "pool_matrix": "HiCPlot.io.matrix",
+    "POOL_METHODS": "HiCPlot.io.matrix",
+    "parse_resolution": "HiCPlot.io.matrix",
+    "list_resolutions": "HiCPlot.io.matrix",
+    "cooler_chromsizes": "HiCPlot.io.matrix",
+    "chrom_bounds": "HiCPlot.io.matrix",
+    "auto_resolution": "HiCPlot.io.matrix",
+    "super_windows": "HiCPlot.io.matrix",
+    "SUPER_WINDOW_BINS": "HiCPlot.io.matrix",
+    "keep_recent_matrices": "HiCPlot.io.matrix",
+    "read_bigwig": "HiCPlot.io.tracks",
+    "read_bedgraph": "HiCPlot.io.tracks",
+    "pixel_bins": "HiCPlot.io.tracks",
+    "TrackStore": "HiCPlot.io.tracks",
+    "array_track": "HiCPlot.io.tracks",
+    "is_path": "HiCPlot.io.tracks",
+    "source_name": "HiCPlot.io.tracks",
+    "read_bed": "HiCPlot.io.annotations",
+    "read_loops": "HiCPlot.io.annotations",
+    "read_gtf": "HiCPlot.io.genes",
+    "build_gtf_index": "HiCPlot.io.genes",
+    "build_tabix_index": "HiCPlot.io.tabix",
+    "tabix_index_path": "HiCPlot.io.tabix",
+    "CONCURRENCY_MODES": "HiCPlot.io.concurrent",
+    "gather": "HiCPlot.io.concurrent",
+    "cooler_call": "HiCPlot.io.concurrent",
+    "load_with_tracks": "HiCPlot.io.concurrent",
+    "prefetch": "HiCPlot.io.concurrent",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,86 @@
+"""
+HiCPlot/io/annotations.py
+---------------------------------------------------------------------
+Interval annotations: BED peaks and BEDPE chromatin loops.
+GTF gene models are served by HiCPlot.io.genes.
+
+Both readers use tabix random access when the file is bgzipped and indexed
+(see HiCPlot.io.tabix) and otherwise read the whole table once per process,
+so batch runs over many regions parse each file a single time.  A pandas
+DataFrame may be passed instead of a file; it is filtered in memory.
+"""
+import os
+from collections import OrderedDict
+
+import pandas as pd
+from HiCPlot.io.tabix import tabix_lines
+
+# Most recently used parsed tables kept per process (a long-running
+# ``HiCPlot serve`` would otherwise keep every table it ever read).
+MAX_TABLES = 32
+_TABLES = OrderedDict()
+
+
+def _read_table(file_path, **read_csv_kwargs):
+    """Whole table of an unindexed file, parsed once per process (reparsed if the file changes)."""
+    file_path = os.path.abspath(file_path)
+    info = os.stat(file_path)
+    stamp = (info.st_size, info.st_mtime_ns)
+    key = (file_path, repr(sorted(read_csv_kwargs.items())))
+    cached = _TABLES.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _TABLES[key] = (stamp, pd.read_csv(file_path, sep='\t', **read_csv_kwargs))
+    _TABLES.move_to_end(key)
+    while len(_TABLES) > MAX_TABLES:
+        _TABLES.popitem(last=False)
+    return cached[1]
+
+
+def _rows_to_frame(lines, columns, dtypes):
+    """Parse the leading fields of tab‑separated *lines* into a DataFrame."""
+    n = len(columns)
+    rows = [line.rstrip('\n').split('\t')[:n] for line in lines]
+    return pd.DataFrame(rows, columns=columns).astype(dtypes)
+
+
+def read_bed(bed_file, region):
+    """Return the BED entries overlapping *region* (columns chrom, start, end)."""
+    chrom, start, end = region
+    if isinstance(bed_file, pd.DataFrame):
+        bed_df = bed_file.iloc[:, :3].set_axis(['chrom', 'start', 'end'], axis=1)
+    elif (lines := tabix_lines(bed_file, region)) is not None:
+        bed_df = _rows_to_frame(lines, ['chrom', 'start', 'end'],
+                                {'chrom': str, 'start': int, 'end': int})
+    else:
+        bed_df = _read_table(bed_file, header=None, comment='#',
+                             usecols=[0, 1, 2], names=['chrom', 'start', 'end'])
+    return bed_df[
+        (bed_df['chrom'] == chrom) &
+        (bed_df['end'] > start) &
+        (bed_df['start'] < end)
+    ]
+
+
+def read_loops(loop_file, region):
+    """
+    Return the intra‑chromosomal loops whose two anchors both lie in *region*.
+
+    The loop file is a BEDPE‑like table with a header line; only its first six
+    columns (chrom1, start1, end1, chrom2, start2, end2) are used.  Indexed
+    loop files are queried on the first anchor.
+    """
+    chrom, start, end = region
+    columns = ['chrom1', 'start1', 'end1', 'chrom2', 'start2', 'end2']
+    if isinstance(loop_file, pd.DataFrame):
+        loop_df = loop_file.iloc[:, :6].set_axis(columns, axis=1)
+    elif (lines := tabix_lines(loop_file, region)) is not None:
+        loop_df = _rows_to_frame(lines, columns, {'chrom1': str, 'start1': int, 'end1': int,
+                                                  'chrom2': str, 'start2': int, 'end2': int})
+    else:
+        loop_df = _read_table(loop_file, header=0, usecols=[0, 1, 2, 3, 4, 5], names=columns)
+    return loop_df[
+        (loop_df['chrom1'] == chrom) &
+        (loop_df['chrom2'] == chrom) &
+        (loop_df['start1'] >= start) & (loop_df['end1'] <= end) &
+        (loop_df['start2'] >= start) & (loop_df['end2'] <= end)
+    ]
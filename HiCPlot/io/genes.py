@@ -0,0 +1,173 @@
+"""
+HiCPlot/io/genes.py
+---------------------------------------------------------------------
+Gene models from GTF files, served from a compact per‑chromosome index.
+
+Parsing a full GENCODE GTF takes tens of seconds, so the first read of a GTF
+converts its gene, transcript and exon records into an ``.npz`` sidecar
+(``<gtf>.hicplot.npz``) stamped with the GTF's size and modification time.
+Later reads load only the arrays of the requested chromosome and locate the
+overlapping records with two binary searches.  A stale or missing sidecar is
+rebuilt transparently; if the GTF's directory is read‑only the index is
+written to ``~/.cache/hicplot`` instead.
+"""
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+INDEX_SUFFIX = '.hicplot.npz'
+INDEX_VERSION = 1
+GENE_FEATURES = ('gene', 'transcript', 'exon')
+GTF_COLUMNS = ['Chromosome', 'Feature', 'Start', 'End', 'gene_id', 'gene_name']
+_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hicplot')
+
+# Indexes already opened in this process, keyed by absolute GTF path.
+_open_indexes = {}
+
+
+def _stamp(gtf_file):
+    st = os.stat(gtf_file)
+    return np.array([INDEX_VERSION, st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def _index_paths(gtf_file):
+    """Return the sidecar path and the per‑user fallback path for *gtf_file*."""
+    digest = hashlib.sha1(os.path.abspath(gtf_file).encode()).hexdigest()[:16]
+    fallback = os.path.join(_CACHE_DIR, f"{os.path.basename(gtf_file)}.{digest}{INDEX_SUFFIX}")
+    return gtf_file + INDEX_SUFFIX, fallback
+
+
+class _GeneIndex:
+    """Lazy view over the arrays of a GTF index (an open .npz or an in‑memory dict)."""
+
+    def __init__(self, arrays):
+        self._arrays = arrays
+        self.stamp = arrays['stamp']
+        self.gene_id = arrays['gene_id']
+        self.gene_name = arrays['gene_name']
+        self._chroms = {}
+
+    def chrom(self, chrom):
+        """Return (start, end, reach, gene, feature) arrays for *chrom*, or None."""
+        if chrom not in self._chroms:
+            try:
+                self._chroms[chrom] = tuple(self._arrays[f'{field}/{chrom}']
+                                            for field in ('start', 'end', 'reach', 'gene', 'feature'))
+            except KeyError:
+                self._chroms[chrom] = None
+        return self._chroms[chrom]
+
+
+def _index_arrays(gtf_file):
+    """Parse *gtf_file* and return the arrays making up its index."""
+    stamp = _stamp(gtf_file)
+    import pyranges as pr  # slow to import and only needed to (re)build an index
+    df = pr.read_gtf(gtf_file).df
+    df = df[df['Feature'].isin(GENE_FEATURES)]
+
+    gene_codes, gene_ids = pd.factorize(df['gene_id'].astype(str))
+    names = df['gene_name'] if 'gene_name' in df.columns else df['gene_id']
+    first_row = pd.Series(np.arange(len(gene_codes))).groupby(gene_codes).first().to_numpy()
+    gene_names = names.fillna('').astype(str).to_numpy()[first_row]
+
+    chroms = df['Chromosome'].astype(str).to_numpy()
+    starts = df['Start'].to_numpy(dtype=np.int64)
+    ends = df['End'].to_numpy(dtype=np.int64)
+    features = pd.Categorical(df['Feature'].astype(str), categories=GENE_FEATURES).codes.astype(np.int8)
+    genes = gene_codes.astype(np.int32)
+
+    arrays = {
+        'stamp': stamp,
+        'gene_id': np.asarray(gene_ids, dtype=str),
+        'gene_name': np.asarray(gene_names, dtype=str),
+    }
+    for chrom in pd.unique(chroms):
+        rows = np.flatnonzero(chroms == chrom)
+        rows = rows[np.argsort(starts[rows], kind='stable')]
+        arrays[f'start/{chrom}'] = starts[rows]
+        arrays[f'end/{chrom}'] = ends[rows]
+        # Running maximum of End: every record before the first reach > start ends before start.
+        arrays[f'reach/{chrom}'] = np.maximum.accumulate(ends[rows])
+        arrays[f'gene/{chrom}'] = genes[rows]
+        arrays[f'feature/{chrom}'] = features[rows]
+    return arrays
+
+
+def _write_index(arrays, index_file):
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as fh:
+        np.savez(fh, **arrays)
+    os.replace(tmp_file, index_file)
+
+
+def build_gtf_index(gtf_file):
+    """
+    Convert *gtf_file* into its gene model index and return the index path.
+
+    Returns None if neither the sidecar nor the fallback location is writable;
+    the caller then keeps the parsed arrays in memory for this process only.
+    """
+    arrays = _index_arrays(gtf_file)
+    for index_file in _index_paths(gtf_file):
+        try:
+            _write_index(arrays, index_file)
+        except OSError:
+            continue
+        _open_indexes[os.path.abspath(gtf_file)] = _GeneIndex(arrays)
+        return index_file
+    print(f"[warn] could not write a gene index for {gtf_file}; it will be re-parsed next run.")
+    _open_indexes[os.path.abspath(gtf_file)] = _GeneIndex(arrays)
+    return None
+
+
+def _gene_index(gtf_file):
+    """Return the up‑to‑date index of *gtf_file*, building it on first use."""
+    key = os.path.abspath(gtf_file)
+    stamp = _stamp(gtf_file)
+    index = _open_indexes.get(key)
+    if index is not None and np.array_equal(index.stamp, stamp):
+        return index
+    for index_file in _index_paths(gtf_file):
+        if not os.path.exists(index_file):
+            continue
+        try:
+            index = _GeneIndex(np.load(index_file))
+        except (OSError, ValueError, KeyError):
+            continue
+        if np.array_equal(index.stamp, stamp):
+            _open_indexes[key] = index
+            return index
+    build_gtf_index(gtf_file)
+    return _open_indexes[key]
+
+
+def read_gtf(gtf_file, region):
+    """
+    Return the gene, transcript and exon records overlapping *region* as a DataFrame.
+
+    *gtf_file* may also be a DataFrame with the ``GTF_COLUMNS`` (e.g. the
+    ``df`` of a PyRanges), filtered in memory.
+    """
+    chrom, start, end = region
+    if isinstance(gtf_file, pd.DataFrame):
+        rows = ((gtf_file['Chromosome'] == chrom) & (gtf_file['End'] > start) & (gtf_file['Start'] < end)
+                & gtf_file['Feature'].isin(GENE_FEATURES))
+        return gtf_file.loc[rows, GTF_COLUMNS]
+    index = _gene_index(gtf_file)
+    arrays = index.chrom(chrom)
+    if arrays is None:
+        return pd.DataFrame(columns=GTF_COLUMNS)
+    starts, ends, reach, genes, features = arrays
+    lo = np.searchsorted(reach, start, side='right')
+    hi = np.searchsorted(starts, end, side='left')
+    rows = lo + np.flatnonzero(ends[lo:hi] > start)
+    return pd.DataFrame({
+        'Chromosome': chrom,
+        'Feature': np.asarray(GENE_FEATURES)[features[rows]],
+        'Start': starts[rows],
+        'End': ends[rows],
+        'gene_id': index.gene_id[genes[rows]],
+        'gene_name': index.gene_name[genes[rows]],
+    }, columns=GTF_COLUMNS)
@@ -0,0 +1,671 @@
+"""
+HiCPlot/io/matrix.py
+---------------------------------------------------------------------
+Access to Hi‑C contact matrices stored in multi‑resolution cooler files.
+
+Windows are normally densified by cooler.  With a band limit
+(``max_bins``), pixels are instead read as sparse COO records in row chunks
+and scattered straight into an array of the requested dtype, so no
+intermediate dense matrix or dtype copy is ever made.
+
+Rectangular (two‑region) windows are served from ``CoolerMeta``: the bin
+offsets, pixel‑table row index and weight vectors of a cooler, loaded once
+per process, so region → bin lookups are arithmetic and no cooler selector
+is rebuilt per query.
+
+Within ``super_windows`` (batch runs over overlapping regions), symmetric
+fetches are cut out of one shared read of the enclosing super‑window, held
+as a diagonal band only as wide as its widest region.
+``keep_recent_matrices`` (used by ``HiCPlot serve``) keeps the last fetched
+windows and canvases in memory for repeated requests.
+
+Genome‑wide canvases (``fetch_canvas``) are built from one sequential pass
+over the pixel table instead of one query per chromosome pair, optionally
+pooled on the fly so their size follows the output, not the genome.
+"""
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+PIXEL_CHUNK_BINS = 1024  # matrix rows per sparse pixel query
+PIXEL_CHUNK_SIZE = 10_000_000  # pixel-table records read at a time by fetch_canvas
+# Weight columns stored as divisors (4DN portal / hic2cool); cooler inverts them too.
+_DIVISIVE_WEIGHTS = {'KR', 'VC', 'VC_SQRT'}
+_NO_WEIGHTS = "No column 'bins/{}' found. Balance the cooler or set balance=False."
+POOL_METHODS = ('mean', 'sum')
+CANVAS_FOLD_BLOCK = 2048  # tile size used to mirror symmetric canvases
+SUPER_WINDOW_BINS = 4096  # longest super-window (bins) read by super_windows()
+
+
+_COOLERS = {}
+
+
+def _parse_region(region, chromsizes):
+    # cooler (and h5py, scipy, pandas with it) is imported on first use, so
+    # that importing this module for its constants keeps ``--help`` fast.
+    from cooler.util import parse_region
+    return parse_region(region, chromsizes)
+
+
+def open_cooler(cooler_file, resolution):
+    """Open one resolution of a .mcool file (reused within a process until the file changes)."""
+    import cooler
+    key = (os.path.abspath(cooler_file), int(resolution))
+    stamp = os.stat(cooler_file).st_mtime_ns
+    cached = _COOLERS.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _COOLERS[key] = (stamp, cooler.Cooler(f'{cooler_file}::resolutions/{resolution}'))
+    return cached[1]
+
+
+def parse_resolution(value):
+    """Argument type for ``--resolution``: a bin size in bp or 'auto'."""
+    if str(value).lower() == 'auto':
+        return 'auto'
+    return int(value)
+
+
+def list_resolutions(cooler_file):
+    """Return the bin sizes stored in a .mcool file, finest first."""
+    import cooler
+    paths = cooler.fileops.list_coolers(cooler_file)
+    return sorted(int(p.rsplit('/', 1)[-1]) for p in paths if p.startswith('/resolutions/'))
+
+
+def cooler_chromsizes(cooler_file):
+    """Return {chrom: length} for a .mcool file without choosing a resolution."""
+    clr = open_cooler(cooler_file, list_resolutions(cooler_file)[0])
+    return dict(zip(clr.chromnames, clr.chromsizes))
+
+
+def chrom_bounds(cooler_file, chrom, start=None, end=None):
+    """Return ``(start, end)`` on *chrom*, a missing bound being the chromosome's start or end."""
+    if start is None:
+        start = 0
+    if end is None:
+        end = cooler_chromsizes(cooler_file)[chrom]
+    return start, end
+
+
+def auto_resolution(cooler_files, span, max_bins, max_mb=None, dtype='float64'):
+    """
+    Pick the finest resolution shared by *cooler_files* whose matrix fits the budget.
+
+    Parameters:
+    - cooler_files: .mcool paths that must all provide the chosen resolution.
+    - span: Genomic length (bp) covered by the longest matrix axis.
+    - max_bins: Largest number of bins allowed along that axis, typically the
+      number of output pixels across the heatmap (see ``pixel_bins``).
+    - max_mb: Optional memory budget (MiB) for one dense span × span matrix.
+    - dtype: Matrix dtype used to turn *max_mb* into a bin count.
+
+    Falls back to the coarsest shared resolution when none fits.
+    """
+    shared = None
+    for cooler_file in cooler_files:
+        resolutions = set(list_resolutions(cooler_file))
+        shared = resolutions if shared is None else shared & resolutions
+    if not shared:
+        raise ValueError(f"No resolution is shared by {', '.join(cooler_files)}.")
+    if max_mb is not None:
+        max_bins = min(max_bins, int(np.sqrt(max_mb * 2**20 / np.dtype(dtype).itemsize)))
+    for resolution in sorted(shared):
+        if int(np.ceil(span / resolution)) <= max_bins:
+            return resolution
+    resolution = max(shared)
+    print(f"[warn] even the coarsest resolution ({resolution}) exceeds {max_bins} bins for a {span:,} bp window.")
+    return resolution
+
+
+class CoolerMeta:
+    """
+    Bin‑table metadata of one fixed‑bin cooler, loaded once as NumPy arrays.
+
+    Holds the chromosome sizes and first‑bin offsets, the ``bin1_offset``
+    pixel‑table index and, on first use, each requested weight column.
+    Use ``cooler_meta`` to share one instance per file in a process.
+    """
+
+    def __init__(self, clr):
+        self.filename = clr.filename
+        self.root = clr.root
+        self.binsize = clr.binsize
+        self.storage_mode = clr.storage_mode
+        self.chromsizes = dict(zip(clr.chromnames, (int(size) for size in clr.chromsizes)))
+        with clr.open('r') as h5:
+            self.chrom_offset = dict(zip(clr.chromnames, h5['indexes/chrom_offset'][:-1].tolist()))
+            self.bin1_offset = h5['indexes/bin1_offset'][:]
+        self._weights = {}
+
+    def extent(self, region):
+        """Global [first, last) bin ids of *region*, computed like ``cooler``'s region_to_extent."""
+        chrom, start, end = _parse_region(region, self.chromsizes)
+        offset = self.chrom_offset[chrom]
+        return offset + start // self.binsize, offset + -(-end // self.binsize)
+
+    def bin_start(self, chrom, start):
+        """Genomic start of the bin containing *start* on *chrom*."""
+        return start // self.binsize * self.binsize
+
+    def weights(self, h5, name):
+        """Balancing weights *name* (as multipliers), read from the open *h5* group on first use."""
+        if name not in self._weights:
+            if name not in h5['bins']:
+                raise ValueError(_NO_WEIGHTS.format(name))
+            weights = h5['bins'][name][:].astype(float)
+            self._weights[name] = 1 / weights if name in _DIVISIVE_WEIGHTS else weights
+        return self._weights[name]
+
+
+_METAS = {}
+
+
+def cooler_meta(clr):
+    """Return the process‑wide ``CoolerMeta`` of *clr*, rebuilt when the file changes."""
+    key = (os.path.abspath(clr.filename), clr.root)
+    stamp = os.stat(clr.filename).st_mtime_ns
+    cached = _METAS.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _METAS[key] = (stamp, CoolerMeta(clr))
+    return cached[1]
+
+
+def _fetch_rect(clr, region, region2, balance):
+    """
+    Dense float64 matrix of *region* × *region2* read through ``cooler_meta``;
+    the same values as ``clr.matrix(balance=balance).fetch(region, region2)``.
+    """
+    meta = cooler_meta(clr)
+    i0, i1 = meta.extent(region)
+    j0, j1 = meta.extent(region2)
+    matrix = np.zeros((i1 - i0, j1 - j0))
+    # Stored pixels (bin1 <= bin2 for symmetric‑upper coolers) of the window, then
+    # those of the mirrored window, which land transposed.
+    queries = [(i0, i1, j0, j1, False)]
+    if meta.storage_mode != 'square':
+        queries.append((j0, j1, i0, i1, True))
+    with clr.open('r') as h5:
+        pixels = h5['pixels']
+        for a0, a1, b0, b1, transposed in queries:
+            if a0 >= b1 and meta.storage_mode != 'square':
+                continue  # the window lies entirely below the diagonal
+            p0, p1 = int(meta.bin1_offset[a0]), int(meta.bin1_offset[a1])
+            bin2 = pixels['bin2_id'][p0:p1]
+            keep = (bin2 >= b0) & (bin2 < b1)
+            if not keep.any():
+                continue
+            bin1 = pixels['bin1_id'][p0:p1][keep]
+            counts = pixels['count'][p0:p1][keep]
+            if transposed:
+                matrix[bin2[keep] - i0, bin1 - j0] = counts
+            else:
+                matrix[bin1 - i0, bin2[keep] - j0] = counts
+        if balance is not False:
+            weights = meta.weights(h5, 'weight' if balance is True else balance)
+            matrix = matrix * np.outer(weights[i0:i1], weights[j0:j1])
+    return matrix
+
+
+_SUPER_WINDOWS = {'pid': None, 'windows': {}, 'cache': {}}
+_RECENT = {'max_bytes': 0, 'nbytes': 0, 'entries': OrderedDict()}
+
+
+def _copy_result(result):
+    return tuple(map(_copy_result, result)) if isinstance(result, tuple) else result.copy()
+
+
+def _result_nbytes(result):
+    return sum(map(_result_nbytes, result)) if isinstance(result, tuple) else result.nbytes
+
+
+def keep_recent_matrices(max_mb):
+    """
+    Keep up to *max_mb* MiB of recently fetched matrices in memory (0 disables).
+
+    Repeated ``fetch_matrix``, ``fetch_band`` and ``fetch_canvas`` calls with
+    the same cooler (unchanged on disk), region and parameters then return a
+    copy of the kept result instead of reading the cooler again; the least
+    recently used results are dropped first.
+    """
+    _RECENT['max_bytes'] = int(max_mb * 2 ** 20)
+    _trim_recent()
+
+
+def _trim_recent():
+    entries = _RECENT['entries']
+    while entries and _RECENT['nbytes'] > _RECENT['max_bytes']:
+        _RECENT['nbytes'] -= _result_nbytes(entries.popitem(last=False)[1])
+
+
+def _recent(clr, params, fetch):
+    """Return ``fetch()``, served from or added to the recent‑matrix cache when enabled."""
+    if not _RECENT['max_bytes']:
+        return fetch()
+    key = (clr.filename, clr.root, os.stat(clr.filename).st_mtime_ns, params)
+    entries = _RECENT['entries']
+    if key in entries:
+        entries.move_to_end(key)
+        return _copy_result(entries[key])
+    result = fetch()
+    nbytes = _result_nbytes(result)
+    if nbytes <= _RECENT['max_bytes']:
+        entries[key] = _copy_result(result)
+        _RECENT['nbytes'] += nbytes
+        _trim_recent()
+    return result
+
+
+@contextmanager
+def super_windows(windows):
+    """
+    Serve symmetric fetches from shared super‑windows inside the ``with`` block.
+
+    *windows* are ``(chrom, start, end, span)`` tuples, e.g. merged from
+    overlapping batch regions, with *span* the widest region (bp) that will
+    be fetched from the window (``(chrom, start, end)`` means the whole
+    window).  A ``fetch_matrix``/``fetch_band`` call for a region inside one
+    of them reads the window once (per cooler and balancing, most recent
+    window only) as a diagonal band *span* wide and cuts the region out of
+    it, so pixels shared by neighbouring regions are read and balanced once
+    while memory grows with the window length times *span*, not its square.
+    Callers are free to modify the returned arrays in place.  Fetches run in
+    other processes (``--concurrent process``) read directly.
+    """
+    by_chrom = {}
+    for chrom, start, end, *span in windows:
+        by_chrom.setdefault(chrom, []).append((start, end, span[0] if span else end - start))
+    previous = dict(_SUPER_WINDOWS)
+    _SUPER_WINDOWS.update(pid=os.getpid(), windows=by_chrom, cache={})
+    try:
+        yield
+    finally:
+        _SUPER_WINDOWS.update(previous)
+
+
+def _super_window(clr, region, balance, dtype, chunk_bins=PIXEL_CHUNK_BINS):
+    """
+    Return ``(band, lo, n)`` for *region* from the enclosing super‑window,
+    *band* being the window's diagonal band (see ``fetch_band``) and *lo* and
+    *n* the region's first bin and bin count within the window, or None when
+    no super‑window applies.
+    """
+    if _SUPER_WINDOWS['pid'] != os.getpid() or clr.binsize is None:
+        return None
+    chrom, start, end = _parse_region(region, clr.chromsizes)
+    for window_start, window_end, span in _SUPER_WINDOWS['windows'].get(chrom, ()):
+        if window_start <= start and end <= window_end:
+            break
+    else:
+        return None
+    binsize = clr.binsize
+    first = window_start // binsize
+    lo = start // binsize
+    n = -(-end // binsize) - lo
+    depth = -(-span // binsize)  # a region span bp wide covers at most depth + 1 bins
+    if -(-window_end // binsize) - first > SUPER_WINDOW_BINS or n - 1 > depth:
+        return None
+    window = (chrom, window_start, window_end)
+    key = (clr.filename, clr.root, balance, np.dtype(dtype).str)
+    cached = _SUPER_WINDOWS['cache'].get(key)
+    if cached is None or cached[0] != window:
+        cached = _SUPER_WINDOWS['cache'][key] = (window, _fetch_band(clr, window, depth, balance, chunk_bins, dtype))
+    return cached[1], lo - first, n
+
+
+def _band_matrix(band, lo, n, max_bins, dtype):
+    """Dense symmetric matrix of the *n* bins from *lo* of a window *band*; NaN beyond *max_bins*."""
+    matrix = np.full((n, n), np.nan, dtype=dtype)
+    rows = np.arange(n)
+    for d in range(min(n - 1 if max_bins is None else int(max_bins), n - 1) + 1):
+        values = band[d, lo:lo + n - d]
+        matrix[rows[:n - d], rows[d:]] = values
+        matrix[rows[d:], rows[:n - d]] = values
+    return matrix
+
+
+def fetch_matrix(clr, region, region2=None, balance=True, max_bins=None, dtype=float):
+    """
+    Return the dense contact matrix for *region*.
+
+    Parameters:
+    - clr: Open ``cooler.Cooler`` handle.
+    - region: Row region, a UCSC string, chromosome name or (chrom, start, end).
+    - region2: Optional column region; defaults to *region*.
+    - balance: ``True``/``False`` or the name of a weight column.
+    - max_bins: Keep only contacts within this many bins of the diagonal and
+      read them as sparse pixels; cells further out are NaN.  Only valid for
+      intra‑chromosomal windows (no *region2*).
+    - dtype: Floating point dtype of the returned array.  Single‑region
+      fetches in a narrower dtype than float64 are scattered from pixels
+      straight into that dtype instead of densifying in float64 first.
+    """
+    return _recent(clr, ('matrix', region, region2, balance, max_bins, np.dtype(dtype).str),
+                   lambda: _fetch_shared_matrix(clr, region, region2, balance, max_bins, dtype))
+
+
+def _fetch_shared_matrix(clr, region, region2, balance, max_bins, dtype):
+    if region2 is None:
+        shared = _super_window(clr, region, balance, dtype)
+        if shared is not None:
+            return _band_matrix(*shared, max_bins, dtype)
+    return _fetch_matrix(clr, region, region2, balance, max_bins, dtype)
+
+
+def _fetch_matrix(clr, region, region2, balance, max_bins, dtype):
+    if max_bins is not None:
+        if region2 is not None:
+            raise ValueError("max_bins is only supported for symmetric (single-region) fetches.")
+        return _fetch_banded_matrix(clr, region, max_bins, balance, dtype)
+    if region2 is None and np.dtype(dtype) != np.float64:
+        return _fetch_banded_matrix(clr, region, None, balance, dtype)
+    if region2 is not None and clr.binsize is not None:
+        return np.asarray(_fetch_rect(clr, region, region2, balance), dtype=dtype)
+    # cooler already returns float64 for balanced data; only convert when needed.
+    return np.asarray(clr.matrix(balance=balance).fetch(region, region2), dtype=dtype)
+
+
+def _bad_bins(bins, balance):
+    """Boolean mask of the bins whose balancing weight is NaN (none when unbalanced)."""
+    if balance is False:
+        return np.zeros(len(bins), dtype=bool)
+    weight_name = 'weight' if balance is True else balance
+    if weight_name not in bins:
+        raise ValueError(_NO_WEIGHTS.format(weight_name))
+    return ~np.isfinite(bins[weight_name].to_numpy(dtype=float))
+
+
+def _band_pixels(clr, region, bins, max_bins, balance, chunk_bins):
+    """
+    Yield ``(i, d, value)`` arrays for the stored pixels of *region* with
+    ``0 <= d <= max_bins``, where i is the row bin and i + d the column bin
+    (both relative to the window).  Rows are queried *chunk_bins* at a time.
+    """
+    chrom = region[0]
+    n = len(bins)
+    offset = bins.index[0]
+    bin_starts = bins['start'].to_numpy()
+    bin_ends = bins['end'].to_numpy()
+    selector = clr.matrix(balance=balance, as_pixels=True, join=False)
+    value_column = 'count' if balance is False else 'balanced'
+    for i0 in range(0, n, chunk_bins):
+        i1 = min(n, i0 + chunk_bins)
+        j1 = min(n, i1 + max_bins)
+        pixels = selector.fetch((chrom, int(bin_starts[i0]), int(bin_ends[i1 - 1])),
+                                (chrom, int(bin_starts[i0]), int(bin_ends[j1 - 1])))
+        i = pixels['bin1_id'].to_numpy() - offset
+        d = pixels['bin2_id'].to_numpy() - offset - i
+        keep = (d >= 0) & (d <= max_bins) & (i >= i0) & (i < i1)
+        yield i[keep], d[keep], pixels[value_column].to_numpy()[keep]
+
+
+def _fetch_banded_matrix(clr, region, max_bins, balance, dtype, chunk_bins=PIXEL_CHUNK_BINS):
+    """Dense symmetric matrix holding only the diagonals up to *max_bins* (None: all)."""
+    region = _parse_region(region, clr.chromsizes)
+    bins = clr.bins().fetch(region)
+    n = len(bins)
+    max_bins = n - 1 if max_bins is None else max(0, min(int(max_bins), n - 1))
+    matrix = np.zeros((n, n), dtype=dtype)
+    if max_bins < n - 1:
+        for i0 in range(0, n, chunk_bins):
+            rows = np.arange(i0, min(n, i0 + chunk_bins))
+            outside = np.abs(np.arange(n)[None, :] - rows[:, None]) > max_bins
+            matrix[rows[0]:rows[-1] + 1][outside] = np.nan
+    bad = _bad_bins(bins, balance)
+    matrix[bad, :] = np.nan
+    matrix[:, bad] = np.nan
+    if n == 0:
+        return matrix
+    for i, d, values in _band_pixels(clr, region, bins, max_bins, balance, chunk_bins):
+        matrix[i, i + d] = values
+        matrix[i + d, i] = values
+    return matrix
+
+
+def fetch_band(clr, region, max_bins, balance=True, chunk_bins=PIXEL_CHUNK_BINS, dtype=float):
+    """
+    Return the diagonal band of the contact matrix for *region*.
+
+    Only pixels within *max_bins* of the diagonal are read, in row chunks of
+    *chunk_bins*, so memory grows with n·max_bins instead of n².
+
+    Parameters:
+    - clr: Open ``cooler.Cooler`` handle.
+    - region: (chrom, start, end) of an intra‑chromosomal window.
+    - max_bins: Largest diagonal offset kept (0 keeps the main diagonal only).
+    - balance: ``True``/``False`` or the name of a weight column.
+    - chunk_bins: Matrix rows queried per cooler request.
+    - dtype: Floating point dtype of the returned array.
+
+    Returns an array ``band`` of shape (max_bins + 1, n) with
+    ``band[d, i] = matrix[i, i + d]``; offsets past the window end are NaN,
+    as are pixels touching a bin whose balancing weight is NaN.
+    """
+    return _recent(clr, ('band', region, balance, max_bins, np.dtype(dtype).str),
+                   lambda: _fetch_shared_band(clr, region, max_bins, balance, chunk_bins, dtype))
+
+
+def _fetch_shared_band(clr, region, max_bins, balance, chunk_bins, dtype):
+    shared = _super_window(clr, region, balance, dtype, chunk_bins)
+    if shared is not None:
+        window_band, lo, n = shared
+        band = window_band[:max(0, min(int(max_bins), n - 1)) + 1, lo:lo + n].copy()
+        for d in range(1, len(band)):
+            band[d, n - d:] = np.nan
+        return band
+    return _fetch_band(clr, region, max_bins, balance, chunk_bins, dtype)
+
+
+def _fetch_band(clr, region, max_bins, balance, chunk_bins, dtype):
+    region = _parse_region(region, clr.chromsizes)
+    bins = clr.bins().fetch(region)
+    n = len(bins)
+    max_bins = max(0, min(int(max_bins), n - 1))
+    band = np.zeros((max_bins + 1, n), dtype=dtype)
+    bad = _bad_bins(bins, balance)
+    for d in range(max_bins + 1):
+        band[d, n - d:] = np.nan
+        band[d, :n - d][bad[:n - d] | bad[d:]] = np.nan
+    if n == 0:
+        return band
+    for i, d, values in _band_pixels(clr, region, bins, max_bins, balance, chunk_bins):
+        band[d, i] = values
+    return band
+
+
+def canvas_factor(clr, row_chroms, col_chroms, max_bins):
+    """Bins pooled per canvas cell so the longer axis fits in *max_bins* (1 if None or already fits)."""
+    if max_bins is None:
+        return 1
+    n = max(sum(hi - lo for lo, hi in map(clr.extent, chroms)) for chroms in (row_chroms, col_chroms))
+    return max(1, -(-n // max(1, int(max_bins))))
+
+
+def pool_matrix(matrix, factor, pool='mean'):
+    """
+    Pool *factor* × *factor* cells of a dense matrix the way ``fetch_canvas``
+    does: nan‑aware mean or sum, trailing cells pooling what is left, and
+    NaN for cells without any finite value.
+    """
+    if factor == 1:
+        return matrix
+    if pool not in POOL_METHODS:
+        raise ValueError(f"Unsupported pooling: {pool}. Choose among {', '.join(POOL_METHODS)}.")
+    n, m = matrix.shape
+    rows, cols = -(-n // factor), -(-m // factor)
+    padded = np.full((rows * factor, cols * factor), np.nan)
+    padded[:n, :m] = matrix
+    padded = padded.reshape(rows, factor, cols, factor)
+    cells = np.isfinite(padded).sum(axis=(1, 3))
+    pooled = np.nansum(padded, axis=(1, 3))
+    if pool == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pooled /= cells
+    pooled[cells == 0] = np.nan
+    return pooled.astype(matrix.dtype, copy=False)
+
+
+def _canvas_layout(clr, chroms, factor=1):
+    """
+    Bin extents, cumulative edges and a global‑bin → canvas‑position map for
+    *chroms*, with *factor* bins pooled per canvas cell inside each chromosome.
+    """
+    extents = [clr.extent(chrom) for chrom in chroms]
+    edges = np.cumsum([0] + [-(-(hi - lo) // factor) for lo, hi in extents])
+    position = np.full(clr.info['nbins'], -1, dtype=np.int64)
+    for (lo, hi), e0 in zip(extents, edges[:-1]):
+        if position[lo] < 0:  # a repeated chromosome is copied afterwards
+            position[lo:hi] = e0 + np.arange(hi - lo) // factor
+    return extents, edges, position
+
+
+def _pixel_ranges(h5, extents):
+    """Merge bin extents into contiguous pixel‑table row ranges."""
+    bin1_offset = h5['indexes/bin1_offset']
+    ranges = []
+    for lo, hi in sorted(set(extents)):
+        if ranges and lo <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], hi)
+        else:
+            ranges.append([lo, hi])
+    return [(int(bin1_offset[lo]), int(bin1_offset[hi])) for lo, hi in ranges]
+
+
+def _copy_repeats(canvas, extents, edges, position, axis):
+    """Fill the blocks of chromosomes listed more than once from their first occurrence."""
+    view = canvas if axis == 0 else canvas.T
+    for (lo, hi), e0, e1 in zip(extents, edges[:-1], edges[1:]):
+        if position[lo] != e0:
+            view[e0:e1] = view[position[lo]:position[lo] + e1 - e0]
+
+
+def _fold_transpose(canvas, diagonal, block=CANVAS_FOLD_BLOCK):
+    """
+    Turn a square canvas holding each pixel on one side of the diagonal into
+    the full symmetric matrix, ``canvas + canvas.T - diag(diagonal)``, one
+    *block* × *block* tile pair at a time.
+    """
+    n = canvas.shape[0]
+    for i0 in range(0, n, block):
+        i1 = min(n, i0 + block)
+        for j0 in range(i0, n, block):
+            j1 = min(n, j0 + block)
+            upper = canvas[i0:i1, j0:j1]
+            if i0 == j0:
+                upper += upper.T.copy()
+            else:
+                lower = canvas[j0:j1, i0:i1]
+                upper += lower.T
+                lower[...] = upper.T
+    canvas[np.diag_indices(n)] -= diagonal.astype(canvas.dtype, copy=False)
+
+
+def fetch_canvas(clr, row_chroms, col_chroms=None, balance=True, dtype=float, chunksize=PIXEL_CHUNK_SIZE,
+                 max_bins=None, pool='mean'):
+    """
+    Return the contact matrix of whole chromosomes *row_chroms* × *col_chroms*,
+    each axis concatenated in the given order.
+
+    The result equals tiling ``fetch_matrix(clr, cy, cx)`` for every pair,
+    but the pixel table is read once, sequentially and *chunksize* records
+    at a time, and every pixel is scattered into the canvas through global
+    bin offsets.  When both axes list the same chromosomes, each pixel is
+    scattered once and the lower triangle is filled from the transpose.
+
+    Parameters:
+    - clr: Open ``cooler.Cooler`` handle.
+    - row_chroms, col_chroms: Chromosome names; *col_chroms* defaults to *row_chroms*.
+    - balance: ``True``/``False`` or the name of a weight column.
+    - dtype: Floating point dtype of the canvas.
+    - chunksize: Pixel‑table records read per HDF5 request.
+    - max_bins: If the longer axis has more bins than this, pool ``k`` × ``k``
+      bins into each canvas cell during the scan, ``k = ceil(bins / max_bins)``.
+      Pooling restarts at every chromosome so blocks stay aligned; each
+      chromosome's last cell may hold fewer bins.
+    - pool: 'mean' or 'sum' of the pooled cells, ignoring NaN (bad) bins;
+      a cell made only of bad bins is NaN.
+
+    Returns ``(canvas, row_edges, col_edges)``, the edges being the
+    cumulative (pooled) bin offsets of the chromosomes along each axis.
+    """
+    col_key = None if col_chroms is None else tuple(col_chroms)
+    return _recent(clr, ('canvas', tuple(row_chroms), col_key, balance, np.dtype(dtype).str, max_bins, pool),
+                   lambda: _fetch_canvas(clr, row_chroms, col_chroms, balance, dtype, chunksize, max_bins, pool))
+
+
+def _fetch_canvas(clr, row_chroms, col_chroms, balance, dtype, chunksize, max_bins, pool):
+    if pool not in POOL_METHODS:
+        raise ValueError(f"Unsupported pooling: {pool}. Choose among {', '.join(POOL_METHODS)}.")
+    col_chroms = row_chroms if col_chroms is None else col_chroms
+    factor = canvas_factor(clr, row_chroms, col_chroms, max_bins)
+    row_extents, row_edges, row_pos = _canvas_layout(clr, row_chroms, factor)
+    col_extents, col_edges, col_pos = _canvas_layout(clr, col_chroms, factor)
+    # Pooled canvases accumulate sums in float64 and are cast once at the end.
+    canvas = np.zeros((row_edges[-1], col_edges[-1]), dtype=dtype if factor == 1 else float)
+
+    weights = None
+    good = np.ones(clr.info['nbins'], dtype=bool)
+    if balance is not False:
+        with clr.open('r') as h5:
+            weights = cooler_meta(clr).weights(h5, 'weight' if balance is True else balance)
+        good = np.isfinite(weights)
+        if factor == 1:
+            canvas[row_pos[~good & (row_pos >= 0)], :] = np.nan
+            canvas[:, col_pos[~good & (col_pos >= 0)]] = np.nan
+
+    # Symmetric‑upper coolers store each pixel once.  It belongs at (bin1, bin2)
+    # and (bin2, bin1); on a symmetric canvas only the first is scattered and
+    # the transpose is folded in afterwards.
+    mirror = clr.storage_mode != 'square'
+    symmetric = mirror and list(row_chroms) == list(col_chroms)
+    if symmetric or not mirror:
+        placements = lambda bin1, bin2: ((bin1, bin2),)
+    else:
+        placements = lambda bin1, bin2: ((bin1, bin2), (bin2, bin1))
+    # Pooled symmetric canvases need the sum of the pixels on the bin diagonal,
+    # which the fold would otherwise count twice.
+    diagonal = np.zeros(canvas.shape[0]) if symmetric and factor > 1 else None
+    with clr.open('r') as h5:
+        bin1_ids, bin2_ids, counts = (h5['pixels'][name] for name in ('bin1_id', 'bin2_id', 'count'))
+        for p0, p1 in _pixel_ranges(h5, row_extents + col_extents):
+            for c0 in range(p0, p1, chunksize):
+                c1 = min(p1, c0 + chunksize)
+                bin1 = bin1_ids[c0:c1]
+                bin2 = bin2_ids[c0:c1]
+                values = counts[c0:c1]
+                if weights is not None:
+                    values = values * (weights[bin1] * weights[bin2])
+                for mirrored, (a, b) in enumerate(placements(bin1, bin2)):
+                    rows, cols = row_pos[a], col_pos[b]
+                    keep = (rows >= 0) & (cols >= 0)
+                    if factor == 1:
+                        canvas[rows[keep], cols[keep]] = values[keep]
+                        continue
+                    keep &= good[a] & good[b]
+                    if mirrored:
+                        keep &= a != b  # the diagonal is already counted once
+                    # Unbuffered in-place sum: no canvas-sized temporary per chunk.
+                    np.add.at(canvas.reshape(-1), rows[keep] * canvas.shape[1] + cols[keep], values[keep])
+                if diagonal is not None:
+                    on_diagonal = (bin1 == bin2) & good[bin1] & (row_pos[bin1] >= 0)
+                    diagonal += np.bincount(row_pos[bin1[on_diagonal]], weights=values[on_diagonal],
+                                            minlength=diagonal.size)
+
+    if symmetric:
+        _fold_transpose(canvas, canvas.diagonal().copy() if diagonal is None else diagonal)
+
+    if factor > 1:
+        # Number of good bins pooled into each row / column cell.
+        row_cells = np.bincount(row_pos[row_pos >= 0], weights=good[row_pos >= 0], minlength=canvas.shape[0])
+        col_cells = np.bincount(col_pos[col_pos >= 0], weights=good[col_pos >= 0], minlength=canvas.shape[1])
+        cells = np.outer(row_cells, col_cells)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if pool == 'mean':
+                canvas /= cells
+        canvas[cells == 0] = np.nan
+        canvas = canvas.astype(dtype, copy=False)
+
+    _copy_repeats(canvas, row_extents, row_edges, row_pos, axis=0)
+    _copy_repeats(canvas, col_extents, col_edges, col_pos, axis=1)
+    return canvas, row_edges, col_edges
@@ -0,0 +1,116 @@
+"""
+HiCPlot/io/tabix.py
+---------------------------------------------------------------------
+Random access to bgzip‑compressed, tabix‑indexed text files.
+
+A BED, bedGraph or loop file ending in ``.gz`` with a ``.tbi`` or ``.csi``
+index next to it is read block‑wise: only the compressed blocks overlapping
+the requested region are decompressed.  Files without an index (or a missing
+``pysam``) fall back to a full scan, so indexing is purely an optimisation.
+
+``build_tabix_index`` sorts, bgzips and indexes a plain or gzipped file; it is
+exposed on the command line as ``HiCPlot BuildIndex``.
+"""
+import gzip
+import os
+
+INDEX_SUFFIXES = ('.tbi', '.csi')
+FILE_KINDS = ('bed', 'bedgraph', 'loops')
+# Tabix' default .tbi index cannot address positions beyond 2^29.
+_TBI_MAX_POSITION = 1 << 29
+_PYSAM = []
+
+
+def _pysam():
+    """Return the ``pysam`` module, or None if it is not installed (imported on first use)."""
+    if not _PYSAM:
+        try:
+            import pysam
+        except ImportError:  # optional: only needed for indexed random access
+            pysam = None
+        _PYSAM.append(pysam)
+    return _PYSAM[0]
+
+
+def open_text(file_path):
+    """Open a plain or gzip/bgzip‑compressed text file for reading."""
+    if file_path.lower().endswith('.gz'):
+        return gzip.open(file_path, 'rt')
+    return open(file_path, 'r')
+
+
+def tabix_index_path(file_path):
+    """Return the .tbi/.csi index of *file_path*, or None if it is not indexed."""
+    if not file_path.lower().endswith('.gz'):
+        return None
+    for suffix in INDEX_SUFFIXES:
+        if os.path.exists(file_path + suffix):
+            return file_path + suffix
+    return None
+
+
+def tabix_lines(file_path, region):
+    """
+    Return the lines of an indexed file overlapping *region*.
+
+    Returns None when *file_path* has no index or ``pysam`` is not installed;
+    the caller should then scan the whole file.
+    """
+    index_path = tabix_index_path(file_path)
+    pysam = _pysam() if index_path is not None else None
+    if pysam is None:
+        return None
+    chrom, start, end = region
+    with pysam.TabixFile(file_path, index=index_path) as tbx:
+        if chrom not in tbx.contigs:
+            return []
+        return list(tbx.fetch(chrom, max(0, start), end))
+
+
+def build_tabix_index(file_path, kind, output_file=None):
+    """
+    Sort, bgzip and tabix‑index *file_path*; return the path of the indexed file.
+
+    Parameters:
+    - file_path: BED, bedGraph or loop file (plain text or gzip).
+    - kind: 'bed', 'bedgraph' or 'loops'.  Loop files keep their header line,
+      commented out with '#' so tabix skips it; they are indexed on their
+      first anchor (chrom1, start1, end1).
+    - output_file: Destination ``.gz`` path.  Defaults to *file_path* itself
+      when already ending in ``.gz``, otherwise *file_path* + ``.gz``.
+    """
+    pysam = _pysam()
+    if pysam is None:
+        raise ImportError("Building tabix indexes requires pysam (pip install pysam).")
+    if kind not in FILE_KINDS:
+        raise ValueError(f"Unsupported file kind: {kind}. Choose among {', '.join(FILE_KINDS)}.")
+    if output_file is None:
+        output_file = file_path if file_path.lower().endswith('.gz') else file_path + '.gz'
+
+    header = []
+    records = []
+    with open_text(file_path) as fh:
+        for line_no, line in enumerate(fh):
+            if kind == 'loops' and line_no == 0:
+                header.append(line if line.startswith('#') else '#' + line)
+                continue
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.split('\t', 3)
+            records.append((fields[0], int(fields[1]), int(fields[2]), line))
+    records.sort(key=lambda r: (r[0], r[1], r[2]))
+    use_csi = any(r[2] > _TBI_MAX_POSITION for r in records)
+
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as out:
+        out.writelines(header)
+        out.writelines(line if line.endswith('\n') else line + '\n' for *_, line in records)
+    indexed = pysam.tabix_index(tmp_file, seq_col=0, start_col=1, end_col=2, zerobased=True, meta_char='#',
+                                force=True, csi=use_csi)
+    index_suffix = '.csi' if use_csi else '.tbi'
+    os.replace(indexed, output_file)
+    os.replace(indexed + index_suffix, output_file + index_suffix)
+    stale_suffix = '.tbi' if use_csi else '.csi'
+    if os.path.exists(output_file + stale_suffix):
+        os.remove(output_file + stale_suffix)
+    return output_file
@@ -0,0 +1,208 @@
+"""
+HiCPlot/io/tracks.py
+---------------------------------------------------------------------
+Signal tracks (bigWig and bedGraph) read for a single genomic region.
+"""
+import io
+import os
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+from HiCPlot.io.tabix import open_text, tabix_lines
+
+BIGWIG_EXTENSIONS = ('.bw', '.bigwig')
+BEDGRAPH_EXTENSIONS = ('.bedgraph', '.bg')
+SUMMARY_TYPES = ('mean', 'max', 'min')
+# Open bigWig handles kept per process, most recently used last.
+MAX_BIGWIGS = 32
+_BIGWIGS = OrderedDict()
+
+
+def pixel_bins(width_inches, dpi=None):
+    """
+    Return the number of summary bins that fill *width_inches* of a figure.
+
+    *dpi* defaults to the resolution ``savefig`` will use for the output file.
+    """
+    if dpi is None:
+        from matplotlib import rcParams
+        dpi = rcParams['savefig.dpi']
+        if dpi == 'figure':
+            dpi = rcParams['figure.dpi']
+    return max(1, int(round(width_inches * dpi)))
+
+
+def is_path(source):
+    """True when *source* names a file, False for in‑memory data."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_name(source):
+    """Name of *source* for messages: the path, or the type of in‑memory data."""
+    return source if is_path(source) else f"in-memory {type(source).__name__}"
+
+
+def array_track(track, region):
+    """
+    Return ``(positions, values)`` for an in‑memory track: a ``(positions,
+    values)`` pair, or an array of values spread evenly over *region* (as
+    ``read_bigwig`` returns one value per base).
+    """
+    if isinstance(track, tuple):
+        positions, values = (np.asarray(a, dtype=float) for a in track)
+        return positions, values
+    values = np.asarray(track, dtype=float)
+    return np.linspace(region[1], region[2], len(values)), values
+
+
+def open_bigwig(file_path):
+    """
+    Open a BigWig file, reusing the handle within a process until the file changes.
+
+    Handles are never shared with forked children: a process opens its own.
+    At most MAX_BIGWIGS handles stay open; replaced and evicted ones are closed.
+    """
+    import pyBigWig  # only bigWig reads need it
+    file_path = os.path.abspath(file_path)
+    info = os.stat(file_path)
+    stamp = (os.getpid(), info.st_size, info.st_mtime_ns)
+    cached = _BIGWIGS.get(file_path)
+    if cached is None or cached[0] != stamp:
+        if cached is not None:
+            cached[1].close()
+        cached = _BIGWIGS[file_path] = (stamp, pyBigWig.open(file_path))
+    _BIGWIGS.move_to_end(file_path)
+    while len(_BIGWIGS) > MAX_BIGWIGS:
+        _BIGWIGS.popitem(last=False)[1][1].close()
+    return cached[1]
+
+
+def read_bigwig(file_path, region, summary=None, bins=None):
+    """
+    Read BigWig or bedGraph file and return positions and values.
+
+    With *summary* ('mean', 'max' or 'min') and *bins*, a BigWig region wider
+    than *bins* bases is read from its zoom levels as *bins* summary values
+    (one per bin centre) instead of one value per base.
+
+    Returns ``(None, None)`` when a bedGraph has no interval in the region.
+    """
+    name = file_path[:-3] if file_path.lower().endswith('.gz') else file_path
+    file_extension = os.path.splitext(name)[1].lower()
+
+    if file_extension in BIGWIG_EXTENSIONS:
+        chrom, start, end = region
+        bw = open_bigwig(file_path)
+        if summary is not None and bins is not None and bins < end - start:
+            if summary not in SUMMARY_TYPES:
+                raise ValueError(f"Unsupported summary type: {summary}. Choose among {', '.join(SUMMARY_TYPES)}.")
+            values = np.array(bw.stats(chrom, start, end, type=summary, nBins=bins), dtype=float)
+            edges = np.linspace(start, end, bins + 1)
+            positions = (edges[:-1] + edges[1:]) / 2
+            return positions, values
+        values = bw.values(chrom, start, end, numpy=True)
+        positions = np.linspace(start, end, len(values))
+        return positions, values
+    if file_extension in BEDGRAPH_EXTENSIONS:
+        return read_bedgraph(file_path, region)
+    raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg, optionally .gz).")
+
+
+def _bedgraph_intervals(file_path, region):
+    """
+    Return ``(start, end, value)`` arrays of the bedGraph lines for *region*.
+
+    Indexed files return only the lines overlapping *region*.  Otherwise the
+    file is streamed and only lines of the requested chromosome are parsed;
+    every other line is rejected on its prefix without being split.
+    """
+    import pandas as pd
+    chrom = region[0]
+    lines = tabix_lines(file_path, region)
+    if lines is None:
+        prefix = chrom + '\t'
+        with open_text(file_path) as fh:
+            lines = [line for line in fh if line.startswith(prefix)]
+    if not lines:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=float)
+    rows = pd.read_csv(io.StringIO('\n'.join(line.rstrip('\n') for line in lines)), sep='\t', header=None,
+                       usecols=[1, 2, 3], names=['start', 'end', 'value'],
+                       dtype={'start': np.int64, 'end': np.int64, 'value': float})
+    return rows['start'].to_numpy(), rows['end'].to_numpy(), rows['value'].to_numpy()
+
+
+def bedgraph_steps(starts, ends, values):
+    """
+    Return the step function drawn for bedGraph intervals.
+
+    Positions are the sorted, unique interval boundaries; each takes the value
+    of the last interval (in file order) that covers it, so a boundary shared
+    by two adjacent intervals carries the value of the second one.
+    """
+    positions = np.unique(np.concatenate([starts, ends]))
+    if np.all(starts[1:] >= ends[:-1]):
+        # Sorted, non‑overlapping intervals: the covering interval that comes
+        # last in the file is the last one starting at or before the position.
+        idx = np.searchsorted(starts, positions, side='right') - 1
+        return positions, values[idx].astype(float)
+    step_values = np.zeros(len(positions), dtype=float)
+    lo = np.searchsorted(positions, starts, side='left')
+    hi = np.searchsorted(positions, ends, side='right')
+    for a, b, v in zip(lo, hi, values):
+        step_values[a:b] = v
+    return positions, step_values
+
+
+def read_bedgraph(file_path, region):
+    """Read the intervals of a bedGraph file overlapping *region* as a step function."""
+    chrom, start, end = region
+    starts, ends, values = _bedgraph_intervals(file_path, region)
+    keep = (ends > start) & (starts < end)
+    if not keep.any():
+        return None, None
+    return bedgraph_steps(starts[keep], ends[keep], values[keep])
+
+
+class TrackStore:
+    """
+    Per‑invocation cache of decoded signal tracks.
+
+    Autoscaling (``get_track_min_max``) and drawing (``plot_seq``) both ask the
+    store for the same (file, region); the file is opened and decoded once and
+    the cached ``(positions, values)`` pair is handed to every caller.
+
+    *summary* and *bins* are forwarded to ``read_bigwig``; use ``pixel_bins``
+    to match *bins* to the width of the track on the saved figure.
+    """
+
+    def __init__(self, summary=None, bins=None):
+        self.summary = summary
+        self.bins = bins
+        self._tracks = {}
+
+    def read(self, file_path, region):
+        """Return ``(positions, values)`` for *file_path* in *region*, reading it at most once."""
+        if not is_path(file_path):
+            return array_track(file_path, region)
+        key = (file_path, tuple(region))
+        if key not in self._tracks:
+            self._tracks[key] = read_bigwig(file_path, region, summary=self.summary, bins=self.bins)
+        return self._tracks[key]
+
+    def missing(self, file_paths, region):
+        """Return the distinct *file_paths* whose track for *region* is not cached yet."""
+        file_paths = [f for f in file_paths if is_path(f)]
+        return [f for f in dict.fromkeys(file_paths) if (f, tuple(region)) not in self._tracks]
+
+    def read_call(self, file_path, region):
+        """Picklable call reading *file_path* in *region* the way ``read`` does (see ``add``)."""
+        return partial(read_bigwig, file_path, tuple(region), summary=self.summary, bins=self.bins)
+
+    def add(self, file_path, region, track):
+        """Cache a ``(positions, values)`` pair read elsewhere, e.g. by a worker pool."""
+        self._tracks[(file_path, tuple(region))] = track
+
+    def clear(self):
+        """Drop every cached track."""
+        self._tracks.clear()
@@ -0,0 +1,29 @@
+"""
+HiCPlot/normalize.py
+---------------------------------------------------------------------
+Value transforms applied to intra‑chromosomal contact matrices before
+plotting (``--normalization_method``).
+
+The transforms run in place with ``out=`` ufuncs, so no full‑size temporary
+is allocated and the matrix keeps the dtype it was fetched in (``--dtype``).
+"""
+import numpy as np
+
+NORMALIZATION_METHODS = ('raw', 'logNorm', 'log2', 'log2_add1', 'log', 'log_add1')
+MATRIX_DTYPES = ('float64', 'float32')
+
+
+def normalize_matrix(matrix, method):
+    """Apply normalization *method* to *matrix* in place and return it (None passes through)."""
+    if matrix is None:
+        return None
+    if method == 'raw':
+        return matrix
+    if method == 'logNorm':
+        return np.maximum(matrix, 0, out=matrix)
+    if method not in NORMALIZATION_METHODS:
+        raise ValueError(f"Unsupported normalization method: {method}")
+    if method.endswith('_add1'):
+        np.add(matrix, 1, out=matrix)
+    log = np.log2 if method.startswith('log2') else np.log
+    return log(matrix, out=matrix)
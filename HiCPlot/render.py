@@ -0,0 +1,393 @@
+"""
+HiCPlot/render.py
+---------------------------------------------------------------------
+``HiCPlot render spec.yaml``: multi-panel figures from a declarative spec.
+
+A spec (YAML, or JSON when the file ends in ``.json``) lists the regions to
+draw and the panels stacked top to bottom in every figure::
+
+    regions: [chr1:200000-1200000]     # or a BED file, or [chrom, start, end]
+    output: figure.pdf                 # {name}/{chrom}/... placeholders as --regions
+    resolution: auto                   # or a bin size in bp
+    width: 6                           # inches
+    concurrent: thread                 # none | thread | process
+    panels:
+      - {type: triangle, cooler: a.mcool, max_distance: 400000, normalization: log2_add1}
+      - {type: diff, cooler: a.mcool, cooler2: b.mcool, operation: subtract}
+      - {type: split, cooler: a.mcool, cooler2: b.mcool, labels: [A, B]}
+      - {type: bigwig, file: a.bw, label: ATAC, color: navy}
+      - {type: bed, file: peaks.bed}
+      - {type: loops, file: loops.bedpe}
+      - {type: genes, gtf: genes.gtf, genes: [GATA1]}
+
+Before anything is drawn, the planner collects the contact matrices every
+panel needs and loads each distinct (cooler, resolution, band, balance,
+dtype) once, in one pool together with the bigWig tracks; panels that show
+the same matrix receive copies of it.  BED, loop and gene panels read
+through the per‑process annotation caches, so a file shown twice is parsed
+once.  Figure options may also be set per panel (``resolution``,
+``balance``, ``dtype``).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from functools import partial
+import numpy as np
+from HiCPlot.normalize import normalize_matrix, NORMALIZATION_METHODS, MATRIX_DTYPES
+from HiCPlot.io import CONCURRENCY_MODES, parse_resolution
+from HiCPlot.batch import plot_regions, read_regions, region_output, workers_conflict
+from HiCPlot.SquHeatmap import pcolormesh_square, plot_seq, plot_bed, plot_loops, plot_genes
+from HiCPlot.TriHeatmap import pcolormesh_triangle
+from HiCPlot.DiffSquHeatmap import difference_matrix
+from HiCPlot.upper_lower_triangle_heatmap import split_matrix
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+version_py = os.path.join(script_dir, "_version.py")
+if os.path.exists(version_py):
+    with open(version_py) as _vf:
+        exec(_vf.read())
+else:
+    __version__ = "0.0.1"
+
+HEATMAP_PANELS = ('square', 'triangle', 'diff', 'split')
+PANEL_TYPES = HEATMAP_PANELS + ('bigwig', 'bed', 'loops', 'genes')
+# Keys every panel of a type must have.
+PANEL_REQUIRED = {'square': ('cooler',), 'triangle': ('cooler',), 'diff': ('cooler', 'cooler2'),
+                  'split': ('cooler',), 'bigwig': ('file',), 'bed': ('file',), 'loops': ('file',),
+                  'genes': ('gtf',)}
+# Default heights (inches) of the annotation panels; heatmaps follow the width.
+PANEL_HEIGHTS = {'bigwig': 0.8, 'bed': 0.4, 'loops': 0.6, 'genes': 0.8}
+COLORBAR_HEIGHT = 0.1
+COLORBAR_GAP = 0.35
+# Gap (inches) between rows, room for tick and colorbar labels.
+PANEL_SPACING = 0.7
+FIGURE_OPTIONS = ('resolution', 'width', 'balance', 'dtype', 'concurrent', 'track_summary',
+                  'max_bins', 'max_matrix_mb', 'title')
+SPEC_KEYS = ('regions', 'output', 'panels') + FIGURE_OPTIONS
+
+_REGION = re.compile(r'^([^:\s]+):([\d,_]+)-([\d,_]+)$')
+
+
+def load_spec(spec_file):
+    """Read and check a render spec (JSON for ``.json`` files, YAML otherwise)."""
+    with open(spec_file) as fh:
+        if spec_file.lower().endswith('.json'):
+            spec = json.load(fh)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML specs needs PyYAML (pip install pyyaml); "
+                                  "alternatively write the spec as a .json file.") from None
+            spec = yaml.safe_load(fh)
+    check_spec(spec)
+    return spec
+
+
+def check_spec(spec):
+    """Raise ValueError when *spec* is not a usable render spec."""
+    if not isinstance(spec, dict):
+        raise ValueError("A render spec must be a mapping with 'regions', 'output' and 'panels'.")
+    unknown = sorted(set(spec) - set(SPEC_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown spec keys {unknown}; choose among {list(SPEC_KEYS)}.")
+    for key in ('regions', 'output', 'panels'):
+        if not spec.get(key):
+            raise ValueError(f"The spec has no '{key}'.")
+    check_panels(spec['panels'])
+    if spec.get('dtype', 'float64') not in MATRIX_DTYPES:
+        raise ValueError(f"dtype must be one of {list(MATRIX_DTYPES)}.")
+    if spec.get('concurrent', 'none') not in CONCURRENCY_MODES:
+        raise ValueError(f"concurrent must be one of {list(CONCURRENCY_MODES)}.")
+
+
+def check_panels(panels):
+    """Raise ValueError when a panel has an unknown type or lacks a required key."""
+    for i, panel in enumerate(panels):
+        kind = panel.get('type') if isinstance(panel, dict) else None
+        if kind not in PANEL_TYPES:
+            raise ValueError(f"Panel {i + 1} has type {kind!r}; choose among {list(PANEL_TYPES)}.")
+        missing = [key for key in PANEL_REQUIRED[kind] if panel.get(key) is None]
+        if missing:
+            raise ValueError(f"Panel {i + 1} ({kind}) is missing {', '.join(missing)}.")
+        if panel.get('normalization', 'raw') not in NORMALIZATION_METHODS:
+            raise ValueError(f"Panel {i + 1} has normalization {panel['normalization']!r}; "
+                             f"choose among {list(NORMALIZATION_METHODS)}.")
+
+
+def spec_regions(regions):
+    """
+    Return ``(chrom, start, end, name)`` tuples for the spec's ``regions``: a
+    BED file, or a list of ``chrom:start-end`` strings or ``[chrom, start,
+    end(, name)]`` lists.
+    """
+    if isinstance(regions, str):
+        return read_regions(regions)
+    parsed = []
+    for item in regions:
+        name = None
+        if isinstance(item, str):
+            match = _REGION.match(item.strip())
+            if match is None:
+                raise ValueError(f"Region {item!r} is not of the form chrom:start-end.")
+            chrom, start, end = match.group(1), match.group(2), match.group(3)
+            start, end = (int(v.replace(',', '').replace('_', '')) for v in (start, end))
+        else:
+            chrom, start, end, *rest = item
+            start, end = int(start), int(end)
+            name = rest[0] if rest else None
+        name = str(name or f"{chrom}_{start}_{end}")
+        parsed.append((str(chrom), start, end, name.replace(os.sep, '_')))
+    return parsed
+
+
+def _panel_plan(panel, region, resolution, balance, dtype):
+    """
+    Return ``(resolution, banded, [(key, load), ...])`` for heatmap *panel*.
+
+    Each *load* is the contact matrix of one sample: a picklable call for a
+    cooler file, a plain call for an open ``cooler.Cooler`` (read at its own
+    bin size) or the array itself for an in‑memory matrix.  Matrices with the
+    same *key* are loaded once.
+    """
+    from HiCPlot.io import cooler_call, fetch_matrix, fetch_band, is_path
+    chrom, start, end = region
+    source = panel['cooler']
+    if isinstance(source, np.ndarray):
+        resolution = panel.get('resolution', resolution)
+        if not isinstance(resolution, int):
+            resolution = (end - start) / source.shape[-1]
+    elif is_path(source):
+        resolution = parse_resolution(panel.get('resolution', resolution))
+    else:
+        resolution = source.binsize
+    balance = panel.get('balance', balance)
+    dtype = panel.get('dtype', dtype)
+    max_distance = panel.get('max_distance')
+    band_bins = None if max_distance is None else int(np.ceil(max_distance / resolution))
+    if isinstance(source, np.ndarray):
+        # An in-memory matrix is drawn as given: a triangle reads it as a band unless it is square.
+        banded = panel['type'] == 'triangle' and source.shape[0] != source.shape[1]
+    else:
+        banded = panel['type'] == 'triangle' and band_bins is not None
+    if banded:
+        func, args, kwargs = fetch_band, (region, band_bins), dict(balance=balance, dtype=dtype)
+    else:
+        func, args, kwargs = fetch_matrix, (region,), dict(balance=balance, max_bins=band_bins, dtype=dtype)
+    loads = []
+    for source in (panel['cooler'], panel.get('cooler2')):
+        if source is None:
+            continue
+        if isinstance(source, np.ndarray):
+            loads.append((('array', id(source)), source))
+            continue
+        if is_path(source):
+            key, call = (source, resolution), cooler_call(source, resolution, func, *args, **kwargs)
+        else:
+            key, call = (source.filename, source.root), partial(func, source, *args, **kwargs)
+        loads.append((key + ('band' if banded else 'matrix', band_bins, balance, dtype), call))
+    return resolution, banded, loads
+
+
+def _mb_ticks(ax):
+    import matplotlib.pyplot as plt
+    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
+
+
+def draw_heatmap(fig, ax, cax, panel, matrices, region, resolution, banded=False):
+    """
+    Draw heatmap *panel* from its contact *matrices* (one, or two for diff and
+    split panels; diagonal bands for a *banded* triangle) on *ax*, with a
+    horizontal colorbar in *cax*.  The matrices are modified in place.
+    """
+    import matplotlib.pyplot as plt
+    kind = panel['type']
+    chrom, start, end = region
+    method = panel.get('normalization', 'raw')
+    if kind == 'diff':
+        max_distance = panel.get('max_distance')
+        data = difference_matrix(matrices[0], matrices[1], panel.get('operation', 'subtract'),
+                                 panel.get('division_method', 'raw'),
+                                 max_bins=None if max_distance is None else int(np.ceil(max_distance / resolution)))
+        cmap, lognorm = panel.get('cmap', 'bwr'), False
+        label = panel.get('operation', 'subtract')
+    else:
+        data = [normalize_matrix(m, method) for m in matrices]
+        data = split_matrix(*data) if kind == 'split' else data[0]
+        cmap, lognorm = panel.get('cmap', 'autumn_r'), method == 'logNorm'
+        label = method
+    vmin = panel.get('vmin', np.nanmin(data))
+    vmax = panel.get('vmax', np.nanmax(data))
+    if kind == 'triangle':
+        im = pcolormesh_triangle(ax, data, start=start, resolution=resolution, NORM=lognorm,
+                                 vmin=vmin, vmax=vmax, cmap=cmap, banded=banded)
+        ax.set_aspect('auto')
+        ax.set_ylim(0, data.shape[0] * resolution)
+    else:
+        im = pcolormesh_square(ax, data, start, end, NORM=lognorm, cmap=cmap, vmin=vmin, vmax=vmax)
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
+        if kind == 'split' and panel.get('labels'):
+            labels = list(panel['labels']) + [None]
+            ax.text(0.98, 0.98, labels[0], transform=ax.transAxes, ha='right', va='top', fontsize=8)
+            if labels[1]:
+                ax.text(0.02, 0.02, labels[1], transform=ax.transAxes, ha='left', va='bottom', fontsize=8)
+    ax.set_xlim(start, end)
+    _mb_ticks(ax)
+    if panel.get('title'):
+        ax.set_title(panel['title'], fontsize=10)
+    cbar = fig.colorbar(im, cax=cax, orientation='horizontal')
+    cbar.ax.tick_params(labelsize=8)
+    cbar.set_label(label, labelpad=3)
+    return im
+
+
+def draw_track(ax, panel, region, track_store=None):
+    """Draw annotation *panel* (bigwig, bed, loops or genes) on *ax*."""
+    kind = panel['type']
+    if kind == 'bigwig':
+        plot_seq(ax, panel['file'], region, color=panel.get('color', 'blue'),
+                 y_min=panel.get('ymin'), y_max=panel.get('ymax'), store=track_store)
+        if panel.get('label'):
+            ax.set_title(panel['label'], fontsize=8)
+    elif kind == 'bed':
+        plot_bed(ax, panel['file'], region, color=panel.get('color', 'green'), label=panel.get('label'))
+    elif kind == 'loops':
+        plot_loops(ax, panel['file'], region, color=panel.get('color', 'purple'), label=panel.get('label'))
+    else:
+        plot_genes(ax, panel['gtf'], region, genes_to_annotate=panel.get('genes'),
+                   color=panel.get('color', 'blue'))
+    ax.set_xlim(region[1], region[2])
+    _mb_ticks(ax)
+
+
+def panel_height(panel, width, span):
+    """Height in inches of *panel* in a figure *width* inches wide."""
+    if 'height' in panel:
+        return float(panel['height'])
+    if panel['type'] == 'triangle':
+        depth = panel.get('max_distance') or span
+        return width / 2 * min(1.0, depth / span)
+    if panel['type'] in HEATMAP_PANELS:
+        return width
+    return PANEL_HEIGHTS[panel['type']]
+
+
+def stacked_figure(panels, width, span):
+    """
+    Return ``(fig, [(ax, cax), ...])`` with the panels stacked top to bottom;
+    *cax* is the colorbar axis under a heatmap panel, None otherwise.  The
+    figure is not registered with pyplot, so it is freed once unreferenced.
+    """
+    import matplotlib.gridspec as gridspec
+    from matplotlib.figure import Figure
+    heights = [panel_height(panel, width, span) for panel in panels]
+    rows = [h + COLORBAR_GAP + COLORBAR_HEIGHT if panel['type'] in HEATMAP_PANELS else h
+            for panel, h in zip(panels, heights)]
+    # hspace is relative to the mean row height; keep rows and gaps at their size in inches.
+    fig = Figure(figsize=(width, sum(rows) + PANEL_SPACING * (len(rows) - 1)))
+    gs = gridspec.GridSpec(len(rows), 1, height_ratios=rows, hspace=PANEL_SPACING * len(rows) / sum(rows),
+                           top=1, bottom=0)
+    axes = []
+    for i, (panel, height) in enumerate(zip(panels, heights)):
+        if panel['type'] not in HEATMAP_PANELS:
+            axes.append((fig.add_subplot(gs[i, 0]), None))
+            continue
+        inner = gridspec.GridSpecFromSubplotSpec(2, 1, subplot_spec=gs[i, 0],
+                                                 height_ratios=[height, COLORBAR_HEIGHT],
+                                                 hspace=COLORBAR_GAP * 2 / (height + COLORBAR_HEIGHT))
+        axes.append((fig.add_subplot(inner[0, 0]), fig.add_subplot(inner[1, 0])))
+    return fig, axes
+
+
+def build_figure(panels, chrid, start, end, resolution='auto', width=6, balance=True, dtype='float64',
+                 concurrent='none', track_summary=None, max_bins=None, max_matrix_mb=None, title=None):
+    """Load what *panels* need for one region in a single pass and return the drawn Figure."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import load_with_tracks, auto_resolution, TrackStore, pixel_bins, is_path
+    plt.rcParams['font.family'] = 'DejaVu Sans'
+    plt.rcParams['font.size'] = 8
+    region = (chrid, start, end)
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(width))
+    cooler_files = list(dict.fromkeys(f for p in panels if p['type'] in HEATMAP_PANELS
+                                      for f in (p['cooler'], p.get('cooler2')) if is_path(f)))
+    if resolution == 'auto' and cooler_files:
+        resolution = auto_resolution(cooler_files, end - start, max_bins or pixel_bins(width),
+                                     max_mb=max_matrix_mb, dtype=dtype)
+        print(f"Using resolution {resolution} bp")
+
+    # Plan: every distinct matrix is loaded once, together with the bigWig tracks.
+    plan = [_panel_plan(panel, region, resolution, balance, dtype) if panel['type'] in HEATMAP_PANELS else None
+            for panel in panels]
+    loads = dict(load for step in plan if step for load in step[2])
+    calls = {key: load for key, load in loads.items() if not isinstance(load, np.ndarray)}
+    track_files = list(dict.fromkeys(p['file'] for p in panels if p['type'] == 'bigwig' and is_path(p['file'])))
+    loaded = dict(zip(calls, load_with_tracks(list(calls.values()), track_store, track_files,
+                                              region, mode=concurrent)))
+    print(f"{len(panels)} panels: {len(calls)} contact matrices and {len(track_files)} tracks loaded")
+
+    fig, axes = stacked_figure(panels, width, end - start)
+    for panel, step, (ax, cax) in zip(panels, plan, axes):
+        if step is None:
+            draw_track(ax, panel, region, track_store)
+            continue
+        panel_resolution, banded, panel_loads = step
+        # Drawing works in place: every panel gets its own copy of a shared or caller-owned matrix.
+        matrices = [loaded.get(key, load).copy() for key, load in panel_loads]
+        draw_heatmap(fig, ax, cax, panel, matrices, region, panel_resolution, banded=banded)
+    if title:
+        fig.suptitle(title, fontsize=10, y=1 + 0.3 / fig.get_figheight(), va='bottom')
+    return fig
+
+
+def plot_figure(panels, chrid, start, end, output_file, **options):
+    """Draw the figure of *panels* for one region (see ``build_figure``) and save it."""
+    fig = build_figure(panels, chrid, start, end, **options)
+    fig.savefig(output_file, bbox_inches='tight')
+
+
+def render(spec, output_file=None, workers=1, prefetch_depth=0):
+    """Draw every region of *spec* (a spec file or an already loaded mapping)."""
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    else:
+        check_spec(spec)
+    regions = spec_regions(spec['regions'])
+    options = {key: spec[key] for key in FIGURE_OPTIONS if key in spec}
+    options['resolution'] = parse_resolution(options.get('resolution', 'auto'))
+    options['panels'] = spec['panels']
+    options['output_file'] = output_file or spec['output']
+    if len(regions) == 1:
+        chrom, start, end, name = regions[0]
+        if '{' in options['output_file']:
+            options['output_file'] = region_output(options['output_file'], chrom, start, end, name)
+        plot_figure(chrid=chrom, start=start, end=end, **options)
+    else:
+        plot_regions(plot_figure, options, regions, workers=workers, prefetch_depth=prefetch_depth)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='Draw multi-panel figures described by a YAML/JSON spec, loading every shared file once.')
+    parser.add_argument('spec', type=str, help='Render spec (.yaml/.yml, or .json); see the module documentation.')
+    parser.add_argument('--output_file', type=str, default=None, help="Output file; overrides the spec's 'output'.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With several regions: draw them in this many worker processes (one file per region).')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With several regions: load the data of this many upcoming regions in the background while drawing.')
+    parser.add_argument("-V", "--version", action="version", version="HiCPlot {}".format(__version__),
+                        help="Print version and exit")
+    args = parser.parse_args(argv)
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    if (message := workers_conflict(args.output_file or spec['output'], args.workers)):
+        parser.error(message)
+    render(spec, args.output_file, workers=args.workers, prefetch_depth=args.prefetch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+HiCPlot/serve.py
+---------------------------------------------------------------------
+``HiCPlot serve``: a long‑running render process with warm caches.
+
+Every plain ``HiCPlot <tool>`` call is a cold process that imports
+matplotlib and cooler, opens every file and rebuilds its caches.  The server
+runs the same sub‑commands in one process, so opened coolers (with their
+bin metadata), bigWig handles, GTF indexes, parsed annotation tables and the
+most recently fetched matrices (``--cache_mb``) carry over from one request
+to the next.
+
+Requests are HTTP ``POST /render`` with a JSON body
+``{"argv": ["SquHeatmap", "--chrid", ...], "cwd": "/path"}``; relative paths
+in *argv* are resolved against *cwd*.  The reply is
+``{"status": <exit code>, "stdout": ..., "stderr": ...}``.  The server
+listens on a Unix socket (default, see ``default_socket``) or, with
+``--port``, on 127.0.0.1 only.  Requests are rendered one at a time.
+``HiCPlot client`` is the matching thin client.
+
+Rendering runs any sub‑command as the server's user, so every request must
+carry the per‑server secret that the server writes to a 0600 file next to
+its socket (``token_file``) in the ``X-HiCPlot-Token`` header, be sent as
+``application/json`` and carry no ``Origin`` header (browsers add one to
+every cross‑site POST).  The Unix socket itself is only accessible to the
+server's user.
+
+This module only imports the standard library at start‑up, so the client
+can share its protocol helpers without loading the plotting stack.
+"""
+import argparse
+import contextlib
+import hmac
+import http.client
+import http.server
+import io
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+# Sub-commands that make no sense inside the server.
+_NOT_SERVED = ('serve', 'client')
+
+
+def default_socket():
+    """Per‑user Unix socket path used when neither ``--socket`` nor ``--port`` is given."""
+    return os.path.join(tempfile.gettempdir(), f'hicplot-{os.getuid()}.sock')
+
+
+def token_file(socket_path=None, port=None):
+    """File holding the secret of the server on *socket_path* (or TCP *port*)."""
+    if port is not None:
+        return os.path.join(tempfile.gettempdir(), f'hicplot-{os.getuid()}-{port}.token')
+    return (socket_path or default_socket()) + '.token'
+
+
+def read_token(path):
+    """Return the server secret stored in *path*."""
+    with open(path) as fh:
+        return fh.read().strip()
+
+
+def _write_token(path):
+    """Write a fresh secret to *path*, readable by this user only, and return it."""
+    token = secrets.token_hex(32)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(token + '\n')
+    return token
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """``http.client`` connection over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class _UnixHTTPServer(socketserver.UnixStreamServer):
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects an (host, port) client address.
+        return request, ('local', 0)
+
+
+def render(argv, cwd):
+    """
+    Run ``HiCPlot *argv*`` in this process from directory *cwd*.
+
+    Returns ``(status, stdout, stderr)``; argument errors and exceptions are
+    reported through *status* and *stderr* instead of stopping the server.
+    """
+    from HiCPlot.Cli import _SUBCOMMANDS, _load_entry
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    if not argv or argv[0] not in _SUBCOMMANDS or argv[0] in _NOT_SERVED:
+        served = ', '.join(name for name in _SUBCOMMANDS if name not in _NOT_SERVED)
+        return 2, '', f"Unknown or unsupported sub-command {argv[:1]}; choose among {served}.\n"
+    previous_cwd = os.getcwd()
+    status = 0
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            _load_entry(argv[0])(list(argv[1:]))
+        except SystemExit as exc:  # argparse errors, --help, --version
+            if exc.code is None or isinstance(exc.code, int):
+                status = exc.code or 0
+            else:
+                status = 1
+                print(exc.code, file=sys.stderr)
+        except Exception:
+            status = 1
+            traceback.print_exc()
+        finally:
+            os.chdir(previous_cwd)
+            # A tool that failed mid-plot leaves its figures registered with pyplot.
+            import matplotlib.pyplot as plt
+            plt.close('all')
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+class _RenderHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        # Read the body before any rejection, so the client is not cut off mid-send.
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, "Malformed Content-Length")
+            return
+        body = self.rfile.read(length)
+        if self.path != '/render':
+            self.send_error(404)
+            return
+        if self.headers.get('Origin') is not None:
+            self.send_error(403, "Cross-origin requests are not accepted")
+            return
+        if self.headers.get_content_type() != 'application/json':
+            self.send_error(415, "Render requests must be application/json")
+            return
+        if not hmac.compare_digest(self.headers.get('X-HiCPlot-Token', ''), self.server.token):
+            self.send_error(403, "Missing or wrong server token")
+            return
+        try:
+            request = json.loads(body)
+            argv, cwd = list(request['argv']), request.get('cwd', os.getcwd())
+        except (ValueError, KeyError, TypeError) as exc:
+            self.send_error(400, f"Malformed render request: {exc}")
+            return
+        start = time.perf_counter()
+        status, out, err = render(argv, cwd)
+        sys.stderr.write(f"[serve] {' '.join(argv[:1])} -> {status} in {time.perf_counter() - start:.3f} s\n")
+        body = json.dumps({'status': status, 'stdout': out, 'stderr': err}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per request is written by do_POST
+
+
+def serve(socket_path=None, port=None, cache_mb=1024, preload=True):
+    """Serve render requests until interrupted (see module docstring)."""
+    from HiCPlot.Cli import _SUBCOMMANDS, _load_entry
+    from HiCPlot.io import keep_recent_matrices
+
+    # Figures are only ever saved to files.
+    import matplotlib
+    matplotlib.use('Agg')
+    keep_recent_matrices(cache_mb)
+    if preload:
+        for name in _SUBCOMMANDS:
+            if name not in _NOT_SERVED:
+                _load_entry(name)
+
+    if port is not None:
+        server = http.server.HTTPServer(('127.0.0.1', port), _RenderHandler)
+        where = f"http://127.0.0.1:{port}"
+    else:
+        socket_path = socket_path or default_socket()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        # The socket is created 0600 before it starts listening.
+        previous_umask = os.umask(0o177)
+        try:
+            server = _UnixHTTPServer(socket_path, _RenderHandler)
+        finally:
+            os.umask(previous_umask)
+        where = socket_path
+    secret_file = token_file(socket_path, port)
+    server.token = _write_token(secret_file)
+    print(f"HiCPlot serve: listening on {where} (token in {secret_file})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        if os.path.exists(secret_file):
+            os.remove(secret_file)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='Serve HiCPlot render requests from one process with warm caches.')
+    parser.add_argument('--socket', type=str, default=None,
+                        help=f'Unix socket to listen on. Default: {default_socket()}')
+    parser.add_argument('--port', type=int, default=None,
+                        help='Listen on this 127.0.0.1 TCP port (HTTP) instead of a Unix socket.')
+    parser.add_argument('--cache_mb', type=float, default=1024,
+                        help='Memory (MiB) kept for recently fetched contact matrices; 0 disables.')
+    parser.add_argument('--no_preload', action='store_true',
+                        help='Import the plotting tools on their first request instead of at start-up.')
+    args = parser.parse_args(argv)
+    if args.socket is not None and args.port is not None:
+        parser.error("--socket and --port are mutually exclusive.")
+    serve(args.socket, args.port, cache_mb=args.cache_mb, preload=not args.no_preload)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,12 @@
 #!/usr/bin/env python
 import argparse
 import os
-import pandas as pd
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-import pyBigWig
-import pyranges as pr
 import numpy as np
-import matplotlib.pyplot as plt
-import cooler
-from matplotlib.colors import LogNorm
-from matplotlib.ticker import EngFormatter
-import itertools
 import sys
-import scipy.sparse
-import matplotlib.gridspec as gridspec
-import matplotlib.colors as mcolors
-from matplotlib.patches import Arc
 from collections import defaultdict
-from matplotlib import rcParams
-rcParams['font.family'] = 'DejaVu Sans'
+from HiCPlot.normalize import normalize_matrix, MATRIX_DTYPES
+from HiCPlot.io import CONCURRENCY_MODES, parse_resolution
+from HiCPlot.batch import plot_regions, workers_conflict
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 version_py = os.path.join(script_dir, "_version.py")
@@ -38,12 +26,11 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     - color: Color for gene lines and exons.
     - track_height: Height of each gene track.
     """
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_gtf
     spacing_factor = 1.5
     chrom, start, end = region
-    # Load the GTF file using pyranges
-    gtf = pr.read_gtf(gtf_file)
-    # Filter relevant region
-    region_genes = gtf[(gtf.Chromosome == chrom) & (gtf.Start < end) & (gtf.End > start)]
+    region_genes = read_gtf(gtf_file, region)
 
     if region_genes.empty:
         print("No genes found in the specified region.")
@@ -51,7 +38,7 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
         return
 
     # Select the longest isoform for each gene
-    longest_isoforms = region_genes.df.loc[region_genes.df.groupby('gene_id')['End'].idxmax()]
+    longest_isoforms = region_genes.loc[region_genes.groupby('gene_id')['End'].idxmax()]
 
     y_offset = 0
     y_step = track_height * spacing_factor  # Adjusted vertical step for tighter spacing
@@ -68,8 +55,8 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
         ax.plot([gene['Start'], gene['End']], [y_offset, y_offset], color=color, lw=1)
 
         # Plot exons as larger rectangles for increased height
-        exons = region_genes.df[
-            (region_genes.df['gene_id'] == gene['gene_id']) & (region_genes.df['Feature'] == 'exon')
+        exons = region_genes[
+            (region_genes['gene_id'] == gene['gene_id']) & (region_genes['Feature'] == 'exon')
         ]
         for _, exon in exons.iterrows():
             ax.add_patch(
@@ -105,48 +92,9 @@ def plot_genes(ax, gtf_file, region, genes_to_annotate=None, color='blue', track
     # Format x-axis to display positions in megabases (Mb)
     ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, pos: f'{x / 1e6:.2f}'))
 
-def read_bigwig(file_path, region):
-    """Read BigWig or bedGraph file and return positions and values."""
-    chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        # Open the BigWig file
-        bw = pyBigWig.open(file_path)
-        # Fetch values from the region
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()  # Close the BigWig file
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        # Read the bedGraph file using pandas
-        # Assuming bedGraph files have columns: chrom, start, end, value
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        # Filter the data for the specified region
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            return None, None
-        # Prepare the positions and values
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
-    return positions, values
-
 def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                       bigwig_files_sample2, bigwig_labels_sample2,
-                      region):
+                      region, store=None):
     """
     Compute the minimum and maximum values for BigWig tracks per type to ensure consistent y-axis scaling.
 
@@ -156,10 +104,14 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
     - bigwig_files_sample2: List of BigWig files for sample 2.
     - bigwig_labels_sample2: List of labels corresponding to BigWig files for sample 2.
     - region: Tuple containing (chromosome, start, end).
+    - store: Optional TrackStore shared with plot_seq so each file is decoded once.
 
     Returns:
     - type_min_max: Dictionary with BigWig types as keys and (min, max) tuples as values.
     """
+    from HiCPlot.io import TrackStore
+    if store is None:
+        store = TrackStore()
     type_min_max = defaultdict(lambda: {'min': np.inf, 'max': -np.inf})
 
     # Function to extract type from label (assumes type is the first part before a space)
@@ -172,7 +124,7 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     for file, label in zip(combined_files, combined_labels):
         bw_type = extract_type(label)
-        positions, values = read_bigwig(file, region)
+        positions, values = store.read(file, region)
         if values is not None and len(values) > 0:
             current_min = np.nanmin(values)
             current_max = np.nanmax(values)
@@ -188,45 +140,18 @@ def get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
 
     return type_min_max
 
-def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
+def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None, store=None):
     """Plot RNA-seq/ChIP-seq expression from BigWig or bedGraph file on given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import TrackStore
     chrom, start, end = region
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension in ['.bw', '.bigwig']:
-        # Open the BigWig file
-        bw = pyBigWig.open(file_path)
-        # Fetch values from the region
-        values = bw.values(chrom, start, end, numpy=True)
-        bw.close()  # Close the BigWig file
-        positions = np.linspace(start, end, len(values))
-    elif file_extension in ['.bedgraph', '.bg']:
-        # Read the bedGraph file using pandas
-        # Assuming bedGraph files have columns: chrom, start, end, value
-        bedgraph_df = pd.read_csv(file_path, sep='\t', header=None, comment='#', 
-                                  names=['chrom', 'start', 'end', 'value'])
-        # Filter the data for the specified region
-        region_data = bedgraph_df[
-            (bedgraph_df['chrom'] == chrom) &
-            (bedgraph_df['end'] > start) &
-            (bedgraph_df['start'] < end)
-        ]
-        if region_data.empty:
-            print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
-            ax.axis('off')  # Hide the axis if no data
-            return
-        # Prepare the positions and values
-        positions = np.sort(np.unique(np.concatenate([region_data['start'].values, 
-                                                      region_data['end'].values])))
-        values = np.zeros_like(positions, dtype=float)
-        for idx in range(len(region_data)):
-            s = region_data.iloc[idx]['start']
-            e = region_data.iloc[idx]['end']
-            v = region_data.iloc[idx]['value']
-            mask = (positions >= s) & (positions <= e)
-            values[mask] = v
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are BigWig (.bw) and bedGraph (.bedgraph, .bg).")
+    if store is None:
+        store = TrackStore()
+    positions, values = store.read(file_path, region)
+    if positions is None or values is None:
+        print(f"No data found in the specified region ({chrom}:{start}-{end}) in {file_path}")
+        ax.axis('off')
+        return
     
     # Plot the RNA-seq/ChIP-seq expression as a filled line plot
     ax.plot(positions, values, color=color, alpha=0.7)
@@ -241,16 +166,10 @@ def plot_seq(ax, file_path, region, color='blue', y_min=None, y_max=None):
 
 def plot_bed(ax, bed_file, region, color='green', linewidth=1, label=None):
     """Plot BED file annotations on the given axis."""
+    import matplotlib.pyplot as plt
+    from HiCPlot.io import read_bed
     chrom, start, end = region
-    # Read the BED file
-    bed_df = pd.read_csv(bed_file, sep='\t', header=None, comment='#', 
-                         names=['chrom', 'start', 'end'] + [f'col{i}' for i in range(4, 10)])
-    # Filter for the region and chromosome
-    region_bed = bed_df[
-        (bed_df['chrom'] == chrom) &
-        (bed_df['end'] > start) &
-        (bed_df['start'] < end)
-    ]
+    region_bed = read_bed(bed_file, region)
     if region_bed.empty:
         print(f"No BED entries found in the specified region ({chrom}:{start}-{end}) in {bed_file}")
         ax.axis('off')
@@ -279,6 +198,7 @@ def pcolormesh_square(ax, matrix, start, end, cmap='autumn_r', vmin=None, NORM=T
     """
     Plot the matrix as a heatmap on the given axis.
     """
+    from matplotlib.colors import LogNorm
     if matrix is None:
         return None
     if NORM:
@@ -304,18 +224,11 @@ def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, la
     - linewidth: Width of the arc lines.
     - label: Label for the loop track (sample name).
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Arc
+    from HiCPlot.io import read_loops
     chrom, start, end = region
-    # Read the loop file
-    loop_df = pd.read_csv(loop_file, sep='\t', header=0, usecols=[0,1,2,3,4,5],
-                          names=['chrom1', 'start1', 'end1', 'chrom2', 'start2', 'end2'])
-
-    # Filter loops where both anchors are within the region and on the same chromosome
-    loop_df = loop_df[
-        (loop_df['chrom1'] == chrom) &
-        (loop_df['chrom2'] == chrom) &
-        (loop_df['start1'] >= start) & (loop_df['end1'] <= end) &
-        (loop_df['start2'] >= start) & (loop_df['end2'] <= end)
-    ]
+    loop_df = read_loops(loop_file, region)
 
     if loop_df.empty:
         print(f"No loops detected in the specified region ({chrom}:{start}-{end}) in {loop_file}.")
@@ -371,6 +284,23 @@ def plot_loops(ax, loop_file, region, color='purple', alpha=0.5, linewidth=1, la
     if label:
         ax.set_title(label, fontsize=8,pad=10)  # Add sample name above the loop track
 
+def split_matrix(upper, lower=None):
+    """
+    Combine two matrices: upper triangle from *upper*, lower triangle from
+    *lower* (zero if None), diagonal NaN.
+    """
+    combined_matrix = np.full_like(upper, np.nan)
+    triu_indices = np.triu_indices_from(upper, k=1)
+    tril_indices = np.tril_indices_from(upper, k=-1)
+
+    combined_matrix[triu_indices] = upper[triu_indices]
+    if lower is not None:
+        combined_matrix[tril_indices] = lower[tril_indices]
+    else:
+        combined_matrix[tril_indices] = 0  # If single sample, set lower triangle to zero
+    # Diagonal is already set to np.nan
+    return combined_matrix
+
 def plot_heatmaps(cooler_file1, sampleid1=None,format="balance",
                  bigwig_files_sample1=[], bigwig_labels_sample1=[], colors_sample1="red",
                  bed_files_sample1=[], bed_labels_sample1=[],
@@ -383,68 +313,42 @@ def plot_heatmaps(cooler_file1, sampleid1=None,format="balance",
                  bigwig_files_sample2=[], bigwig_labels_sample2=[], colors_sample2="blue",
                  bed_files_sample2=[], bed_labels_sample2=[], 
                  track_size=5, track_spacing=0.5, normalization_method='raw',
-                 genes_to_annotate=None,title=None):
+                 genes_to_annotate=None,title=None, track_summary=None, max_distance=None, dtype='float64',
+                 max_bins=None, max_matrix_mb=None, concurrent='none'):
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from HiCPlot.io import cooler_call, load_with_tracks, auto_resolution, chrom_bounds, fetch_matrix, TrackStore, pixel_bins
+    plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 8
     # Set parameters
+    if cooler_file1 and (start is None or end is None):
+        # A chromosome without --start/--end is drawn whole.
+        start, end = chrom_bounds(cooler_file1, chrid, start, end)
     region = (chrid, start, end)
+    track_store = TrackStore(summary=track_summary, bins=pixel_bins(track_size))
+    if resolution == 'auto' and cooler_file1:
+        resolution = auto_resolution([f for f in (cooler_file1, cooler_file2) if f], end - start,
+                                     max_bins or pixel_bins(track_size), max_mb=max_matrix_mb, dtype=dtype)
+        print(f"Using resolution {resolution} bp")
+    band_bins = None if max_distance is None else int(np.ceil(max_distance / resolution))
     
-    # Load cooler data for Sample1
-    clr1 = cooler.Cooler(f'{cooler_file1}::resolutions/{resolution}')
-    if format == "balance":
-        data1 = clr1.matrix(balance=True).fetch(region).astype(float)
-    elif format == "ICE":
-        data1 = clr1.matrix(balance=False).fetch(region).astype(float)
-    else:
+    if format not in ("balance", "ICE"):
         print("input format is wrong")
-    # Load cooler data for Sample2 if provided
+        return
+    # Load cooler data for Sample1 (and Sample2 if provided) with the bigWig tracks, concurrently with --concurrent
     single_sample = cooler_file2 is None
-    if not single_sample:
-        clr2 = cooler.Cooler(f'{cooler_file2}::resolutions/{resolution}')
-        if format == "balance":
-            data2 = clr2.matrix(balance=True).fetch(region).astype(float)
-        elif format == "ICE":
-            data2 = clr2.matrix(balance=False).fetch(region).astype(float)
-        else:
-            print("input format is wrong")
+    matrices = load_with_tracks(
+        [cooler_call(f, resolution, fetch_matrix, region, balance=format == "balance", max_bins=band_bins, dtype=dtype)
+         for f in (cooler_file1, cooler_file2) if f],
+        track_store, list(bigwig_files_sample1) + list(bigwig_files_sample2), region, mode=concurrent)
+    data1 = matrices[0]
+    data2 = None if single_sample else matrices[1]
     
     # Apply normalization to Hi-C matrices
-    if normalization_method == 'raw':
-        normalized_data1 = data1
-        normalized_data2 = data2 if not single_sample else None
-    elif normalization_method == 'logNorm':
-        normalized_data1 = np.maximum(data1, 0)
-        if not single_sample:
-            normalized_data2 = np.maximum(data2, 0)
-    elif normalization_method == 'log2':
-        normalized_data1 = np.log2(data1)
-        if not single_sample:
-            normalized_data2 = np.log2(data2)
-    elif normalization_method == 'log2_add1':
-        normalized_data1 = np.log2(data1 + 1)
-        if not single_sample:
-            normalized_data2 = np.log2(data2 + 1)
-    elif normalization_method == 'log':
-        normalized_data1 = np.log(data1)
-        if not single_sample:
-            normalized_data2 = np.log(data2)
-    elif normalization_method == 'log_add1':
-        normalized_data1 = np.log(data1 + 1)
-        if not single_sample:
-            normalized_data2 = np.log(data2 + 1)
-    else:
-        raise ValueError(f"Unsupported normalization method: {normalization_method}")
+    normalized_data1 = normalize_matrix(data1, normalization_method)
+    normalized_data2 = normalize_matrix(data2, normalization_method) if not single_sample else None
     
-    # Create combined matrix: upper triangle from data1, lower triangle from data2, diagonal set to np.nan
-    combined_matrix = np.full_like(data1, np.nan)
-    triu_indices = np.triu_indices_from(data1, k=1)
-    tril_indices = np.tril_indices_from(data1, k=-1)
-
-    combined_matrix[triu_indices] = normalized_data1[triu_indices]
-    if not single_sample:
-        combined_matrix[tril_indices] = normalized_data2[tril_indices]
-    else:
-        combined_matrix[tril_indices] = 0  # If single sample, set lower triangle to zero
-    # Diagonal is already set to np.nan
+    combined_matrix = split_matrix(normalized_data1, normalized_data2)
 
     # Determine color limits for combined heatmap
     if vmin is None:
@@ -546,7 +450,7 @@ def plot_heatmaps(cooler_file1, sampleid1=None,format="balance",
     else:
         type_min_max = get_track_min_max(bigwig_files_sample1, bigwig_labels_sample1,
                                         bigwig_files_sample2, bigwig_labels_sample2,
-                                        region=region)
+                                        region=region, store=track_store)
 
     # Plot BigWig and BED tracks
     # Plot BigWig tracks for Sample1
@@ -558,7 +462,7 @@ def plot_heatmaps(cooler_file1, sampleid1=None,format="balance",
             bw_type = bigwig_labels_sample1[i].split("_")[1] if "_" in bigwig_labels_sample1[i] else 'Unknown'
             y_min, y_max = type_min_max[bw_type]
             plot_seq(ax_bw, bigwig_files_sample1[i], region, color=colors_sample1, 
-                     y_min=y_min, y_max=y_max)
+                     y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample1[i]}", fontsize=8,pad=10)
             ax_bw.set_xlim(start, end)
             if y_min is not None and y_max is not None:
@@ -572,7 +476,7 @@ def plot_heatmaps(cooler_file1, sampleid1=None,format="balance",
             bw_type = bigwig_labels_sample2[j].split("_")[1] if "_" in bigwig_labels_sample2[j] else 'Unknown'
             y_min, y_max = type_min_max[bw_type]
             plot_seq(ax_bw, bigwig_files_sample2[j], region, color=colors_sample2, 
-                     y_min=y_min, y_max=y_max)
+                     y_min=y_min, y_max=y_max, store=track_store)
             ax_bw.set_title(f"{bigwig_labels_sample2[j]}", fontsize=8,pad=10)
             ax_bw.set_xlim(start, end)
             if y_min is not None and y_max is not None:
@@ -618,10 +522,26 @@ def main(argv: list[str] | None = None):
 
     parser.add_argument('--sampleid1', type=str, required=True, help='sample1 name.')
     parser.add_argument('--sampleid2', type=str, required=True, help='sample2 name.')
-    parser.add_argument('--resolution', type=int, required=True, help='Resolution for the cooler data.')
-    parser.add_argument('--start', type=int, required=True, help='Start position for the region of interest.')
-    parser.add_argument('--end', type=int, required=True, help='End position for the region of interest.')
-    parser.add_argument('--chrid', type=str, required=True, help='Chromosome ID.')
+    parser.add_argument('--resolution', type=parse_resolution, required=True, help="Resolution for the cooler data, or 'auto' for the finest one that fits --max_bins / --max_matrix_mb.")
+    parser.add_argument('--max_bins', type=int, default=None,
+                        help='With --resolution auto: most bins allowed across the window. Default: output pixels across the heatmap.')
+    parser.add_argument('--max_matrix_mb', type=float, default=None,
+                        help='With --resolution auto: memory budget (MiB) for each dense contact matrix.')
+    parser.add_argument('--max_distance', type=int, default=None,
+                        help='Only fetch contacts up to this genomic distance (in bp) from the diagonal, read as sparse pixels; cells further out are treated as missing. Default: the whole window.')
+    parser.add_argument('--dtype', type=str, default='float64', choices=MATRIX_DTYPES,
+                        help='Floating point precision of the contact matrices; float32 halves their memory.')
+    parser.add_argument('--concurrent', type=str, default='none', choices=CONCURRENCY_MODES,
+                        help="Fetch the two samples' contact matrices and bigWig tracks in parallel with a 'thread' or 'process' pool. Default: one after the other.")
+    parser.add_argument('--start', type=int, help='Start position for the region of interest.')
+    parser.add_argument('--end', type=int, help='End position for the region of interest.')
+    parser.add_argument('--chrid', type=str, help='Chromosome ID.')
+    parser.add_argument('--regions', type=str, default=None,
+                        help="BED file of regions to plot in one run instead of --chrid/--start/--end. An --output_file ending in .pdf gets one page per region; otherwise one file per region is written, named after the BED name column (or chrom_start_end), or via {name}/{chrom}/{start}/{end} placeholders.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='With --regions: number of processes drawing regions in parallel.')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='With --regions: read the data of this many upcoming regions in the background while the current one is drawn.')
     parser.add_argument('--gtf_file', type=str, required=False, help='Path to the GTF file for gene annotations.', default=None)
 
     # Optional arguments
@@ -654,6 +574,8 @@ def main(argv: list[str] | None = None):
 
     parser.add_argument('--track_size', type=float, default=5, help='Height of the heatmap track (in inches).')
     parser.add_argument('--track_spacing', type=float, default=0.5, help='Spacing between tracks (in inches).')
+    parser.add_argument('--track_summary', type=str, default='none', choices=['none', 'mean', 'max', 'min'],
+                        help="Read BigWig tracks as per-pixel 'mean', 'max' or 'min' summaries sized to the track width instead of per-base values ('none').")
 
     parser.add_argument('--track_min', type=float, default=None, help='Global minimum value for all BigWig tracks.')
     parser.add_argument('--track_max', type=float, default=None, help='Global maximum value for all BigWig tracks.')
@@ -664,9 +586,13 @@ def main(argv: list[str] | None = None):
     parser.add_argument("-V", "--version", action="version",version="SquHeatmap {}".format(__version__)\
                       ,help="Print version and exit")
     args = parser.parse_args(argv)
+    if args.regions is None and (args.start is None or args.end is None or args.chrid is None):
+        parser.error("--start, --end and --chrid are required unless --regions is given.")
+    if args.regions is not None and (message := workers_conflict(args.output_file, args.workers)):
+        parser.error(message)
 
 # Call the plotting function
-    plot_heatmaps(
+    options = dict(
         cooler_file1=args.cooler_file1,
         sampleid1=args.sampleid1,
         bigwig_files_sample1=args.bigwig_files_sample1,
@@ -695,12 +621,22 @@ def main(argv: list[str] | None = None):
         bed_files_sample2=args.bed_files_sample2,
         bed_labels_sample2=args.bed_labels_sample2,
         track_size=args.track_size,
+        track_summary=None if args.track_summary == 'none' else args.track_summary,
+        max_distance=args.max_distance,
+        max_bins=args.max_bins,
+        max_matrix_mb=args.max_matrix_mb,
+        concurrent=args.concurrent,
+        dtype=args.dtype,
         track_spacing=args.track_spacing,
         normalization_method=args.normalization_method,
         genes_to_annotate=args.genes_to_annotate,
         title=args.title,
         format=args.format
     )
+    if args.regions:
+        plot_regions(plot_heatmaps, options, args.regions, workers=args.workers, prefetch_depth=args.prefetch)
+    else:
+        plot_heatmaps(**options)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+benchmarks/startup.py
+---------------------------------------------------------------------
+Start‑up time of the ``HiCPlot`` command line.
+
+Cluster jobs launch HiCPlot thousands of times, so the wrapper must not pay
+for dependencies a sub‑command does not use.  For each command below this
+script
+
+* runs it in a fresh interpreter ``--repeat`` times and reports the median
+  wall time, and
+* checks that the heavy modules listed for it were never imported.
+
+It exits with status 1 when a forbidden module shows up or, with
+``--max_ms``, when a median exceeds the budget, so it can guard CI.
+
+Usage
+-----
+    $ python benchmarks/startup.py [--repeat 5] [--max_ms 1500]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Every sub-command of HiCPlot/Cli.py.
+TOOLS = ['SquHeatmap', 'SquHeatmapTrans', 'TriHeatmap', 'DiffSquHeatmap', 'DiffSquHeatmapTrans',
+         'upper_lower_triangle_heatmap', 'NGStrack', 'BuildIndex', 'render', 'serve', 'client']
+# No ``--help`` may import these: tools load them after parsing their arguments.
+HEAVY_MODULES = ('matplotlib', 'cooler', 'pandas', 'pyranges', 'pyBigWig', 'scipy', 'h5py')
+
+# (arguments to HiCPlot, modules that must stay unimported)
+COMMANDS = [(['--help'], HEAVY_MODULES)] + [
+    ([tool, '--help'], HEAVY_MODULES + (('numpy',) if tool == 'client' else ()))
+    for tool in TOOLS
+]
+
+# Runs the CLI in-process, then reports which top-level modules were loaded.
+_PROBE = """
+import json, sys
+from HiCPlot.Cli import main
+try:
+    main({args!r})
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))
+"""
+
+
+def run_once(args):
+    """Return (seconds, loaded top-level modules) of one ``HiCPlot *args`` run."""
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, '-c', _PROBE.format(args=args)],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if done.returncode != 0:
+        raise RuntimeError(f"HiCPlot {' '.join(args)} failed:\n{done.stderr}")
+    return elapsed, set(json.loads(done.stderr.strip().splitlines()[-1]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure HiCPlot command-line start-up time.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per command; the median is reported.')
+    parser.add_argument('--max_ms', type=float, default=None, help='Fail when a median exceeds this many milliseconds.')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for command, forbidden in COMMANDS:
+        times = []
+        for _ in range(args.repeat):
+            elapsed, modules = run_once(command)
+            times.append(elapsed)
+        median_ms = statistics.median(times) * 1000
+        leaked = sorted(set(forbidden) & modules)
+        status = 'ok'
+        if leaked:
+            status = 'imports ' + ', '.join(leaked)
+            failed = True
+        elif args.max_ms is not None and median_ms > args.max_ms:
+            status = f'over {args.max_ms:.0f} ms'
+            failed = True
+        print(f"HiCPlot {' '.join(command):<28} {median_ms:8.1f} ms  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib.use('Agg')
+
+CHROMSIZES = {'chr1': 600_000, 'chr2': 400_000}
+RESOLUTIONS = [5000, 10000]
+
+
+def make_mcool(root, name, seed):
+    """Small balanced .mcool (5 kb and 10 kb) with distance decay, trans contacts and empty bins."""
+    cooler = pytest.importorskip('cooler')
+    rng = np.random.default_rng(seed)
+    bins = cooler.binnify(pd.Series(CHROMSIZES), RESOLUTIONS[0])
+    n = len(bins)
+    i, j = rng.integers(0, n, 60_000), rng.integers(0, n, 60_000)
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    keep = rng.random(len(i)) < 1.0 / (1 + (j - i) / 4)
+    # Bins 20-23 get no contacts at all, so balancing leaves their weights NaN.
+    keep &= ~np.isin(i, range(20, 24)) & ~np.isin(j, range(20, 24))
+    pixels = (pd.DataFrame({'bin1_id': i[keep], 'bin2_id': j[keep]})
+              .value_counts().reset_index(name='count').sort_values(['bin1_id', 'bin2_id']))
+    base = str(root / 'base.cool')
+    cooler.create_cooler(base, bins, pixels, ordered=True)
+    path = str(root / f'{name}.mcool')
+    cooler.zoomify_cooler(base, path, RESOLUTIONS, chunksize=100_000)
+    for resolution in RESOLUTIONS:
+        cooler.balance_cooler(cooler.Cooler(f'{path}::resolutions/{resolution}'), store=True)
+    return path
+
+
+@pytest.fixture(scope='session')
+def mcool(tmp_path_factory):
+    return make_mcool(tmp_path_factory.mktemp('coolers'), 'sample', 0)
+
+
+@pytest.fixture(scope='session')
+def mcool2(tmp_path_factory):
+    """A second sample over the same bins, for difference maps."""
+    return make_mcool(tmp_path_factory.mktemp('coolers'), 'sample2', 1)
+
+
+@pytest.fixture
+def clr(mcool):
+    cooler = pytest.importorskip('cooler')
+    return cooler.Cooler(f'{mcool}::resolutions/{RESOLUTIONS[0]}')
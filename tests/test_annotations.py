@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from HiCPlot.io import annotations
+from HiCPlot.io.annotations import read_bed, read_loops
+
+REGION = ('chr1', 0, 1000)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    annotations._TABLES.clear()
+    yield
+    annotations._TABLES.clear()
+
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_read_bed(tmp_path):
+    bed = tmp_path / 'peaks.bed'
+    bed.write_text("# peaks\nchr1\t10\t20\tx\nchr2\t10\t20\ty\nchr1\t990\t1100\tz\nchr1\t1000\t1100\tw\n")
+    assert read_bed(str(bed), REGION).values.tolist() == [['chr1', 10, 20], ['chr1', 990, 1100]]
+
+
+def test_read_loops_keeps_intra_chromosomal_loops_inside_region(tmp_path):
+    loops = tmp_path / 'loops.bedpe'
+    loops.write_text("chrom1\tstart1\tend1\tchrom2\tstart2\tend2\n"
+                     "chr1\t10\t20\tchr1\t500\t510\n"
+                     "chr1\t10\t20\tchr2\t500\t510\n"
+                     "chr1\t10\t20\tchr1\t995\t1005\n")
+    assert read_loops(str(loops), REGION).values.tolist() == [['chr1', 10, 20, 'chr1', 500, 510]]
+
+
+def test_table_is_parsed_once(tmp_path):
+    bed = tmp_path / 'peaks.bed'
+    write(bed, "chr1\t10\t20\n")
+    first = read_bed(str(bed), REGION)
+    assert len(annotations._TABLES) == 1
+    assert read_bed(str(bed), REGION).equals(first)
+    assert len(annotations._TABLES) == 1
+
+
+def test_rewritten_table_is_reparsed(tmp_path):
+    bed = tmp_path / 'peaks.bed'
+    write(bed, "chr1\t10\t20\n", mtime_ns=1_000_000_000)
+    assert read_bed(str(bed), REGION)['start'].tolist() == [10]
+    # Same size, other mtime.
+    write(bed, "chr1\t30\t40\n", mtime_ns=2_000_000_000)
+    assert read_bed(str(bed), REGION)['start'].tolist() == [30]
+    # Other size, same mtime (coarse file-system timestamps).
+    write(bed, "chr1\t300\t400\n", mtime_ns=2_000_000_000)
+    assert read_bed(str(bed), REGION)['start'].tolist() == [300]
+
+
+def test_relative_paths_from_other_directories_do_not_collide(tmp_path, monkeypatch):
+    for name, start in (('a', 10), ('b', 500)):
+        (tmp_path / name).mkdir()
+        write(tmp_path / name / 'peaks.bed', f"chr1\t{start}\t{start + 10}\n", mtime_ns=1_000_000_000)
+    for name, start in (('a', 10), ('b', 500)):
+        monkeypatch.chdir(tmp_path / name)
+        assert read_bed('peaks.bed', REGION)['start'].tolist() == [start]
+
+
+def test_table_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(annotations, 'MAX_TABLES', 2)
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f'{i}.bed')
+        write(paths[-1], f"chr1\t{i}\t{i + 1}\n")
+        read_bed(str(paths[-1]), REGION)
+    assert [key[0] for key in annotations._TABLES] == [str(p) for p in paths[1:]]
+
+
+def test_bed_and_loops_from_data_frames():
+    pd = pytest.importorskip('pandas')
+    bed = pd.DataFrame([['chr1', 10, 20, 'x'], ['chr2', 10, 20, 'y'], ['chr1', 2000, 2100, 'z']])
+    assert read_bed(bed, REGION).values.tolist() == [['chr1', 10, 20]]
+    loops = pd.DataFrame([['chr1', 10, 20, 'chr1', 500, 510], ['chr1', 10, 20, 'chr1', 5000, 5010]])
+    assert len(read_loops(loops, REGION)) == 1
+    assert not annotations._TABLES
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from matplotlib.figure import Figure
+
+from HiCPlot.api import figure, heatmap
+
+REGION = ('chr1', 0, 200_000)
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(0)
+    matrix = rng.random((20, 20))
+    return matrix + matrix.T
+
+
+@pytest.mark.parametrize('kind', ['square', 'triangle', 'diff', 'split'])
+def test_heatmap_from_arrays_leaves_them_untouched(matrix, kind):
+    original = matrix.copy()
+    fig = heatmap(matrix, 'chr1:0-200,000', kind=kind, matrix2=matrix[::-1, ::-1].copy(),
+                  normalization='log2_add1')
+    assert isinstance(fig, Figure)
+    np.testing.assert_array_equal(matrix, original)
+
+
+def test_triangle_from_a_band(matrix):
+    band = np.stack([np.diagonal(matrix, d).tolist() + [np.nan] * d for d in range(5)])
+    assert isinstance(heatmap(band, REGION, kind='triangle'), Figure)
+
+
+def test_heatmap_from_cooler_and_file(mcool, clr, capsys):
+    for source in (clr, mcool):
+        assert isinstance(heatmap(source, REGION, resolution=5000), Figure)
+    assert capsys.readouterr().out.count('1 contact matrices') == 2
+
+
+def test_figure_from_in_memory_tracks_and_annotations(matrix):
+    bed = pd.DataFrame([['chr1', 10_000, 20_000], ['chr1', 150_000, 160_000]])
+    loops = pd.DataFrame([['chr1', 10_000, 20_000, 'chr1', 100_000, 110_000]])
+    gtf = pd.DataFrame({'Chromosome': 'chr1', 'Feature': ['gene', 'exon', 'CDS'], 'Start': [5000, 5000, 5000],
+                        'End': [50_000, 6000, 5100], 'gene_id': 'g1', 'gene_name': 'G1'})
+    fig = figure([{'type': 'square', 'cooler': matrix},
+                  {'type': 'bigwig', 'file': np.linspace(0, 1, 1000), 'label': 'signal'},
+                  {'type': 'bed', 'file': bed},
+                  {'type': 'loops', 'file': loops},
+                  {'type': 'genes', 'gtf': gtf}], REGION, title='in memory')
+    assert isinstance(fig, Figure)
+    assert len(fig.axes) >= 5
+
+
+def test_unknown_figure_option(matrix):
+    with pytest.raises(ValueError, match='Unknown figure options'):
+        figure([{'type': 'square', 'cooler': matrix}], REGION, colour='red')
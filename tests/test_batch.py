@@ -0,0 +1,84 @@
+import pytest
+
+from HiCPlot.batch import plan_windows, read_regions, region_output, workers_conflict
+
+
+def test_plan_windows_merges_overlapping_and_abutting_regions():
+    regions = [('chr1', 500, 900, 'c'), ('chr1', 0, 300, 'a'), ('chr1', 300, 400, 'b'),
+               ('chr2', 100, 200, 'd'), ('chr1', 950, 1000, 'e')]
+    assert plan_windows(regions) == [('chr1', 0, 400, [1, 2]), ('chr1', 500, 900, [0]),
+                                     ('chr1', 950, 1000, [4]), ('chr2', 100, 200, [3])]
+
+
+def test_plan_windows_never_merges_across_chromosomes():
+    assert plan_windows([('chr1', 0, 100), ('chr2', 50, 150)]) == [('chr1', 0, 100, [0]), ('chr2', 50, 150, [1])]
+
+
+def test_plan_windows_limits():
+    regions = [('chr1', start, start + 200) for start in range(0, 1000, 100)]
+    for window in plan_windows(regions, max_span=450):
+        assert window[2] - window[1] <= 450
+    assert [len(w[3]) for w in plan_windows(regions, max_regions=4)] == [4, 4, 2]
+    assert sorted(i for w in plan_windows(regions, max_span=450, max_regions=2) for i in w[3]) == list(range(10))
+
+
+def test_plan_windows_contained_region():
+    assert plan_windows([('chr1', 0, 1000), ('chr1', 100, 200)], max_span=1000) == [('chr1', 0, 1000, [0, 1])]
+
+
+def test_read_regions_names(tmp_path):
+    bed = tmp_path / 'regions.bed'
+    bed.write_text("# comment\nchr1\t0\t100\tfirst/peak\nchr2\t5\t50\n\n")
+    assert read_regions(str(bed)) == [('chr1', 0, 100, 'first_peak'), ('chr2', 5, 50, 'chr2_5_50')]
+
+
+def test_read_regions_rejects_empty_file(tmp_path):
+    bed = tmp_path / 'empty.bed'
+    bed.write_text("# nothing\n")
+    with pytest.raises(ValueError):
+        read_regions(str(bed))
+
+
+def test_region_output():
+    assert region_output('out/plot.png', 'chr1', 0, 100, 'a') == 'out/plot.a.png'
+    assert region_output('{chrom}_{start}_{end}.{name}.pdf', 'chr1', 0, 100, 'a') == 'chr1_0_100.a.pdf'
+
+
+def test_workers_conflict():
+    assert workers_conflict('all.pdf', 4) is not None
+    assert workers_conflict('all.pdf', 1) is None
+    assert workers_conflict('{name}.pdf', 4) is None
+    assert workers_conflict('plot.png', 4) is None
+
+
+def test_regions_batch_writes_one_file_per_region(mcool, tmp_path):
+    from HiCPlot.SquHeatmap import main
+
+    bed = tmp_path / 'regions.bed'
+    bed.write_text("chr1\t0\t200000\tleft\nchr1\t300000\t500000\tright\nchr2\t0\t100000\n")
+    main(['--cooler_file1', mcool, '--resolution', '5000', '--regions', str(bed),
+          '--output_file', str(tmp_path / 'plot.png')])
+    assert sorted(p.name for p in tmp_path.glob('plot.*.png')) == ['plot.chr2_0_100000.png', 'plot.left.png',
+                                                                  'plot.right.png']
+
+
+def test_workers_draw_the_same_files(mcool, tmp_path):
+    from HiCPlot.SquHeatmap import main
+
+    bed = tmp_path / 'regions.bed'
+    bed.write_text("chr1\t0\t200000\tleft\nchr1\t300000\t500000\tright\nchr2\t0\t100000\tother\n")
+    main(['--cooler_file1', mcool, '--resolution', '5000', '--regions', str(bed), '--workers', '2',
+          '--output_file', str(tmp_path / '{name}.png')])
+    assert sorted(p.name for p in tmp_path.glob('*.png')) == ['left.png', 'other.png', 'right.png']
+
+
+def test_workers_with_a_multi_page_pdf_is_a_usage_error(mcool, tmp_path, capsys):
+    from HiCPlot.SquHeatmap import main
+
+    bed = tmp_path / 'regions.bed'
+    bed.write_text("chr1\t0\t200000\n")
+    with pytest.raises(SystemExit) as exit_info:
+        main(['--cooler_file1', mcool, '--resolution', '5000', '--regions', str(bed), '--workers', '2',
+              '--output_file', str(tmp_path / 'all.pdf')])
+    assert exit_info.value.code == 2
+    assert '--workers' in capsys.readouterr().err
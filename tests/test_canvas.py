@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cooler')
+
+from HiCPlot.io.matrix import fetch_canvas, fetch_matrix, pool_matrix
+
+
+def assert_same(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-6, equal_nan=True)
+
+
+def tiled(clr, row_chroms, col_chroms, balance=True, factor=1, pool='mean'):
+    """The canvas as one (pooled) fetch_matrix call per chromosome pair."""
+    return np.block([[pool_matrix(fetch_matrix(clr, row, col, balance=balance), factor, pool=pool)
+                      for col in col_chroms] for row in row_chroms])
+
+
+@pytest.mark.parametrize('row_chroms, col_chroms', [
+    (['chr1'], ['chr2']),
+    (['chr2'], ['chr1', 'chr2']),
+    (['chr2', 'chr1'], ['chr1']),
+    (['chr1', 'chr1'], ['chr2', 'chr1']),
+])
+@pytest.mark.parametrize('balance', [True, False])
+def test_canvas_matches_tiled_fetches(clr, row_chroms, col_chroms, balance):
+    canvas, row_edges, col_edges = fetch_canvas(clr, row_chroms, col_chroms, balance=balance, chunksize=997)
+    assert_same(canvas, tiled(clr, row_chroms, col_chroms, balance))
+    nbins = {chrom: len(clr.bins().fetch(chrom)) for chrom in ('chr1', 'chr2')}
+    assert row_edges.tolist() == np.cumsum([0] + [nbins[c] for c in row_chroms]).tolist()
+    assert col_edges.tolist() == np.cumsum([0] + [nbins[c] for c in col_chroms]).tolist()
+
+
+def test_float32_canvas(clr):
+    canvas, _, _ = fetch_canvas(clr, ['chr2'], ['chr1'], dtype=np.float32)
+    assert canvas.dtype == np.float32
+    assert_same(canvas, tiled(clr, ['chr2'], ['chr1']))
+
+
+def test_canvas_needs_weights_to_balance(clr):
+    with pytest.raises(ValueError, match='bins/KR'):
+        fetch_canvas(clr, ['chr1'], ['chr2'], balance='KR')
+
+
+@pytest.mark.parametrize('pool', ['mean', 'sum'])
+def test_pool_matrix(pool):
+    matrix = np.arange(25, dtype=float).reshape(5, 5)
+    matrix[4, :] = np.nan
+    pooled = pool_matrix(matrix, 2, pool=pool)
+    reduce = np.nanmean if pool == 'mean' else np.nansum
+    assert pooled.shape == (3, 3)
+    assert pooled[0, 0] == reduce(matrix[:2, :2])
+    assert pooled[1, 2] == reduce(matrix[2:4, 4:])
+    assert np.isnan(pooled[2]).all()
+
+
+@pytest.mark.parametrize('row_chroms, col_chroms', [(['chr1'], ['chr2']), (['chr2', 'chr1'], ['chr1'])])
+@pytest.mark.parametrize('pool', ['mean', 'sum'])
+def test_pooled_canvas_matches_pooled_tiles(clr, row_chroms, col_chroms, pool):
+    canvas, row_edges, col_edges = fetch_canvas(clr, row_chroms, col_chroms, max_bins=50, pool=pool,
+                                                chunksize=997)
+    nbins = max(sum(len(clr.bins().fetch(c)) for c in chroms) for chroms in (row_chroms, col_chroms))
+    factor = -(-nbins // 50)
+    assert factor > 1
+    assert_same(canvas, tiled(clr, row_chroms, col_chroms, factor=factor, pool=pool))
+
+
+def test_unknown_pooling_is_a_value_error(clr):
+    with pytest.raises(ValueError, match='Unsupported pooling'):
+        fetch_canvas(clr, ['chr1'], ['chr2'], max_bins=50, pool='max')
+
+
+@pytest.mark.parametrize('chroms', [['chr1', 'chr2'], ['chr2', 'chr1']])
+@pytest.mark.parametrize('max_bins, pool', [(None, 'mean'), (50, 'mean'), (50, 'sum')])
+def test_symmetric_canvas_matches_tiles(clr, chroms, max_bins, pool):
+    canvas, row_edges, col_edges = fetch_canvas(clr, chroms, max_bins=max_bins, pool=pool, chunksize=997)
+    assert row_edges.tolist() == col_edges.tolist()
+    factor = 1 if max_bins is None else -(-len(clr.bins()) // max_bins)
+    assert_same(canvas, tiled(clr, chroms, chroms, factor=factor, pool=pool))
+    assert_same(canvas, canvas.T)
@@ -0,0 +1,64 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+pytest.importorskip('cooler')
+
+from HiCPlot.io import concurrent
+from HiCPlot.io.concurrent import cooler_call, gather, load_with_tracks, prefetch
+from HiCPlot.io.matrix import fetch_matrix
+from HiCPlot.io.tracks import TrackStore
+
+from conftest import RESOLUTIONS
+
+REGION = ('chr1', 100_000, 200_000)
+
+
+@pytest.mark.parametrize('mode', ['none', 'thread', 'process'])
+def test_gather_keeps_call_order(mode):
+    assert gather([partial(pow, 2, k) for k in range(5)], mode=mode) == [1, 2, 4, 8, 16]
+
+
+def test_gather_rejects_unknown_mode():
+    with pytest.raises(ValueError, match='Unsupported concurrency mode'):
+        gather([], mode='fork')
+
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_concurrent_cooler_calls_match_sequential(mcool, mcool2, mode):
+    calls = [cooler_call(path, RESOLUTIONS[0], fetch_matrix, REGION, balance=balance)
+             for path in (mcool, mcool2) for balance in (True, False)]
+    for actual, expected in zip(gather(calls, mode=mode), gather(calls)):
+        np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize('mode', ['none', 'thread'])
+def test_load_with_tracks_fills_track_store(mcool, tmp_path, mode):
+    bedgraph = tmp_path / 'a.bedgraph'
+    bedgraph.write_text("chr1\t100000\t150000\t1\nchr1\t150000\t200000\t2\n")
+    store = TrackStore()
+    call = cooler_call(mcool, RESOLUTIONS[0], fetch_matrix, REGION)
+    [matrix] = load_with_tracks([call], store, [str(bedgraph), str(bedgraph)], REGION, mode=mode)
+    np.testing.assert_array_equal(matrix, call())
+    assert store.missing([str(bedgraph)], REGION) == []
+    positions, values = store.read(str(bedgraph), REGION)
+    assert values.tolist() == [1, 2, 2]
+
+
+def test_prefetched_loads_match_direct_loads(mcool, tmp_path):
+    bedgraph = tmp_path / 'a.bedgraph'
+    bedgraph.write_text("chr1\t0\t300000\t1\n")
+    regions = [('chr1', start, start + 100_000) for start in range(0, 300_000, 50_000)]
+    calls = lambda region: [cooler_call(mcool, RESOLUTIONS[0], fetch_matrix, region, balance=False)]
+    expected = [load_with_tracks(calls(region), TrackStore(), [str(bedgraph)], region) for region in regions]
+    store = TrackStore()
+    with prefetch(regions, depth=2):
+        for i, (region, wanted) in enumerate(zip(regions, expected)):
+            [matrix] = load_with_tracks(calls(region), store, [str(bedgraph)], region)
+            np.testing.assert_array_equal(matrix, wanted[0])
+            # The next two regions' loads (matrix and track) are queued or done.
+            queued = sorted({index for index, _ in concurrent._PREFETCH['pending'].values()})
+            assert queued == list(range(i + 1, min(len(regions), i + 3)))
+        assert store.missing([str(bedgraph)], regions[-1]) == []
+    assert concurrent._PREFETCH['executor'] is None
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from HiCPlot.DiffSquHeatmap import difference_matrix
+
+METHODS = [('subtract', 'raw'), ('divide', 'raw'), ('divide', 'add1'), ('divide', 'log2'), ('divide', 'log2_add1')]
+
+
+def matrices(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    data1, data2 = rng.random((n, n)) * 5, rng.random((n, n)) * 5
+    data1[rng.random((n, n)) < 0.1] = 0
+    data1[3], data2[:, 7] = np.nan, np.nan
+    return data1, data2
+
+
+@pytest.mark.parametrize('operation, division_method', METHODS)
+def test_cells_beyond_the_band_stay_missing(operation, division_method):
+    data1, data2 = matrices()
+    expected = difference_matrix(data1.copy(), data2.copy(), operation, division_method)
+    offsets = np.abs(np.subtract.outer(np.arange(40), np.arange(40)))
+    band1, band2 = (np.where(offsets > 5, np.nan, m) for m in (data1, data2))
+    diff = difference_matrix(band1, band2, operation, division_method, max_bins=5)
+    assert np.isnan(diff[offsets > 5]).all()
+    np.testing.assert_array_equal(diff[offsets <= 5], expected[offsets <= 5])
+
+
+def test_difference_values():
+    data1, data2 = np.array([[4.0, np.nan], [0.0, 2.0]]), np.array([[2.0, 1.0], [1.0, 0.0]])
+    run = lambda *method: difference_matrix(data1.copy(), data2.copy(), *method)
+    np.testing.assert_array_equal(run('subtract'), [[2, -1], [-1, 2]])
+    np.testing.assert_array_equal(run('divide', 'raw'), [[2, 0], [0, 0]])
+    np.testing.assert_array_equal(run('divide', 'add1'), [[5 / 3, 0], [0.5, 3]])
+    np.testing.assert_array_equal(run('divide', 'log2'), [[1, np.nan], [np.nan, np.nan]])
+    with pytest.raises(ValueError):
+        run('multiply')
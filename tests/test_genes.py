@@ -0,0 +1,100 @@
+import os
+
+import pandas as pd
+import pytest
+
+pr = pytest.importorskip('pyranges')
+
+from HiCPlot.io import genes
+from HiCPlot.io.genes import GENE_FEATURES, GTF_COLUMNS, INDEX_SUFFIX, build_gtf_index, read_gtf
+
+REGIONS = [('chr1', 0, 1_000_000), ('chr1', 20_000, 21_000), ('chr1', 44_000, 61_000), ('chr2', 0, 100),
+           ('chrX', 0, 100)]
+
+
+def gtf_line(chrom, feature, start, end, gene):
+    attributes = f'gene_id "{gene}"; transcript_id "T{gene}"; gene_name "N{gene}";'
+    return f"{chrom}\tsrc\t{feature}\t{start}\t{end}\t.\t+\t.\t{attributes}\n"
+
+
+def write_gtf(path, genes_at):
+    with open(path, 'w') as fh:
+        for chrom, gene, start, end in genes_at:
+            fh.write(gtf_line(chrom, 'gene', start, end, gene))
+            fh.write(gtf_line(chrom, 'transcript', start, end, gene))
+            for exon in range(start, end, 4000):
+                fh.write(gtf_line(chrom, 'exon', exon, min(end, exon + 1000), gene))
+            fh.write(gtf_line(chrom, 'CDS', start, start + 10, gene))
+    return str(path)
+
+
+# A long gene spanning the others checks that overlaps are found past their start.
+GENES = [('chr1', 'long', 1000, 90_000), ('chr1', 'a', 10_000, 25_000), ('chr1', 'b', 40_000, 45_000),
+         ('chr2', 'c', 50, 20_000), ('chr1', 'd', 60_000, 70_000)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(genes, '_CACHE_DIR', str(tmp_path / 'cache'))
+    genes._open_indexes.clear()
+    yield
+    genes._open_indexes.clear()
+
+
+def canonical(df):
+    df = df[GTF_COLUMNS].astype({'Chromosome': str, 'Feature': str, 'Start': int, 'End': int,
+                                 'gene_id': str, 'gene_name': str})
+    return df.astype(object).sort_values(GTF_COLUMNS[1:]).reset_index(drop=True)
+
+
+def parsed(gtf_file, region):
+    chrom, start, end = region
+    df = pr.read_gtf(gtf_file).df
+    return df[df['Feature'].isin(GENE_FEATURES) & (df['Chromosome'] == chrom)
+              & (df['End'] > start) & (df['Start'] < end)]
+
+
+@pytest.mark.parametrize('region', REGIONS)
+def test_indexed_records_match_parsed_gtf(tmp_path, region):
+    gtf = write_gtf(tmp_path / 'genes.gtf', GENES)
+    pd.testing.assert_frame_equal(canonical(read_gtf(gtf, region)), canonical(parsed(gtf, region)))
+
+
+def test_index_is_written_and_reused(tmp_path, monkeypatch):
+    gtf = write_gtf(tmp_path / 'genes.gtf', GENES)
+    assert build_gtf_index(gtf) == gtf + INDEX_SUFFIX
+    genes._open_indexes.clear()
+    monkeypatch.setattr(genes, '_index_arrays', lambda gtf_file: pytest.fail('index rebuilt'))
+    assert set(read_gtf(gtf, REGIONS[1])['gene_id']) == {'long', 'a'}
+
+
+def test_changed_gtf_rebuilds_index(tmp_path):
+    gtf = write_gtf(tmp_path / 'genes.gtf', GENES)
+    read_gtf(gtf, REGIONS[0])
+    os.utime(gtf, ns=(1_000_000_000, 1_000_000_000))
+    write_gtf(gtf, [('chr1', 'new', 100, 200)])
+    assert set(read_gtf(gtf, REGIONS[0])['gene_id']) == {'new'}
+
+
+def test_index_falls_back_to_user_cache(tmp_path, monkeypatch):
+    gtf = write_gtf(tmp_path / 'genes.gtf', GENES)
+    write_index = genes._write_index
+
+    def read_only_sidecar(arrays, index_file):
+        if index_file == gtf + INDEX_SUFFIX:
+            raise PermissionError(index_file)
+        write_index(arrays, index_file)
+
+    monkeypatch.setattr(genes, '_write_index', read_only_sidecar)
+    index_file = build_gtf_index(gtf)
+    assert os.path.dirname(index_file) == str(tmp_path / 'cache')
+    genes._open_indexes.clear()
+    assert set(read_gtf(gtf, REGIONS[1])['gene_id']) == {'long', 'a'}
+
+
+
+@pytest.mark.parametrize('region', REGIONS)
+def test_data_frame_records_match_indexed_records(tmp_path, region):
+    gtf = write_gtf(tmp_path / 'genes.gtf', GENES)
+    from_frame = read_gtf(pr.read_gtf(gtf).df, region)
+    pd.testing.assert_frame_equal(canonical(from_frame), canonical(read_gtf(gtf, region)))
@@ -0,0 +1,164 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+cooler = pytest.importorskip('cooler')
+
+from HiCPlot.io.matrix import (cooler_chromsizes, cooler_meta, fetch_band, fetch_canvas, fetch_matrix,
+                               keep_recent_matrices, list_resolutions, open_cooler, super_windows)
+from conftest import CHROMSIZES, RESOLUTIONS
+
+# Bin-aligned and unaligned windows, one of them over the bins with NaN weights.
+REGIONS = [('chr1', 0, 300_000), ('chr1', 72_500, 251_000), ('chr1', 150_000, 600_000), ('chr2', 5_000, 205_000)]
+
+
+def assert_same(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-6, equal_nan=True)
+
+
+def band_of(matrix, max_bins):
+    """``fetch_band`` layout of a dense matrix."""
+    n = len(matrix)
+    band = np.full((min(max_bins, n - 1) + 1, n), np.nan)
+    for d in range(len(band)):
+        band[d, :n - d] = np.diagonal(matrix, d)
+    return band
+
+
+def test_resolutions_and_chromsizes(mcool):
+    assert list_resolutions(mcool) == RESOLUTIONS
+    assert cooler_chromsizes(mcool) == CHROMSIZES
+
+
+def test_open_cooler_reuses_handle(mcool):
+    clr = open_cooler(mcool, 10000)
+    assert clr.binsize == 10000
+    assert open_cooler(mcool, '10000') is clr
+
+
+@pytest.mark.parametrize('region', REGIONS)
+@pytest.mark.parametrize('balance', [True, False])
+def test_fetch_matrix_matches_cooler(clr, region, balance):
+    assert_same(fetch_matrix(clr, region, balance=balance), clr.matrix(balance=balance).fetch(region))
+
+
+@pytest.mark.parametrize('balance', [True, False])
+def test_fetch_rectangle_matches_cooler(clr, balance):
+    # Above, below and straddling the diagonal, and between chromosomes both ways.
+    for region, region2 in [(REGIONS[1], REGIONS[3]), (REGIONS[3], REGIONS[0]), (REGIONS[0], REGIONS[2]),
+                            (REGIONS[2], REGIONS[1]), (('chr1', 400_000, 500_000), ('chr1', 0, 100_000))]:
+        assert_same(fetch_matrix(clr, region, region2, balance=balance),
+                    clr.matrix(balance=balance).fetch(region, region2))
+
+
+@pytest.mark.parametrize('region', REGIONS)
+@pytest.mark.parametrize('balance', [True, False])
+def test_banded_matrix_is_dense_matrix_near_diagonal(clr, region, balance):
+    dense = fetch_matrix(clr, region, balance=balance)
+    offsets = np.abs(np.subtract.outer(np.arange(len(dense)), np.arange(len(dense))))
+    for max_bins in (0, 7):
+        assert_same(fetch_matrix(clr, region, balance=balance, max_bins=max_bins),
+                    np.where(offsets > max_bins, np.nan, dense))
+
+
+@pytest.mark.parametrize('region', REGIONS)
+@pytest.mark.parametrize('max_bins', [0, 5, 1000])
+def test_band_matches_dense_matrix(clr, region, max_bins):
+    assert_same(fetch_band(clr, region, max_bins), band_of(fetch_matrix(clr, region), max_bins))
+    assert_same(fetch_band(clr, region, max_bins, chunk_bins=7), band_of(fetch_matrix(clr, region), max_bins))
+
+
+def test_band_limit_needs_a_single_region(clr):
+    with pytest.raises(ValueError, match='max_bins'):
+        fetch_matrix(clr, REGIONS[0], REGIONS[1], max_bins=3)
+
+
+@pytest.mark.parametrize('region', REGIONS)
+@pytest.mark.parametrize('balance', [True, False])
+def test_float32_stream_matches_dense_matrix(clr, region, balance):
+    for max_bins in (None, 6):
+        matrix = fetch_matrix(clr, region, balance=balance, max_bins=max_bins, dtype='float32')
+        assert matrix.dtype == np.float32
+        assert_same(matrix, fetch_matrix(clr, region, balance=balance, max_bins=max_bins))
+    band = fetch_band(clr, region, 6, balance=balance, dtype=np.float32)
+    assert band.dtype == np.float32
+    assert_same(band, fetch_band(clr, region, 6, balance=balance))
+
+
+def test_float32_rectangle(clr):
+    matrix = fetch_matrix(clr, REGIONS[1], REGIONS[3], dtype='float32')
+    assert matrix.dtype == np.float32
+    assert_same(matrix, fetch_matrix(clr, REGIONS[1], REGIONS[3]))
+
+
+def test_missing_weight_column_is_a_value_error(clr):
+    for fetch in (lambda: fetch_matrix(clr, REGIONS[0], balance='KR', max_bins=3),
+                  lambda: fetch_matrix(clr, REGIONS[0], REGIONS[3], balance='KR'),
+                  lambda: fetch_band(clr, REGIONS[0], 3, balance='KR')):
+        with pytest.raises(ValueError, match='bins/KR'):
+            fetch()
+
+
+def test_super_window_fetches_match_direct_fetches(clr):
+    regions = [('chr1', 50_000, 200_000), ('chr1', 102_500, 301_000), ('chr1', 290_000, 400_000)]
+    expected = [(fetch_matrix(clr, r), fetch_matrix(clr, r, max_bins=4), fetch_band(clr, r, 6),
+                 fetch_matrix(clr, r, dtype='float32')) for r in regions]
+    span = max(end - start for _, start, end in regions)
+    with super_windows([('chr1', 50_000, 400_000, span)]):
+        for region, wanted in zip(regions, expected):
+            got = (fetch_matrix(clr, region), fetch_matrix(clr, region, max_bins=4), fetch_band(clr, region, 6),
+                   fetch_matrix(clr, region, dtype='float32'))
+            for actual, expected_matrix in zip(got, wanted):
+                assert actual.dtype == expected_matrix.dtype
+                assert_same(actual, expected_matrix)
+
+
+def test_super_window_results_are_independent_copies(clr):
+    region = ('chr1', 50_000, 150_000)
+    with super_windows([('chr1', 0, 300_000)]):
+        fetch_matrix(clr, region)[:] = 0
+        fetch_band(clr, region, 3)[:] = 0
+        assert_same(fetch_matrix(clr, region), fetch_matrix(clr, region, ('chr1', 50_000, 150_000)))
+
+
+def test_region_wider_than_super_window_span_is_read_directly(clr):
+    region = ('chr1', 0, 300_000)
+    with super_windows([('chr1', 0, 300_000, 50_000)]):
+        assert_same(fetch_matrix(clr, region), fetch_matrix(clr, region, region))
+
+
+def test_super_window_is_read_once(clr, monkeypatch):
+    from HiCPlot.io import matrix
+
+    reads = []
+    fetch = matrix._fetch_band
+    monkeypatch.setattr(matrix, '_fetch_band', lambda clr, region, *args: reads.append(region) or fetch(clr, region, *args))
+    regions = [('chr1', start, start + 100_000) for start in range(0, 300_000, 50_000)]
+    with super_windows([('chr1', 0, 350_000, 100_000)]):
+        for region in regions:
+            fetch_matrix(clr, region)
+    assert reads == [('chr1', 0, 350_000)]
+
+
+def test_recent_matrices_are_copies(clr):
+    region = ('chr2', 0, 100_000)
+    expected = fetch_matrix(clr, region)
+    keep_recent_matrices(16)
+    try:
+        fetch_matrix(clr, region)[:] = 0
+        assert_same(fetch_matrix(clr, region), expected)
+    finally:
+        keep_recent_matrices(0)
+
+
+def test_recent_canvases_are_copies(clr):
+    expected = fetch_canvas(clr, ['chr1', 'chr2'], ['chr2'])
+    keep_recent_matrices(16)
+    try:
+        fetch_canvas(clr, ['chr1', 'chr2'], ['chr2'])[0][:] = 0
+        for actual, wanted in zip(fetch_canvas(clr, ['chr1', 'chr2'], ['chr2']), expected):
+            assert_same(actual, wanted)
+    finally:
+        keep_recent_matrices(0)
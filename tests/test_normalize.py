@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from HiCPlot.normalize import NORMALIZATION_METHODS, normalize_matrix
+
+REFERENCE = {
+    'raw': lambda m: m,
+    'logNorm': lambda m: np.maximum(m, 0),
+    'log2': np.log2,
+    'log2_add1': lambda m: np.log2(m + 1),
+    'log': np.log,
+    'log_add1': lambda m: np.log(m + 1),
+}
+
+
+@pytest.mark.parametrize('method', NORMALIZATION_METHODS)
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+def test_in_place_normalization_matches_reference(method, dtype):
+    matrix = np.array([[0.0, 0.5, np.nan], [2.0, 7.0, 1.0], [3.0, 1e-3, 4.0]], dtype=dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = REFERENCE[method](matrix.copy())
+        result = normalize_matrix(matrix, method)
+    assert result is matrix and result.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(result, expected, rtol=1e-6, equal_nan=True)
+
+
+def test_unknown_method():
+    assert normalize_matrix(None, 'log2') is None
+    with pytest.raises(ValueError, match='Unsupported normalization'):
+        normalize_matrix(np.ones((2, 2)), 'zscore')
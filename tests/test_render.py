@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from HiCPlot.render import check_spec, load_spec, render, spec_regions
+
+
+def spec(**changes):
+    base = {'regions': ['chr1:0-100000'], 'output': 'figure.png',
+            'panels': [{'type': 'triangle', 'cooler': 'sample.mcool'}, {'type': 'bed', 'file': 'peaks.bed'}]}
+    return {**base, **changes}
+
+
+def test_check_spec_accepts_valid_spec():
+    check_spec(spec(resolution=5000, dtype='float32', concurrent='thread'))
+
+
+@pytest.mark.parametrize('bad, message', [
+    (['not', 'a', 'mapping'], 'mapping'),
+    (spec(colour='red'), 'Unknown spec keys'),
+    (spec(regions=[]), "'regions'"),
+    (spec(output=None), "'output'"),
+    (spec(panels=[{'type': 'heatmap', 'cooler': 'a.mcool'}]), 'type'),
+    (spec(panels=[{'type': 'diff', 'cooler': 'a.mcool'}]), 'cooler2'),
+    (spec(panels=[{'type': 'square', 'cooler': 'a.mcool', 'normalization': 'zscore'}]), 'normalization'),
+    (spec(dtype='int8'), 'dtype'),
+    (spec(concurrent='gpu'), 'concurrent'),
+])
+def test_check_spec_rejects(bad, message):
+    with pytest.raises(ValueError, match=message):
+        check_spec(bad)
+
+
+def test_spec_regions():
+    assert spec_regions(['chr1:1,000,000-2_000_000', ['chr2', '5', 50], ('chrX', 0, 10, 'named')]) == [
+        ('chr1', 1_000_000, 2_000_000, 'chr1_1000000_2000000'),
+        ('chr2', 5, 50, 'chr2_5_50'),
+        ('chrX', 0, 10, 'named'),
+    ]
+
+
+def test_spec_region_names_are_file_name_safe():
+    assert spec_regions([['chr1', 0, 10, f'a{os.sep}b']])[0][3] == 'a_b'
+
+
+def test_spec_regions_rejects_malformed_region():
+    with pytest.raises(ValueError, match='chrom:start-end'):
+        spec_regions(['chr1:100'])
+
+
+def test_load_spec_checks_json(tmp_path):
+    path = tmp_path / 'spec.json'
+    path.write_text(json.dumps(spec(panels=[{'type': 'bigwig'}])))
+    with pytest.raises(ValueError, match='missing file'):
+        load_spec(str(path))
+
+
+def test_render_writes_one_file_per_region(mcool, tmp_path):
+    bed = tmp_path / 'peaks.bed'
+    bed.write_text("chr1\t10000\t20000\nchr1\t150000\t160000\n")
+    render({'regions': [['chr1', 0, 200_000, 'left/first'], 'chr1:100000-300000'],
+            'output': str(tmp_path / 'figure.{name}.png'), 'resolution': 10000,
+            'panels': [{'type': 'triangle', 'cooler': mcool, 'max_distance': 100_000},
+                       {'type': 'square', 'cooler': mcool, 'normalization': 'log2_add1'},
+                       {'type': 'bed', 'file': str(bed)}]})
+    assert sorted(os.listdir(tmp_path)) == ['figure.chr1_100000_300000.png', 'figure.left_first.png', 'peaks.bed']
+
+
+def test_panels_showing_one_matrix_load_it_once(mcool, capsys):
+    from HiCPlot.render import build_figure
+
+    panels = [{'type': 'square', 'cooler': mcool}, {'type': 'triangle', 'cooler': mcool},
+              {'type': 'split', 'cooler': mcool, 'cooler2': mcool},
+              {'type': 'triangle', 'cooler': mcool, 'max_distance': 50_000}]
+    build_figure(panels, 'chr1', 0, 200_000, resolution=10000)
+    assert '4 panels: 2 contact matrices and 0 tracks loaded' in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+cooler = pytest.importorskip('cooler')
+
+from HiCPlot.SquHeatmap import main as squ_heatmap
+from HiCPlot.io.matrix import auto_resolution, chrom_bounds, parse_resolution
+
+
+def coarse_mcool(mcool, directory, resolutions):
+    """An .mcool of *mcool*'s contacts whose finest resolution is resolutions[0]."""
+    base = os.path.join(os.path.dirname(mcool), 'base.cool')
+    coarse, path = str(directory / 'coarse.cool'), str(directory / 'coarse.mcool')
+    cooler.coarsen_cooler(base, coarse, factor=resolutions[0] // 5000, chunksize=100_000)
+    cooler.zoomify_cooler(coarse, path, resolutions, chunksize=100_000)
+    return path
+
+
+def test_finest_resolution_within_pixel_budget(mcool):
+    assert auto_resolution([mcool], 600_000, max_bins=120) == 5000
+    assert auto_resolution([mcool], 600_000, max_bins=119) == 10000
+    assert auto_resolution([mcool], 600_001, max_bins=120) == 10000
+
+
+def test_memory_budget(mcool):
+    # 120 float64 bins need 0.11 MiB, 120 float32 bins half that.
+    assert auto_resolution([mcool], 600_000, max_bins=1000, max_mb=0.11) == 5000
+    assert auto_resolution([mcool], 600_000, max_bins=1000, max_mb=0.1) == 10000
+    assert auto_resolution([mcool], 600_000, max_bins=1000, max_mb=0.06, dtype='float32') == 5000
+
+
+def test_coarsest_resolution_when_nothing_fits(mcool, capsys):
+    assert auto_resolution([mcool], 600_000, max_bins=10) == 10000
+    assert 'exceeds' in capsys.readouterr().out
+
+
+def test_resolution_shared_by_all_files(mcool, tmp_path):
+    coarse = coarse_mcool(mcool, tmp_path, [10000, 20000])
+    assert auto_resolution([mcool, coarse], 100_000, max_bins=1000) == 10000
+
+
+def test_no_shared_resolution(mcool, tmp_path):
+    coarse = coarse_mcool(mcool, tmp_path, [20000])
+    with pytest.raises(ValueError, match='No resolution'):
+        auto_resolution([mcool, coarse], 100_000, max_bins=1000)
+
+
+def test_parse_resolution():
+    assert parse_resolution('AUTO') == 'auto'
+    assert parse_resolution('5000') == 5000
+
+
+def test_chrom_bounds(mcool):
+    assert chrom_bounds(mcool, 'chr2') == (0, 400_000)
+    assert chrom_bounds(mcool, 'chr2', 1000) == (1000, 400_000)
+    assert chrom_bounds(mcool, 'chr2', None, 5000) == (0, 5000)
+
+
+def test_auto_resolution_for_a_whole_chromosome(mcool, tmp_path, capsys):
+    output = tmp_path / 'chr2.png'
+    squ_heatmap(['--cooler_file1', mcool, '--resolution', 'auto', '--chrid', 'chr2', '--output_file', str(output)])
+    assert 'Using resolution 5000 bp' in capsys.readouterr().out
+    assert output.stat().st_size > 0
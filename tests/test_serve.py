@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+
+import pytest
+
+from HiCPlot.client import request_render
+from HiCPlot.serve import UnixHTTPConnection, _RenderHandler, _UnixHTTPServer, _write_token, render, token_file
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / 'hicplot.sock')
+    server = _UnixHTTPServer(socket_path, _RenderHandler)
+    server.token = _write_token(token_file(socket_path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path, server.token
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def post(socket_path, body, headers):
+    connection = UnixHTTPConnection(socket_path, timeout=30)
+    try:
+        connection.request('POST', '/render', body=body, headers=headers)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_token_file_is_private(server):
+    socket_path, token = server
+    assert os.stat(token_file(socket_path)).st_mode & 0o777 == 0o600
+    assert open(token_file(socket_path)).read().strip() == token
+
+
+@pytest.mark.parametrize('headers, status', [
+    ({'Content-Type': 'application/json'}, 403),
+    ({'Content-Type': 'application/json', 'X-HiCPlot-Token': 'wrong'}, 403),
+    ({'Content-Type': 'text/plain', 'X-HiCPlot-Token': None}, 415),
+    ({'Content-Type': 'application/json', 'X-HiCPlot-Token': None, 'Origin': 'http://example.org'}, 403),
+    ({'Content-Type': 'application/json', 'X-HiCPlot-Token': None}, 200),
+])
+def test_requests_are_checked(server, headers, status):
+    socket_path, token = server
+    headers = {key: token if value is None else value for key, value in headers.items()}
+    assert post(socket_path, json.dumps({'argv': ['NGStrack', '--help']}), headers) == status
+
+
+def test_client_round_trip(server, mcool, tmp_path, monkeypatch):
+    socket_path, _ = server
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'spec.json').write_text(json.dumps({
+        'regions': ['chr1:0-200000'], 'output': 'figure.png', 'resolution': 10000,
+        'panels': [{'type': 'square', 'cooler': mcool}]}))
+    status, _, stderr = request_render(['render', 'spec.json'], socket_path=socket_path, timeout=60)
+    assert status == 0, stderr
+    assert (tmp_path / 'figure.png').stat().st_size > 0
+
+
+def test_render_reports_errors_instead_of_exiting(tmp_path, capfd):
+    assert render(['serve'], str(tmp_path))[0] == 2
+    status, _, stderr = render(['render', 'missing.json'], str(tmp_path))
+    assert status == 2 and 'missing.json' in stderr
+    status, stdout, _ = render(['NGStrack', '--help'], str(tmp_path))
+    assert status == 0 and 'usage' in stdout
+    # Exceptions come back as the traceback text, not on the server's own streams.
+    status, _, stderr = render(['NGStrack', '--chrid', 'chr1', '--start', '0', '--end', '1000',
+                                '--bigwig_files_sample1', 'missing.bw', '--bigwig_labels_sample1', 'a'], str(tmp_path))
+    assert status == 1
+    assert stderr.startswith('Traceback') and 'FileNotFoundError' in stderr
+    assert capfd.readouterr() == ('', '')
+
+
+def test_render_closes_figures_of_failed_requests(mcool, tmp_path):
+    plt = pytest.importorskip('matplotlib.pyplot')
+    status, _, stderr = render(['SquHeatmap', '--cooler_file1', mcool, '--resolution', '10000', '--chrid', 'chr1',
+                                '--start', '0', '--end', '200000', '--output_file', 'missing/plot.png'], str(tmp_path))
+    assert status == 1 and 'missing/plot.png' in stderr
+    assert plt.get_fignums() == []
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from HiCPlot.Cli import _SUBCOMMANDS
+
+HEAVY_MODULES = {'matplotlib', 'cooler', 'pandas', 'pyranges', 'pyBigWig', 'scipy', 'h5py'}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Same probe as benchmarks/startup.py: run the CLI, then list the loaded top-level modules.
+PROBE = """
+import json, sys
+from HiCPlot.Cli import main
+try:
+    main({args!r})
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))
+"""
+
+
+@pytest.mark.parametrize('tool', sorted(_SUBCOMMANDS))
+def test_help_imports_no_heavy_modules(tool):
+    done = subprocess.run([sys.executable, '-c', PROBE.format(args=[tool, '--help'])], cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    loaded = set(json.loads(done.stderr.strip().splitlines()[-1]))
+    assert not HEAVY_MODULES & loaded
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+cooler = pytest.importorskip('cooler')
+
+import HiCPlot.DiffSquHeatmapTrans as dsht
+from HiCPlot.io.matrix import fetch_canvas
+
+OPERATIONS = [('subtract', 'raw'), ('divide', 'raw'), ('divide', 'add1'), ('divide', 'log2'), ('divide', 'log2_add1')]
+
+
+@pytest.fixture
+def coolers(mcool, mcool2):
+    return [cooler.Cooler(f'{path}::resolutions/5000') for path in (mcool, mcool2)]
+
+
+@pytest.fixture(autouse=True)
+def small_tiles(monkeypatch):
+    monkeypatch.setattr(dsht, 'DIFF_TILE_BINS', 24)
+
+
+@pytest.mark.parametrize('operation, division_method', OPERATIONS)
+@pytest.mark.parametrize('rows, cols', [(['chr1', 'chr2'], ['chr1', 'chr2']), (['chr2'], ['chr1', 'chr2']),
+                                        (['chr2', 'chr1'], ['chr1'])])
+@pytest.mark.parametrize('max_bins', [None, 40])
+def test_stream_matches_diff_of_canvases(coolers, operation, division_method, rows, cols, max_bins):
+    clr1, clr2 = coolers
+    diff, row_edges, col_edges = dsht._stream_diff_canvas(clr1, clr2, rows, cols, True, True,
+                                                          operation, division_method, max_bins=max_bins)
+    (mat1, edges1, edges2), (mat2, _, _) = (fetch_canvas(clr, rows, cols, max_bins=max_bins) for clr in coolers)
+    np.testing.assert_array_equal(row_edges, edges1)
+    np.testing.assert_array_equal(col_edges, edges2)
+    expected = dsht._compute_diff(mat1, mat2, operation, division_method)
+    np.testing.assert_allclose(diff, expected, rtol=1e-9, equal_nan=True)
+
+
+def test_stream_reads_each_band_once(coolers, monkeypatch):
+    reads = []
+    stored_band = dsht._stored_band
+    monkeypatch.setattr(dsht, '_stored_band', lambda clr, band: reads.append((clr.filename, band))
+                        or stored_band(clr, band))
+    dsht._stream_diff_canvas(*coolers, ['chr2', 'chr1'], ['chr1', 'chr2'], True, True, 'divide', 'log2')
+    assert len(reads) == len(set(reads))
+    # 120 + 80 bins in bands of 24, once per cooler.
+    assert len(reads) == 2 * (5 + 4)
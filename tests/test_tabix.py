@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pysam')
+
+from HiCPlot.BuildIndex import main as build_index
+from HiCPlot.io.annotations import read_bed, read_loops
+from HiCPlot.io.tabix import build_tabix_index, tabix_index_path, tabix_lines
+from HiCPlot.io.tracks import read_bedgraph
+
+REGIONS = [('chr1', 0, 10_000), ('chr1', 2_500, 4_100), ('chr2', 100, 900), ('chrX', 0, 100)]
+
+
+@pytest.fixture
+def files(tmp_path):
+    """Unsorted BED and loop files, and a bedGraph sorted within chromosomes."""
+    rng = np.random.default_rng(0)
+    bed, bedgraph, loops = [], [], ["chrom1\tstart1\tend1\tchrom2\tstart2\tend2\n"]
+    for chrom in ('chr2', 'chr1'):
+        for start in rng.permutation(np.arange(0, 10_000, 100)):
+            bed.append(f"{chrom}\t{start}\t{start + 50}\tpeak\n")
+            loops.append(f"{chrom}\t{start}\t{start + 10}\t{chrom}\t{start + 300}\t{start + 310}\n")
+        # Adjacent intervals share a boundary, whose value follows file order.
+        bedgraph.extend(f"{chrom}\t{start}\t{start + 100}\t{rng.random():.3f}\n" for start in range(0, 10_000, 100))
+    paths = {}
+    for name, lines in (('peaks.bed', bed), ('signal.bedgraph', bedgraph), ('loops.bedpe', loops)):
+        paths[name] = tmp_path / name
+        paths[name].write_text(''.join(lines))
+    return {name: str(path) for name, path in paths.items()}
+
+
+def same_rows(actual, expected):
+    pd.testing.assert_frame_equal(actual.sort_values(list(actual.columns)).reset_index(drop=True),
+                                  expected.sort_values(list(expected.columns)).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize('region', REGIONS)
+def test_indexed_reads_match_full_scans(files, region):
+    bed = build_tabix_index(files['peaks.bed'], 'bed')
+    loops = build_tabix_index(files['loops.bedpe'], 'loops')
+    bedgraph = build_tabix_index(files['signal.bedgraph'], 'bedgraph')
+    assert tabix_index_path(bed) == bed + '.tbi'
+    same_rows(read_bed(bed, region), read_bed(files['peaks.bed'], region))
+    same_rows(read_loops(loops, region), read_loops(files['loops.bedpe'], region))
+    for actual, expected in zip(read_bedgraph(bedgraph, region), read_bedgraph(files['signal.bedgraph'], region)):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_tabix_lines(files):
+    bed = build_tabix_index(files['peaks.bed'], 'bed', output_file=files['peaks.bed'] + '.sorted.gz')
+    assert [line.split('\t')[1] for line in tabix_lines(bed, ('chr1', 120, 320))] == ['100', '200', '300']
+    assert tabix_lines(bed, ('chrX', 0, 100)) == []
+    assert tabix_lines(files['peaks.bed'], ('chr1', 0, 100)) is None
+
+
+def test_unindexed_gzip_is_scanned(files, tmp_path):
+    bed = build_tabix_index(files['peaks.bed'], 'bed')
+    (tmp_path / 'peaks.bed.gz.tbi').unlink()
+    assert tabix_index_path(bed) is None
+    same_rows(read_bed(bed, REGIONS[1]), read_bed(files['peaks.bed'], REGIONS[1]))
+
+
+def test_unknown_kind(files):
+    with pytest.raises(ValueError, match='Unsupported file kind'):
+        build_tabix_index(files['peaks.bed'], 'gff')
+
+
+def test_build_index_command(files, capsys):
+    build_index(['--bed_files', files['peaks.bed'], '--loop_files', files['loops.bedpe']])
+    assert tabix_index_path(files['peaks.bed'] + '.gz') and tabix_index_path(files['loops.bedpe'] + '.gz')
+    assert capsys.readouterr().out.count('Indexed') == 2
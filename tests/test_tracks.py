@@ -0,0 +1,179 @@
+import gzip
+import os
+
+import numpy as np
+import pytest
+
+pyBigWig = pytest.importorskip('pyBigWig')
+
+from HiCPlot.io import tracks
+from HiCPlot.io.tracks import TrackStore, bedgraph_steps, open_bigwig, pixel_bins, read_bedgraph, read_bigwig
+
+
+def write_bigwig(path, value=None, mtime_ns=None):
+    """chr1 of 1 kb: *value* everywhere, or the position divided by 100 (default)."""
+    bw = pyBigWig.open(str(path), 'w')
+    bw.addHeader([('chr1', 1000)])
+    if value is None:
+        starts = list(range(0, 1000, 10))
+        bw.addEntries(['chr1'] * 100, starts, ends=[s + 10 for s in starts], values=[s / 100 for s in starts])
+    else:
+        bw.addEntries(['chr1'], [0], ends=[1000], values=[float(value)])
+    bw.close()
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_read_bigwig_returns_one_value_per_base(tmp_path):
+    positions, values = read_bigwig(write_bigwig(tmp_path / 'a.bw'), ('chr1', 95, 125))
+    assert len(positions) == len(values) == 30
+    np.testing.assert_allclose(values, [0.9] * 5 + [1.0] * 10 + [1.1] * 10 + [1.2] * 5, rtol=1e-6)
+
+
+def test_read_bedgraph(tmp_path):
+    path = tmp_path / 'a.bedgraph'
+    path.write_text("chr1\t0\t10\t1\nchr1\t10\t30\t2\nchr2\t0\t10\t5\nchr1\t50\t60\t3\n")
+    positions, values = read_bedgraph(str(path), ('chr1', 5, 40))
+    assert positions.tolist() == [0, 10, 30]
+    assert values.tolist() == [1, 2, 2]
+    assert read_bedgraph(str(path), ('chr1', 100, 200)) == (None, None)
+
+
+def loop_steps(starts, ends, values):
+    """The per-interval mask loop bedgraph_steps replaced."""
+    positions = np.sort(np.unique(np.concatenate([starts, ends])))
+    steps = np.zeros_like(positions, dtype=float)
+    for s, e, v in zip(starts, ends, values):
+        steps[(positions >= s) & (positions <= e)] = v
+    return positions, steps
+
+
+def random_intervals(rng, n, overlapping):
+    if overlapping:
+        starts = rng.integers(0, 1000, n)
+        ends = starts + rng.integers(1, 100, n)
+    else:
+        # Sorted, some abutting, some with gaps.
+        lengths, gaps = rng.integers(1, 50, n), rng.integers(0, 3, n) * rng.integers(1, 20, n)
+        ends = np.cumsum(lengths + gaps)
+        starts = ends - lengths
+    return starts, ends, rng.random(n)
+
+
+@pytest.mark.parametrize('overlapping', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_bedgraph_steps_match_loop(overlapping, seed):
+    intervals = random_intervals(np.random.default_rng(seed), 200, overlapping)
+    for actual, expected in zip(bedgraph_steps(*intervals), loop_steps(*intervals)):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_read_bedgraph_reads_only_the_region_chromosome(tmp_path):
+    text = "track type=bedGraph\nchr10\t0\t10\t9\nchr1\t0\t10\t1\nchr1\t10\t30\t2\n"
+    (tmp_path / 'a.bg').write_text(text)
+    with gzip.open(tmp_path / 'a.bg.gz', 'wt') as fh:
+        fh.write(text)
+    for name in ('a.bg', 'a.bg.gz'):
+        positions, values = read_bedgraph(str(tmp_path / name), ('chr1', 0, 100))
+        assert positions.tolist() == [0, 10, 30]
+        assert values.tolist() == [1, 2, 2]
+
+
+def test_unsupported_track_format(tmp_path):
+    with pytest.raises(ValueError, match='Unsupported file format'):
+        read_bigwig(str(tmp_path / 'a.wig'), ('chr1', 0, 10))
+
+
+def test_track_store_reads_each_track_once(tmp_path, monkeypatch):
+    path = write_bigwig(tmp_path / 'a.bw')
+    reads = []
+    monkeypatch.setattr(tracks, 'read_bigwig', lambda *args, **kwargs: reads.append(args) or read_bigwig(*args, **kwargs))
+    store = TrackStore()
+    assert store.missing([path, path], ('chr1', 0, 100)) == [path]
+    first = store.read(path, ('chr1', 0, 100))
+    assert store.read(path, ['chr1', 0, 100]) is first
+    assert store.missing([path], ('chr1', 0, 100)) == []
+    assert len(reads) == 1
+
+
+def test_track_store_keeps_tracks_read_elsewhere(tmp_path):
+    path = write_bigwig(tmp_path / 'a.bw')
+    store = TrackStore()
+    track = store.read_call(path, ('chr1', 0, 100))()
+    store.add(path, ('chr1', 0, 100), track)
+    assert store.read(path, ('chr1', 0, 100)) is track
+    store.clear()
+    assert store.missing([path], ('chr1', 0, 100)) == [path]
+
+
+@pytest.mark.parametrize('summary, reduce', [('mean', np.mean), ('max', np.max), ('min', np.min)])
+def test_summary_fetch_has_one_value_per_bin(tmp_path, summary, reduce):
+    path = write_bigwig(tmp_path / 'a.bw')
+    positions, values = read_bigwig(path, ('chr1', 0, 1000), summary=summary, bins=20)
+    _, per_base = read_bigwig(path, ('chr1', 0, 1000))
+    np.testing.assert_allclose(positions, np.arange(25, 1000, 50))
+    np.testing.assert_allclose(values, reduce(per_base.reshape(20, 50), axis=1), rtol=1e-5)
+
+
+def test_summary_fetch_is_skipped_for_narrow_regions(tmp_path):
+    path = write_bigwig(tmp_path / 'a.bw')
+    assert len(read_bigwig(path, ('chr1', 0, 100), summary='mean', bins=200)[1]) == 100
+
+
+def test_unknown_summary_type(tmp_path):
+    with pytest.raises(ValueError, match='summary'):
+        read_bigwig(write_bigwig(tmp_path / 'a.bw'), ('chr1', 0, 1000), summary='median', bins=10)
+
+
+def test_pixel_bins():
+    assert pixel_bins(2, dpi=100) == 200
+    assert pixel_bins(0.001, dpi=100) == 1
+
+
+@pytest.fixture
+def empty_bigwig_cache():
+    def close_all():
+        for _, handle in tracks._BIGWIGS.values():
+            handle.close()
+        tracks._BIGWIGS.clear()
+    close_all()
+    yield
+    close_all()
+
+
+def test_handle_is_reused(tmp_path, empty_bigwig_cache):
+    write_bigwig(tmp_path / 'a.bw', 1)
+    assert open_bigwig(str(tmp_path / 'a.bw')) is open_bigwig(str(tmp_path / 'a.bw'))
+
+
+def test_rewritten_file_is_reopened_and_old_handle_closed(tmp_path, empty_bigwig_cache):
+    path = tmp_path / 'a.bw'
+    write_bigwig(path, 1, mtime_ns=1_000_000_000)
+    old = open_bigwig(str(path))
+    write_bigwig(path, 2, mtime_ns=2_000_000_000)
+    _, values = read_bigwig(str(path), ('chr1', 0, 10))
+    assert np.all(values == 2)
+    with pytest.raises(RuntimeError):
+        old.chroms()
+
+
+def test_relative_paths_from_other_directories_do_not_collide(tmp_path, monkeypatch, empty_bigwig_cache):
+    for value in (1, 2):
+        (tmp_path / str(value)).mkdir()
+        write_bigwig(tmp_path / str(value) / 'track.bw', value, mtime_ns=1_000_000_000)
+    for value in (1, 2):
+        monkeypatch.chdir(tmp_path / str(value))
+        assert np.all(read_bigwig('track.bw', ('chr1', 0, 10))[1] == value)
+
+
+def test_evicted_handles_are_closed(tmp_path, monkeypatch, empty_bigwig_cache):
+    monkeypatch.setattr(tracks, 'MAX_BIGWIGS', 2)
+    handles = []
+    for i in range(3):
+        write_bigwig(tmp_path / f'{i}.bw', i)
+        handles.append(open_bigwig(str(tmp_path / f'{i}.bw')))
+    assert list(tracks._BIGWIGS) == [str(tmp_path / f'{i}.bw') for i in (1, 2)]
+    with pytest.raises(RuntimeError):
+        handles[0].chroms()
+    assert handles[2].chroms() == {'chr1': 1000}
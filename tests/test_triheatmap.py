@@ -0,0 +1,100 @@
+import itertools
+
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import QuadMesh
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+from HiCPlot import TriHeatmap
+from HiCPlot.TriHeatmap import main, pcolormesh_triangle
+
+START, RESOLUTION = 1_000_000, 5000
+
+
+def itertools_triangle(ax, matrix, start=0, resolution=1, cmap='autumn_r'):
+    """The rotation-matrix mesh pcolormesh_triangle replaced (log scale)."""
+    n = matrix.shape[0]
+    start_pos_vector = [start + resolution * i for i in range(len(matrix) + 1)]
+    t = np.array([[1, 0.5], [-1, 0.5]])
+    matrix_a = np.dot(
+        np.array([(i[1], i[0]) for i in itertools.product(start_pos_vector[::-1], start_pos_vector)]), t)
+    x, y = matrix_a[:, 1].reshape(n + 1, n + 1), matrix_a[:, 0].reshape(n + 1, n + 1)
+    im = ax.pcolormesh(x, y, np.flipud(matrix), norm=LogNorm(clip=False), cmap=cmap)
+    ax.yaxis.set_visible(False)
+    im.set_rasterized(True)
+    return im
+
+
+def render(draw, matrix, depth=None):
+    fig = Figure(figsize=(6, 3), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    draw(ax, matrix)
+    n = matrix.shape[-1]
+    ax.set_xlim(START, START + n * RESOLUTION)
+    ax.set_ylim(0, (depth or n) * RESOLUTION)
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba()).copy(), ax
+
+
+def contact_matrix(n, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.random((n, n)) + 0.01
+    matrix = (matrix + matrix.T) / 2
+    matrix[rng.random((n, n)) < 0.02] = np.nan
+    return matrix
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Many seams on a small matrix.
+    monkeypatch.setattr(TriHeatmap, 'TRIANGLE_BLOCK', 37)
+
+
+@pytest.mark.parametrize('n', [30, 37, 150])
+def test_blocked_mesh_renders_like_single_mesh(n):
+    matrix = contact_matrix(n)
+    expected, _ = render(lambda ax, m: itertools_triangle(ax, m, START, RESOLUTION), matrix)
+    actual, ax = render(lambda ax, m: pcolormesh_triangle(ax, m, START, RESOLUTION), matrix)
+    assert len(ax.collections) == -(-n // 37)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_returned_mesh_controls_every_block():
+    meshes = []
+    _, ax = render(lambda ax, m: meshes.append(pcolormesh_triangle(ax, m, START, RESOLUTION)), contact_matrix(100))
+    meshes[0].set_cmap('viridis')
+    meshes[0].set_clim(0.1, 0.5)
+    blocks = [c for c in ax.collections if isinstance(c, QuadMesh)]
+    assert len(blocks) == 3
+    for block in blocks:
+        assert block.get_cmap().name == 'viridis'
+        assert (block.norm.vmin, block.norm.vmax) == (0.1, 0.5)
+
+
+def band_of(matrix, depth):
+    n = len(matrix)
+    band = np.full((depth + 1, n), np.nan)
+    for d in range(depth + 1):
+        band[d, :n - d] = np.diagonal(matrix, d)
+    return band
+
+
+@pytest.mark.parametrize('n, depth', [(150, 10), (150, 60), (40, 39)])
+def test_banded_mesh_renders_like_masked_dense_mesh(n, depth):
+    matrix = contact_matrix(n, seed=1)
+    offsets = np.abs(np.subtract.outer(np.arange(n), np.arange(n)))
+    expected, _ = render(lambda ax, m: pcolormesh_triangle(ax, m, START, RESOLUTION),
+                         np.where(offsets > depth, np.nan, matrix), depth=depth)
+    actual, _ = render(lambda ax, m: pcolormesh_triangle(ax, m, START, RESOLUTION, banded=True),
+                       band_of(matrix, depth), depth=depth)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_max_distance_command(mcool, tmp_path):
+    output = tmp_path / 'tri.png'
+    main(['--cooler_file1', mcool, '--cooler_file2', mcool, '--resolution', '5000', '--chrid', 'chr1',
+          '--start', '0', '--end', '400000', '--max_distance', '100000', '--output_file', str(output)])
+    assert output.stat().st_size > 0